@@ -1,10 +1,17 @@
 # Developed by ARGON telegram: @REACTIVEARGON
 import asyncio
+import os
 
 from pyrogram import Client
 
 
-from bot.config import API_HASH, APP_ID, TG_BOT_TOKEN, TG_BOT_WORKERS
+from bot.config import (
+    API_HASH,
+    APP_ID,
+    MAX_CONCURRENT_TRANSMISSIONS,
+    TG_BOT_TOKEN,
+    TG_BOT_WORKERS,
+)
 from database import get_variable, set_variable
 
 from .logger import LOGGER, tg_handler
@@ -12,6 +19,24 @@ from .logger import LOGGER, tg_handler
 log = LOGGER(__name__)
 
 
+def clean_downloads(keep: set):
+    """Empties downloads/ except for the absolute paths (files or dirs) in keep."""
+    if not os.path.exists("downloads"):
+        os.makedirs("downloads")
+        return
+
+    keep_dirs = tuple(path + os.sep for path in keep if os.path.isdir(path))
+    for root, dirs, files in os.walk("downloads", topdown=False):
+        for name in files:
+            path = os.path.abspath(os.path.join(root, name))
+            if path not in keep and not path.startswith(keep_dirs):
+                os.remove(path)
+        for name in dirs:
+            path = os.path.join(root, name)
+            if not os.listdir(path):
+                os.rmdir(path)
+
+
 async def get_session():
     return await get_variable(TG_BOT_TOKEN, None)
 
@@ -35,7 +60,7 @@ class Bot(Client):
                 api_hash=API_HASH,
                 plugins={"root": "plugins"},
                 workers=TG_BOT_WORKERS,
-                max_concurrent_transmissions=8,
+                max_concurrent_transmissions=MAX_CONCURRENT_TRANSMISSIONS,
             )
         else:
             # Bot session
@@ -46,21 +71,23 @@ class Bot(Client):
                 bot_token=TG_BOT_TOKEN,
                 plugins={"root": "plugins"},
                 workers=TG_BOT_WORKERS,
-                max_concurrent_transmissions=8,
+                max_concurrent_transmissions=MAX_CONCURRENT_TRANSMISSIONS,
             )
 
     async def start(self):
         await super().start()
         tg_handler.client = self
 
-        # Startup Cleanup
+        # Startup Cleanup (keeps the files pending uploads and restorable
+        # encodes still need)
         try:
-            import shutil
-            import os
-            if os.path.exists("downloads"):
-                shutil.rmtree("downloads")
-                os.makedirs("downloads")
-                log.info("Cleaned up downloads directory")
+            from bot.func.queue_manager import queue_manager
+            from bot.func.upload_manager import upload_manager
+
+            keep = await upload_manager.referenced_files()
+            keep |= await queue_manager.referenced_files()
+            clean_downloads(keep)
+            log.info(f"Cleaned up downloads directory (kept {len(keep)} paths)")
         except Exception as e:
             log.error(f"Failed to cleanup downloads: {e}")
 
@@ -104,6 +131,8 @@ class Bot(Client):
                     BotCommand("shell", "Run shell commands (Admin Only)"),
                     BotCommand("log", "Get logs (Admin Only)"),
                     BotCommand("info", "Get job info (Admin Only)"),
+                    BotCommand("priority", "Set job priority (Owner Only)"),
+                    BotCommand("cachestats", "Result cache stats (Owner Only)"),
                     BotCommand("broadcast", "Broadcast message (Admin Only)"),
                     BotCommand("admin", "Admin Panel (Owner Only)"),
                     BotCommand("help", "Get help"),
@@ -113,6 +142,14 @@ class Bot(Client):
         except Exception as e:
             log.error(f"Failed to set bot commands: {e}")
 
+        # Move blobs embedded in old settings documents into the asset store
+        try:
+            from database import migrate_settings_blobs
+
+            await migrate_settings_blobs()
+        except Exception as e:
+            log.error(f"Failed to migrate settings assets: {e}")
+
         # Restore Queue
         try:
             from bot.func.queue_manager import queue_manager
@@ -121,9 +158,28 @@ class Bot(Client):
         except Exception as e:
             log.error(f"Failed to restore queue: {e}")
 
+        # Restore uploads interrupted by the restart
+        try:
+            from bot.func.upload_manager import upload_manager
+
+            await upload_manager.restore_uploads(self)
+        except Exception as e:
+            log.error(f"Failed to restore uploads: {e}")
+
         session = await self.export_session_string()
         await set_variable(TG_BOT_TOKEN, session)
 
+    async def stop(self, *args, **kwargs):
+        # Write out queue changes still waiting on the debounce timer
+        try:
+            from bot.func.queue_manager import queue_manager
+
+            await queue_manager.flush()
+        except Exception as e:
+            log.error(f"Failed to flush queue: {e}")
+
+        return await super().stop(*args, **kwargs)
+
     async def send_msg(self, chat, text):
         await self.send_message(int(chat), text)
 
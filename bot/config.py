@@ -28,3 +28,114 @@ DB_URI = os.environ.get(
 DB_NAME = os.environ.get("DATABASE_NAME", "Cluster")
 
 TG_BOT_WORKERS = int(os.environ.get("TG_BOT_WORKERS", "50"))
+# Parallel file transfers (upload and download parts) of the Telegram client
+MAX_CONCURRENT_TRANSMISSIONS = int(os.environ.get("MAX_CONCURRENT_TRANSMISSIONS", "8"))
+
+# Delivery
+# Channel that receives a copy of every encode (0 disables)
+ENCODE_LOG_CHANNEL = int(os.environ.get("ENCODE_LOG_CHANNEL", "-1002252580234"))
+# Channels that archive every encode (space separated IDs)
+ARCHIVE_CHANNELS = [int(x) for x in os.environ.get("ARCHIVE_CHANNELS", "").split()]
+
+# Chunked encoding engine
+# Minimum input duration (seconds) before a job is split into chunks
+CHUNKED_MIN_DURATION = float(os.environ.get("CHUNKED_MIN_DURATION", "600"))
+# Encoder threads given to each chunk process
+CHUNK_THREADS = int(os.environ.get("CHUNK_THREADS", "4"))
+# Concurrent chunk processes (0 = cpu_count // CHUNK_THREADS)
+CHUNK_WORKERS = int(os.environ.get("CHUNK_WORKERS", "0"))
+
+# Encoded-result cache
+# Entries unused for this many days are dropped
+RESULT_CACHE_TTL_DAYS = int(os.environ.get("RESULT_CACHE_TTL_DAYS", "30"))
+# Maximum cached results (least recently used are evicted first)
+RESULT_CACHE_MAX_ENTRIES = int(os.environ.get("RESULT_CACHE_MAX_ENTRIES", "5000"))
+
+# Streaming download -> encode
+# Start encoding while the file is still downloading (streamable containers only)
+STREAMING_ENCODE = os.environ.get("STREAMING_ENCODE", "True").lower() in ("1", "true", "yes")
+# Bytes to download before probing the partial file for its duration
+STREAM_PROBE_BYTES = int(os.environ.get("STREAM_PROBE_BYTES", str(8 * 1024 * 1024)))
+
+# Queue persistence: seconds to coalesce job state changes before writing
+QUEUE_SAVE_DEBOUNCE = float(os.environ.get("QUEUE_SAVE_DEBOUNCE", "1.0"))
+
+# Fair-share scheduling
+# Extra-weight users (space separated ids)
+PREMIUM_USERS = [int(x) for x in os.environ.get("PREMIUM_USERS", "").split()]
+# Share of encode slots per scheduling round, relative to a regular user
+OWNER_WEIGHT = float(os.environ.get("OWNER_WEIGHT", "4"))
+PREMIUM_WEIGHT = float(os.environ.get("PREMIUM_WEIGHT", "2"))
+# Bytes a weight-1 user may dequeue per round (small files go first)
+SCHEDULER_QUANTUM_MB = int(os.environ.get("SCHEDULER_QUANTUM_MB", "1024"))
+
+# Adaptive admission of encode jobs
+# Stop admitting new jobs above these CPU / memory usage percentages
+ADMISSION_CPU_HIGH = float(os.environ.get("ADMISSION_CPU_HIGH", "90"))
+ADMISSION_MEM_HIGH = float(os.environ.get("ADMISSION_MEM_HIGH", "85"))
+# Grow capacity while CPU usage stays below this and jobs are waiting
+ADMISSION_CPU_LOW = float(os.environ.get("ADMISSION_CPU_LOW", "60"))
+# Stop admitting jobs and downloads below this much free disk space
+ADMISSION_DISK_MIN_GB = float(os.environ.get("ADMISSION_DISK_MIN_GB", "5"))
+# Seconds between resource samples
+ADMISSION_INTERVAL = float(os.environ.get("ADMISSION_INTERVAL", "5"))
+# Concurrent downloads
+DOWNLOAD_SLOTS = int(os.environ.get("DOWNLOAD_SLOTS", "4"))
+
+# Disk budget
+# Space always kept free, on top of the reservations
+DISK_RESERVE_MIN_FREE_GB = float(os.environ.get("DISK_RESERVE_MIN_FREE_GB", "2"))
+# Expected output size of a 1080p rendition as a fraction of the input size
+DISK_OUTPUT_RATIO = float(os.environ.get("DISK_OUTPUT_RATIO", "1.0"))
+
+# User settings cache
+SETTINGS_CACHE_SIZE = int(os.environ.get("SETTINGS_CACHE_SIZE", "1000"))
+# Seconds before a cached settings document is re-read from the database
+SETTINGS_CACHE_TTL = float(os.environ.get("SETTINGS_CACHE_TTL", "300"))
+
+# Progress message edits
+# Seconds between edits in one chat (shared by every progress message in it)
+EDIT_CHAT_INTERVAL = float(os.environ.get("EDIT_CHAT_INTERVAL", "1.5"))
+# Edits per second across all chats
+EDIT_GLOBAL_RATE = float(os.environ.get("EDIT_GLOBAL_RATE", "20"))
+
+# System stats sampler
+# Seconds between CPU/RAM/disk and per-job process samples
+SYSTEM_SAMPLE_INTERVAL = float(os.environ.get("SYSTEM_SAMPLE_INTERVAL", "2"))
+
+# Upload scheduling
+# Concurrent uploads at start, tuned between the min and max from throughput
+UPLOAD_WORKERS = int(os.environ.get("UPLOAD_WORKERS", "2"))
+UPLOAD_WORKERS_MIN = int(os.environ.get("UPLOAD_WORKERS_MIN", "1"))
+UPLOAD_WORKERS_MAX = int(os.environ.get("UPLOAD_WORKERS_MAX", "6"))
+# Seconds of waiting that count like halving a file's size (keeps big files from starving)
+UPLOAD_AGING_SECONDS = float(os.environ.get("UPLOAD_AGING_SECONDS", "300"))
+
+# Oversized outputs
+# Outputs above this are split at keyframes into parts (Telegram bots: 2000 MB)
+UPLOAD_PART_SIZE_MB = int(os.environ.get("UPLOAD_PART_SIZE_MB", "1990"))
+
+# Auto quality (per-title CRF)
+# Samples encoded per candidate CRF, and their length in seconds
+AUTO_CRF_SAMPLES = int(os.environ.get("AUTO_CRF_SAMPLES", "3"))
+AUTO_CRF_SAMPLE_SECONDS = float(os.environ.get("AUTO_CRF_SAMPLE_SECONDS", "4"))
+
+# Screenshots (/ss)
+# Frames when no count is given, and the most one request may ask for
+SS_DEFAULT_COUNT = int(os.environ.get("SS_DEFAULT_COUNT", "5"))
+SS_MAX_COUNT = int(os.environ.get("SS_MAX_COUNT", "20"))
+# FFmpeg seek processes running at once, shared by all requests
+SS_WORKERS = int(os.environ.get("SS_WORKERS", "4"))
+# Width in pixels of a contact sheet
+SS_SHEET_WIDTH = int(os.environ.get("SS_SHEET_WIDTH", "1920"))
+# Inputs from this size on are screenshot from partial range fetches instead
+# of a full download: the first/last MB of the container and a window per frame
+SS_RANGE_MIN_MB = int(os.environ.get("SS_RANGE_MIN_MB", "100"))
+SS_RANGE_HEAD_MB = int(os.environ.get("SS_RANGE_HEAD_MB", "4"))
+SS_RANGE_WINDOW_MB = int(os.environ.get("SS_RANGE_WINDOW_MB", "8"))
+
+# Watermark previews
+# Width in pixels of the preview image (rendered on a 1920x1080 frame)
+PREVIEW_WIDTH = int(os.environ.get("PREVIEW_WIDTH", "1280"))
+# Rendered previews kept on disk, least recently used ones are removed first
+PREVIEW_CACHE_SIZE = int(os.environ.get("PREVIEW_CACHE_SIZE", "200"))
@@ -0,0 +1,196 @@
+# Developed by ARGON telegram: @REACTIVEARGON
+import asyncio
+import os
+from typing import Dict, Optional
+
+from bot.config import (
+    ADMISSION_CPU_HIGH,
+    ADMISSION_CPU_LOW,
+    ADMISSION_DISK_MIN_GB,
+    ADMISSION_INTERVAL,
+    ADMISSION_MEM_HIGH,
+    CHUNK_THREADS,
+)
+from bot.func.chunked import get_chunk_workers
+from bot.func.ffmpeg_utils import chunked_applies
+from bot.func.sys_stats import stats_sampler
+from bot.logger import LOGGER
+
+log = LOGGER(__name__)
+
+# Relative CPU cost of one 1080p encode, per codec and preset
+CODEC_COST = {
+    "libx264": 1.0,
+    "libx265": 2.0,
+    "libvpx-vp9": 2.5,
+    "libsvtav1": 2.0,
+    "libaom-av1": 4.0,
+    "mpeg4": 0.4,
+}
+PRESET_COST = {
+    "ultrafast": 0.25,
+    "superfast": 0.35,
+    "veryfast": 0.5,
+    "faster": 0.7,
+    "fast": 0.85,
+    "medium": 1.0,
+    "slow": 1.5,
+    "slower": 2.2,
+    "veryslow": 3.0,
+    "placebo": 4.0,
+}
+RESOLUTION_PIXELS = {
+    "1080p": 1920 * 1080,
+    "720p": 1280 * 720,
+    "480p": 854 * 480,
+    "360p": 640 * 360,
+}
+# Jobs shorter than this finish before they can oversubscribe for long
+SHORT_JOB_SECONDS = 120
+
+
+def estimate_cost(settings: Dict, duration: float = 0) -> float:
+    """
+    Estimated number of CPU cores a job keeps busy.
+    One medium-preset 1080p x264 encode is roughly one core's worth of work
+    per unit; it is scaled to the machine's core count by the controller.
+    """
+    video = settings.get("video", {})
+    codec_factor = CODEC_COST.get(video.get("codec", "mpeg4"), 1.0)
+    preset_factor = PRESET_COST.get(video.get("preset", "medium"), 1.0)
+
+    resolutions = video.get("resolution", ["1080p"])
+    if isinstance(resolutions, str):
+        resolutions = [resolutions]
+    per_output = [
+        RESOLUTION_PIXELS.get(res, RESOLUTION_PIXELS["1080p"]) / RESOLUTION_PIXELS["1080p"]
+        for res in resolutions
+    ] or [1.0]
+
+    # A single-decode graph encodes every rendition at once, otherwise one at a time
+    if len(per_output) > 1 and video.get("single_decode", True):
+        pixel_factor = sum(per_output)
+    else:
+        pixel_factor = max(per_output)
+
+    cost = codec_factor * preset_factor * pixel_factor * 2
+    # Only when the chunked engine really runs, see generate_ffmpeg_cmd
+    if chunked_applies(settings, duration):
+        cost = max(cost, float(get_chunk_workers() * CHUNK_THREADS) / 2)
+    if 0 < duration < SHORT_JOB_SECONDS:
+        cost /= 2
+
+    return round(min(max(cost, 0.25), os.cpu_count() or 1), 2)
+
+
+def disk_pressure() -> bool:
+    try:
+        return stats_sampler.get_snapshot().disk_free < ADMISSION_DISK_MIN_GB * 1024**3
+    except Exception:
+        return False
+
+
+class AdmissionController:
+    """
+    Admits encode jobs while their estimated core cost fits the capacity.
+
+    Capacity starts at the core count and is tuned from measured load: it
+    shrinks while CPU or memory is above the high watermark and grows while
+    CPU is idle and jobs are waiting. Nothing new is admitted under
+    CPU/memory/disk pressure, but one job can always run.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(AdmissionController, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+        self.cores = os.cpu_count() or 1
+        self.capacity = float(self.cores)
+        self.min_capacity = 1.0
+        self.max_capacity = float(self.cores * 2)
+        self.pressure = ""
+        self.cpu = 0.0
+        self.memory = 0.0
+        self._running: Dict[str, float] = {}
+        self._waiting = 0
+        self._cond: Optional[asyncio.Condition] = None
+        self._tuner: Optional[asyncio.Task] = None
+        self._initialized = True
+        log.info(f"AdmissionController initialized with {self.capacity:.1f} core capacity")
+
+    @property
+    def in_use(self) -> float:
+        return sum(self._running.values())
+
+    def _fits(self, cost: float) -> bool:
+        if not self._running:
+            return True
+        if self.pressure:
+            return False
+        return self.in_use + cost <= self.capacity
+
+    async def acquire(self, job_id: str, cost: float):
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        if self._tuner is None or self._tuner.done():
+            self._tuner = asyncio.create_task(self._tune())
+
+        async with self._cond:
+            self._waiting += 1
+            try:
+                await self._cond.wait_for(lambda: self._fits(cost))
+            finally:
+                self._waiting -= 1
+            self._running[job_id] = cost
+        log.info(
+            f"Admitted job {job_id} (cost {cost:.2f}, {self.in_use:.2f}/{self.capacity:.1f} cores)"
+        )
+
+    async def release(self, job_id: str):
+        if self._cond is None:
+            return
+        async with self._cond:
+            self._running.pop(job_id, None)
+            self._cond.notify_all()
+
+    async def _tune(self):
+        while True:
+            await asyncio.sleep(ADMISSION_INTERVAL)
+            try:
+                system = stats_sampler.get_snapshot()
+                self.cpu = system.cpu
+                self.memory = system.ram
+
+                if self.cpu > ADMISSION_CPU_HIGH or self.memory > ADMISSION_MEM_HIGH:
+                    self.pressure = "cpu" if self.cpu > ADMISSION_CPU_HIGH else "memory"
+                    self.capacity = max(self.min_capacity, self.capacity * 0.8)
+                elif disk_pressure():
+                    self.pressure = "disk"
+                else:
+                    self.pressure = ""
+                    if self._waiting and self.cpu < ADMISSION_CPU_LOW:
+                        self.capacity = min(self.max_capacity, self.capacity + 1)
+
+                async with self._cond:
+                    self._cond.notify_all()
+            except Exception as e:
+                log.error(f"Admission tuning failed: {e}")
+
+    def get_stats(self) -> Dict:
+        return {
+            "capacity": self.capacity,
+            "in_use": self.in_use,
+            "running": len(self._running),
+            "waiting": self._waiting,
+            "pressure": self.pressure,
+        }
+
+
+admission = AdmissionController()
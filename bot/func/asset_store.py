@@ -0,0 +1,76 @@
+# Developed by ARGON telegram: @REACTIVEARGON
+import asyncio
+import hashlib
+import os
+from typing import Dict, Optional
+
+from bot.logger import LOGGER
+from database import get_asset, put_asset
+
+log = LOGGER(__name__)
+
+ASSET_DIR = "assets"
+
+# File extensions per asset kind (FFmpeg probes the content, these are for humans)
+THUMBNAIL_EXT = ".jpg"
+IMAGE_EXT = ".png"
+FONT_EXT = ".ttf"
+
+_locks: Dict[str, asyncio.Lock] = {}
+
+
+def asset_path(digest: str, ext: str = "") -> str:
+    return os.path.join(os.getcwd(), ASSET_DIR, f"{digest}{ext}")
+
+
+def _write_atomic(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+async def store_asset(data: bytes, ext: str = "") -> str:
+    """
+    Stores bytes once, keyed by their SHA-256, in the database and on disk.
+    Returns the hash that settings keep as a reference.
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    await put_asset(digest, data)
+
+    path = asset_path(digest, ext)
+    if not os.path.exists(path):
+        _write_atomic(path, data)
+    return digest
+
+
+async def materialize(digest: str, ext: str = "") -> Optional[str]:
+    """
+    Returns the local path of an asset, fetching it from the database only
+    when this machine does not have it yet. Files are shared by every job.
+    """
+    if not digest:
+        return None
+
+    path = asset_path(digest, ext)
+    if os.path.exists(path):
+        return path
+
+    lock = _locks.setdefault(digest, asyncio.Lock())
+    async with lock:
+        if os.path.exists(path):
+            return path
+
+        data = await get_asset(digest)
+        if data is None:
+            log.error(f"Asset {digest} not found")
+            return None
+
+        try:
+            _write_atomic(path, data)
+            log.info(f"Materialized asset {digest}{ext}")
+        except Exception as e:
+            log.error(f"Failed to write asset {digest}: {e}")
+            return None
+    return path
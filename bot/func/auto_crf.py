@@ -0,0 +1,189 @@
+# Developed by ARGON telegram: @REACTIVEARGON
+import asyncio
+import os
+import re
+import shutil
+from typing import Dict, List, Optional
+
+from bot.config import AUTO_CRF_SAMPLE_SECONDS, AUTO_CRF_SAMPLES
+from bot.func.ffmpeg_utils import get_scale_filter
+from bot.func.probe import MediaInfo
+from bot.logger import LOGGER
+
+log = LOGGER(__name__)
+
+# Candidate CRFs per codec, best quality first. Codecs without a real CRF
+# mode (e.g. mpeg4) are left alone.
+CRF_CANDIDATES = {
+    "libx264": [18, 20, 22, 24, 26, 28, 30],
+    "libx265": [20, 22, 24, 26, 28, 30, 32],
+    "libvpx-vp9": [24, 28, 32, 36, 40, 44],
+    "libaom-av1": [24, 28, 32, 36, 40, 44],
+    "libsvtav1": [24, 28, 32, 36, 40, 44],
+}
+# Inputs shorter than this are not worth probing
+MIN_DURATION = 30.0
+
+_VMAF_SCORE = re.compile(r"VMAF score[:=]\s*([\d.]+)")
+_SSIM_SCORE = re.compile(r"SSIM .*All:([\d.]+)")
+
+_has_vmaf: Optional[bool] = None
+
+
+async def _run(*args: str) -> str:
+    """Runs FFmpeg and returns its stderr, raising on failure."""
+    proc = await asyncio.create_subprocess_exec(
+        "ffmpeg",
+        "-hide_banner",
+        *args,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    _, stderr = await proc.communicate()
+    output = stderr.decode(errors="ignore")
+    if proc.returncode != 0:
+        raise RuntimeError(output[-500:])
+    return output
+
+
+async def has_vmaf() -> bool:
+    """Whether this FFmpeg build has libvmaf (checked once)."""
+    global _has_vmaf
+    if _has_vmaf is None:
+        try:
+            _has_vmaf = "libvmaf" in await _run("-filters")
+        except Exception:
+            _has_vmaf = False
+    return _has_vmaf
+
+
+def _resolution_height(res: str) -> int:
+    """Height of a resolution label such as "720p", 0 when it has none."""
+    digits = res.rstrip("p")
+    return int(digits) if digits.isdigit() else 0
+
+
+def ssim_floor(vmaf_floor: float) -> float:
+    """Rough SSIM equivalent of a VMAF floor, for builds without libvmaf."""
+    return 1 - (100 - vmaf_floor) * 0.004
+
+
+class AutoCRF:
+    """
+    Picks a per-title CRF: short samples of the input are encoded at every
+    candidate CRF in parallel, scored against the source with VMAF (SSIM
+    when libvmaf is missing), and the highest CRF whose worst sample still
+    meets the quality floor wins.
+
+    The CRF is measured at the largest rendition and applied to every one:
+    it is the rendition most viewers watch, and the one whose artifacts show
+    the most. Samples run single-threaded, at most cost at once, so probing
+    stays within the cores admission reserved for the job.
+    """
+
+    def __init__(
+        self,
+        input_file: str,
+        settings: Dict,
+        media_info: MediaInfo,
+        work_dir: str,
+        cost: float = 1.0,
+    ):
+        video = settings.get("video", {})
+        self.input_file = input_file
+        self.codec = video.get("codec", "mpeg4")
+        self.preset = video.get("preset", "medium")
+        self.floor = float(video.get("auto_quality", 0) or 0)
+        resolutions = video.get("resolution", ["1080p"])
+        if isinstance(resolutions, str):
+            resolutions = [resolutions]
+        self.resolution = max(resolutions or ["1080p"], key=_resolution_height)
+        self.media_info = media_info
+        self.work_dir = work_dir
+        self.workers = max(1, int(cost))
+
+    def _sample_starts(self) -> List[float]:
+        duration = self.media_info.duration
+        count = max(1, AUTO_CRF_SAMPLES)
+        # Spread over the middle of the title, away from intro and credits
+        return [duration * (i + 1) / (count + 1) for i in range(count)]
+
+    def _scale(self) -> str:
+        if self.media_info.height and str(self.media_info.height) == self.resolution.rstrip("p"):
+            return "null"
+        return get_scale_filter(self.resolution) or "null"
+
+    async def _encode_sample(self, start: float, crf: int, index: int) -> str:
+        path = os.path.join(self.work_dir, f"s{index}_crf{crf}.mkv")
+        await _run(
+            "-y",
+            "-ss", f"{start:.3f}",
+            "-i", self.input_file,
+            "-t", f"{AUTO_CRF_SAMPLE_SECONDS:.3f}",
+            "-map", "0:v:0",
+            "-vf", self._scale(),
+            "-c:v", self.codec,
+            "-crf", str(crf),
+            "-preset", self.preset,
+            "-threads", "1",
+            "-an", "-sn",
+            path,
+        )
+        return path
+
+    async def _score(self, sample: str, start: float) -> float:
+        """Quality of an encoded sample against the same span of the source."""
+        vmaf = await has_vmaf()
+        metric = "libvmaf" if vmaf else "ssim"
+        # The reference gets the same scaling, so both sides match in size
+        graph = (
+            "[0:v]setpts=PTS-STARTPTS[dist];"
+            f"[1:v]{self._scale()},setpts=PTS-STARTPTS[ref];"
+            f"[dist][ref]{metric}"
+        )
+        output = await _run(
+            "-i", sample,
+            "-ss", f"{start:.3f}",
+            "-t", f"{AUTO_CRF_SAMPLE_SECONDS:.3f}",
+            "-i", self.input_file,
+            "-lavfi", graph,
+            "-threads", "1",
+            "-f", "null", "-",
+        )
+        match = (_VMAF_SCORE if vmaf else _SSIM_SCORE).search(output)
+        if not match:
+            raise RuntimeError(f"No {metric} score in FFmpeg output")
+        return float(match.group(1))
+
+    async def select(self) -> Optional[int]:
+        """The chosen CRF, or None when auto quality does not apply."""
+        candidates = CRF_CANDIDATES.get(self.codec)
+        if not candidates or self.floor <= 0 or self.media_info.duration < MIN_DURATION:
+            return None
+
+        floor = self.floor if await has_vmaf() else ssim_floor(self.floor)
+        starts = self._sample_starts()
+        semaphore = asyncio.Semaphore(self.workers)
+
+        async def measure(crf: int) -> float:
+            scores = []
+            for i, start in enumerate(starts):
+                async with semaphore:
+                    sample = await self._encode_sample(start, crf, i)
+                    scores.append(await self._score(sample, start))
+                    os.remove(sample)
+            # The worst sample decides, a title is only as good as its hardest scene
+            return min(scores)
+
+        os.makedirs(self.work_dir, exist_ok=True)
+        try:
+            results = await asyncio.gather(*(measure(crf) for crf in candidates))
+        finally:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+
+        scores = dict(zip(candidates, results))
+        log.info(f"Auto CRF scores for {os.path.basename(self.input_file)}: {scores}")
+
+        passing = [crf for crf in candidates if scores[crf] >= floor]
+        # Nothing meets the floor: best quality we tried
+        return max(passing) if passing else candidates[0]
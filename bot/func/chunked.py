@@ -0,0 +1,379 @@
+# Developed by ARGON telegram: @REACTIVEARGON
+import asyncio
+import csv
+import json
+import os
+import shutil
+from typing import Dict, List, Optional, Set
+
+import psutil
+
+from bot.config import CHUNK_THREADS, CHUNK_WORKERS
+from bot.func.ffmpeg_progress import ProgressReader, ProgressSnapshot
+from bot.logger import LOGGER
+
+log = LOGGER(__name__)
+
+MANIFEST_NAME = "manifest.json"
+
+
+def get_chunk_workers() -> int:
+    """Number of chunks encoded at once, sized to the machine."""
+    if CHUNK_WORKERS > 0:
+        return CHUNK_WORKERS
+    return max(1, (os.cpu_count() or 1) // max(1, CHUNK_THREADS))
+
+
+def checkpoint_dirs(inputs: Set[str], root: str = "downloads") -> Set[str]:
+    """Chunk work dirs under root holding a checkpoint of one of inputs."""
+    dirs = set()
+    # Inputs sit in per-request dirs, so are their work dirs
+    for parent, names, _ in os.walk(root):
+        for name in names:
+            manifest = os.path.join(parent, name, MANIFEST_NAME)
+            if not name.endswith("_chunks") or not os.path.isfile(manifest):
+                continue
+            try:
+                with open(manifest) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if data.get("input") in inputs:
+                dirs.add(os.path.abspath(os.path.join(parent, name)))
+    return dirs
+
+
+class ChunkedEncoder:
+    """
+    Chunked encoding engine.
+
+    1. Splits the video stream at keyframes into segments (stream copy).
+    2. Encodes the segments concurrently, one FFmpeg process per segment.
+    3. Concatenates the encoded segments losslessly and muxes them with the
+       original audio/subtitles into the final output.
+
+    Timestamps are preserved (-copyts) so time-based watermark filters behave
+    exactly as in a single-process encode.
+
+    The split and every finished chunk are recorded in a manifest in the work
+    dir. When the bot restarts mid-encode, the restored job finds the
+    manifest and only encodes the chunks that are still missing.
+    """
+
+    def __init__(
+        self,
+        input_file: str,
+        output_file: str,
+        chunk_args: Dict,
+        duration: float,
+        thumbnail_path: Optional[str] = None,
+    ):
+        self.input_file = input_file
+        self.output_file = output_file
+        self.video_args: List[str] = chunk_args["video_args"]
+        self.is_complex: bool = chunk_args.get("complex", False)
+        self.mux_args: List[str] = chunk_args["mux_args"]
+        self.duration = duration
+        self.thumbnail_path = thumbnail_path
+        self.work_dir = f"{os.path.splitext(output_file)[0]}_chunks"
+        self.manifest_path = os.path.join(self.work_dir, MANIFEST_NAME)
+        self.workers = get_chunk_workers()
+
+        self.segments: List[Dict] = []  # {"file", "start", "end"}
+        self.progress: Dict[int, float] = {}  # segment index -> seconds encoded
+        self.frames: Dict[int, int] = {}
+        self.fps: Dict[int, float] = {}
+        self.done: Set[int] = set()  # segment indexes already encoded
+        self.stage = "Splitting"
+        self.error = ""
+        self.is_cancelled = False
+
+        self._procs: Dict[str, asyncio.subprocess.Process] = {}
+        self._resume_event = asyncio.Event()
+        self._resume_event.set()
+
+    # --- Stats ---
+
+    @property
+    def encoded_seconds(self) -> float:
+        return sum(self.progress.values())
+
+    @property
+    def total_frames(self) -> int:
+        return sum(self.frames.values())
+
+    @property
+    def current_fps(self) -> float:
+        return sum(self.fps.get(int(k), 0.0) for k in self._procs if k.isdigit())
+
+    @property
+    def pids(self) -> List[int]:
+        return [p.pid for p in self._procs.values() if p.returncode is None]
+
+    # --- Control ---
+
+    def pause(self):
+        self._resume_event.clear()
+        self._signal("suspend")
+
+    def resume(self):
+        self._signal("resume")
+        self._resume_event.set()
+
+    def cancel(self):
+        self.is_cancelled = True
+        self._terminate()
+        self._resume_event.set()
+
+    def _signal(self, action: str):
+        for pid in self.pids:
+            try:
+                getattr(psutil.Process(pid), action)()
+            except Exception as e:
+                log.error(f"Failed to {action} chunk process {pid}: {e}")
+
+    def _terminate(self):
+        for proc in list(self._procs.values()):
+            if proc.returncode is None:
+                try:
+                    proc.terminate()
+                except Exception:
+                    pass
+
+    # --- Pipeline ---
+
+    async def _run_ffmpeg(self, key: str, args: List[str], segment: Optional[int] = None) -> bool:
+        """Runs one FFmpeg step, feeding -progress output into the chunk stats."""
+        proc = await asyncio.create_subprocess_exec(
+            "ffmpeg",
+            "-v",
+            "error",
+            "-nostats",
+            "-progress",
+            "pipe:1",
+            "-y",
+            *args,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        self._procs[key] = proc
+
+        reader = ProgressReader(proc)
+        if segment is not None:
+            reader.subscribe(lambda snapshot: self._on_progress(segment, snapshot))
+
+        try:
+            await reader.start().wait()
+            await proc.wait()
+        finally:
+            self._procs.pop(key, None)
+
+        if proc.returncode != 0 and not self.is_cancelled:
+            self.error = reader.stderr_tail()[-1000:] or f"{key} exited with {proc.returncode}"
+            log.error(f"Chunked step {key} failed: {self.error}")
+            return False
+
+        return proc.returncode == 0
+
+    def _on_progress(self, index: int, snapshot: ProgressSnapshot):
+        self.frames[index] = snapshot.frame
+        self.fps[index] = snapshot.fps
+        try:
+            seg = self.segments[index]
+        except IndexError:
+            return
+        seconds = snapshot.out_seconds
+        # With -copyts the output clock may carry the segment offset
+        if seconds >= seg["start"] > 0:
+            seconds -= seg["start"]
+        self.progress[index] = max(0.0, min(seconds, seg["end"] - seg["start"]))
+
+    # --- Checkpoint ---
+
+    def _load_manifest(self) -> bool:
+        """Restores the split and finished chunks of an interrupted run."""
+        try:
+            with open(self.manifest_path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        if (
+            data.get("input") != os.path.abspath(self.input_file)
+            or data.get("input_size") != os.path.getsize(self.input_file)
+            or data.get("video_args") != self.video_args
+        ):
+            log.info(f"Discarding stale checkpoint in {self.work_dir}")
+            return False
+
+        segments = [
+            {
+                "file": os.path.join(self.work_dir, seg["file"]),
+                "start": seg["start"],
+                "end": seg["end"],
+            }
+            for seg in data.get("segments", [])
+        ]
+        if not segments or not all(os.path.exists(seg["file"]) for seg in segments):
+            return False
+
+        self.segments = segments
+        for index in data.get("done", []):
+            if 0 <= index < len(segments) and os.path.exists(self._encoded_path(index)):
+                self.done.add(index)
+                self.progress[index] = segments[index]["end"] - segments[index]["start"]
+
+        log.info(
+            f"Resuming {self.output_file} from checkpoint: "
+            f"{len(self.done)}/{len(self.segments)} chunks already encoded"
+        )
+        return True
+
+    def _save_manifest(self):
+        data = {
+            "input": os.path.abspath(self.input_file),
+            "input_size": os.path.getsize(self.input_file),
+            "video_args": self.video_args,
+            "segments": [
+                {"file": os.path.basename(seg["file"]), "start": seg["start"], "end": seg["end"]}
+                for seg in self.segments
+            ],
+            "done": sorted(self.done),
+        }
+        tmp_path = self.manifest_path + ".tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            # Atomic, a crash never leaves a half written manifest
+            os.replace(tmp_path, self.manifest_path)
+        except OSError as e:
+            log.error(f"Failed to write checkpoint {self.manifest_path}: {e}")
+
+    async def _split(self) -> bool:
+        # Aim for two segments per worker so fast chunks keep every slot busy
+        segment_time = max(30.0, self.duration / (self.workers * 2))
+        list_file = os.path.join(self.work_dir, "segments.csv")
+
+        ok = await self._run_ffmpeg(
+            "split",
+            [
+                "-i",
+                self.input_file,
+                "-map",
+                "0:v:0",
+                "-c",
+                "copy",
+                "-f",
+                "segment",
+                "-segment_time",
+                f"{segment_time:.3f}",
+                "-segment_list",
+                list_file,
+                "-segment_list_type",
+                "csv",
+                os.path.join(self.work_dir, "seg_%04d.mkv"),
+            ],
+        )
+        if not ok:
+            return False
+
+        self.segments = []
+        with open(list_file, newline="") as f:
+            for row in csv.reader(f):
+                if len(row) < 3:
+                    continue
+                self.segments.append(
+                    {
+                        "file": os.path.join(self.work_dir, os.path.basename(row[0])),
+                        "start": float(row[1]),
+                        "end": float(row[2]),
+                    }
+                )
+
+        log.info(
+            f"Split {self.input_file} into {len(self.segments)} chunks "
+            f"({self.workers} parallel workers)"
+        )
+        return bool(self.segments)
+
+    def _encoded_path(self, index: int) -> str:
+        return os.path.join(self.work_dir, f"enc_{index:04d}.mkv")
+
+    async def _encode_segment(self, index: int) -> bool:
+        seg = self.segments[index]
+        args = ["-copyts", "-i", seg["file"]]
+        if not self.is_complex:
+            args.extend(["-map", "0:v:0"])
+        args.extend(self.video_args)
+        args.extend(["-threads", str(CHUNK_THREADS), "-an", "-sn", self._encoded_path(index)])
+
+        ok = await self._run_ffmpeg(str(index), args, segment=index)
+        if ok:
+            self.progress[index] = seg["end"] - seg["start"]
+            self.done.add(index)
+            self._save_manifest()
+        return ok
+
+    async def _concat(self) -> bool:
+        list_file = os.path.join(self.work_dir, "concat.txt")
+        with open(list_file, "w") as f:
+            for i in range(len(self.segments)):
+                f.write(f"file '{os.path.basename(self._encoded_path(i))}'\n")
+
+        args = ["-f", "concat", "-safe", "0", "-i", list_file, "-i", self.input_file]
+        if self.thumbnail_path:
+            args.extend(["-i", self.thumbnail_path])
+
+        args.extend(["-map", "0:v", "-map", "1:a?", "-map", "1:s?", "-c:v", "copy"])
+        if self.thumbnail_path:
+            args.extend(["-map", "2", "-c:v:1", "png", "-disposition:v:1", "attached_pic"])
+
+        args.extend(self.mux_args)
+        args.append(self.output_file)
+
+        return await self._run_ffmpeg("merge", args)
+
+    async def run(self) -> bool:
+        """Runs the whole pipeline. Returns True when output_file is complete."""
+        os.makedirs(self.work_dir, exist_ok=True)
+        semaphore = asyncio.Semaphore(self.workers)
+
+        async def encode_worker(index: int) -> bool:
+            async with semaphore:
+                # Do not start new chunks while the job is paused
+                await self._resume_event.wait()
+                if self.is_cancelled or self.error:
+                    return False
+                ok = await self._encode_segment(index)
+                if not ok:
+                    # One failed chunk fails the job, stop the others
+                    self._terminate()
+                return ok
+
+        interrupted = False
+        try:
+            if not self._load_manifest():
+                if not await self._split():
+                    return False
+                self._save_manifest()
+
+            self.stage = "Encoding"
+            results = await asyncio.gather(
+                *(
+                    encode_worker(i)
+                    for i in range(len(self.segments))
+                    if i not in self.done
+                )
+            )
+            if not all(results) or self.is_cancelled:
+                return False
+
+            self.stage = "Merging"
+            return await self._concat()
+        except asyncio.CancelledError:
+            # Shutdown, not a failure: keep the checkpoint for the restored job
+            interrupted = True
+            raise
+        finally:
+            if not interrupted:
+                shutil.rmtree(self.work_dir, ignore_errors=True)
@@ -0,0 +1,159 @@
+# Developed by ARGON telegram: @REACTIVEARGON
+import asyncio
+import os
+from typing import Dict, List, Optional
+
+import psutil
+
+from bot.config import ADMISSION_INTERVAL, DISK_OUTPUT_RATIO, DISK_RESERVE_MIN_FREE_GB
+from bot.func.admission import RESOLUTION_PIXELS
+from bot.func.sys_stats import stats_sampler
+from bot.logger import LOGGER
+
+log = LOGGER(__name__)
+
+OUTPUTS_SUFFIX = "::outputs"
+
+
+def estimate_output_size(settings: Dict, input_size: int) -> int:
+    """Rough upper bound of the bytes an encode writes next to its input."""
+    video = settings.get("video", {})
+    resolutions = video.get("resolution", ["1080p"])
+    if isinstance(resolutions, str):
+        resolutions = [resolutions]
+
+    target_mb = float(video.get("target_size_mb", 0) or 0)
+
+    total = 0.0
+    for res in resolutions:
+        if target_mb > 0:
+            # Two-pass output lands close to the target
+            total += target_mb * 1024 * 1024 * 1.05
+            continue
+        ratio = RESOLUTION_PIXELS.get(res, RESOLUTION_PIXELS["1080p"]) / RESOLUTION_PIXELS["1080p"]
+        total += input_size * DISK_OUTPUT_RATIO * min(1.0, ratio)
+
+    # Split + encoded segments live next to the final output
+    if video.get("chunked"):
+        total += input_size * 2
+
+    return int(total)
+
+
+class DiskBudget:
+    """
+    Reserves disk space for jobs before they download.
+
+    Reservations are keyed by file path: a job reserves its input size plus
+    the estimated size of its outputs up front, hands the output part over
+    to the real output paths once they are known, and every path is released
+    when its file is removed. Only the not yet written part of a reservation
+    counts against the free space, so growing downloads are not counted twice.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(DiskBudget, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+        self._reservations: Dict[str, int] = {}
+        self._min_free = int(DISK_RESERVE_MIN_FREE_GB * 1024**3)
+        self._cond: Optional[asyncio.Condition] = None
+        self._initialized = True
+        log.info(f"DiskBudget initialized ({DISK_RESERVE_MIN_FREE_GB} GB kept free)")
+
+    @staticmethod
+    def _key(path: str) -> str:
+        # Pyrogram returns absolute download paths, callers may pass relative ones
+        return os.path.abspath(path) if path else ""
+
+    @staticmethod
+    def _written(key: str) -> int:
+        try:
+            return os.path.getsize(key)
+        except OSError:
+            return 0
+
+    @property
+    def reserved(self) -> int:
+        return sum(self._reservations.values())
+
+    @property
+    def outstanding(self) -> int:
+        """Reserved bytes not yet on disk."""
+        return sum(
+            max(0, size - self._written(key)) for key, size in self._reservations.items()
+        )
+
+    def available(self) -> int:
+        free = psutil.disk_usage(".").free
+        return free - self.outstanding - self._min_free
+
+    def fits(self, size: int) -> bool:
+        return size <= self.available()
+
+    async def reserve(self, key: str, input_size: int, output_size: int = 0) -> bool:
+        """
+        Waits until input_size + output_size fits the budget and reserves it.
+        Returns False right away if it cannot fit even with nothing else reserved.
+        """
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+
+        key = self._key(key)
+        size = input_size + output_size
+        async with self._cond:
+            while not self.fits(size):
+                if not self._reservations:
+                    log.warning(f"Not enough disk space for {key} ({size} bytes)")
+                    return False
+                try:
+                    # Files shrink and jobs finish without notifying, poll as well
+                    await asyncio.wait_for(self._cond.wait(), timeout=ADMISSION_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+
+            self._reservations[key] = input_size
+            if output_size:
+                self._reservations[key + OUTPUTS_SUFFIX] = output_size
+        return True
+
+    def assign_outputs(self, key: str, output_files: List[str]):
+        """Moves the output estimate of key onto the actual output paths."""
+        key = self._key(key)
+        pending = self._reservations.pop(key + OUTPUTS_SUFFIX, 0)
+        if not pending or not output_files:
+            return
+        share = pending // len(output_files)
+        for output_file in map(self._key, output_files):
+            self._reservations[output_file] = self._reservations.get(output_file, 0) + share
+
+    def release(self, *keys: str):
+        for key in map(self._key, keys):
+            self._reservations.pop(key, None)
+            self._reservations.pop(key + OUTPUTS_SUFFIX, None)
+        if self._cond is not None:
+            asyncio.create_task(self._notify())
+
+    async def _notify(self):
+        async with self._cond:
+            self._cond.notify_all()
+
+    def get_stats(self) -> Dict:
+        system = stats_sampler.get_snapshot()
+        return {
+            "reserved": self.reserved,
+            "outstanding": self.outstanding,
+            "free": system.disk_free,
+            "total": system.disk_total,
+            "reservations": len(self._reservations),
+        }
+
+
+disk_budget = DiskBudget()
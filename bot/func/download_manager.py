@@ -1,6 +1,8 @@
 # Developed by ARGON telegram: @REACTIVEARGON
 import asyncio
 
+from bot.config import ADMISSION_INTERVAL, DOWNLOAD_SLOTS
+from bot.func.admission import disk_pressure
 from bot.logger import LOGGER
 
 log = LOGGER(__name__)
@@ -18,12 +20,15 @@ class DownloadManager:
     def __init__(self):
         if self._initialized:
             return
-        self._semaphore = asyncio.Semaphore(4)
+        self._semaphore = asyncio.Semaphore(DOWNLOAD_SLOTS)
         self._initialized = True
-        log.info("DownloadManager initialized with 4 concurrent slots")
+        log.info(f"DownloadManager initialized with {DOWNLOAD_SLOTS} concurrent slots")
 
     async def acquire(self):
         await self._semaphore.acquire()
+        # Hold new downloads while the disk is nearly full
+        while disk_pressure():
+            await asyncio.sleep(ADMISSION_INTERVAL)
 
     def release(self):
         self._semaphore.release()
@@ -0,0 +1,228 @@
+# Developed by ARGON telegram: @REACTIVEARGON
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from pyrogram.errors import FloodWait, MessageIdInvalid, MessageNotModified
+from pyrogram.types import InlineKeyboardMarkup, Message
+
+from bot.config import EDIT_CHAT_INTERVAL, EDIT_GLOBAL_RATE
+from bot.logger import LOGGER
+
+log = LOGGER(__name__)
+
+# Chat intervals are multiplied by up to this after FloodWaits
+MAX_BACKOFF = 8.0
+# Remembered last texts (to skip unchanged edits)
+MAX_TRACKED_MESSAGES = 2000
+# Longest wait in finish() for an edit already sent (Pyrogram may sleep
+# through short FloodWaits itself)
+FINISH_TIMEOUT = 15.0
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def ready_at(self, now: float) -> float:
+        """When the next token is available."""
+        self._refill(now)
+        if self.tokens >= 1:
+            return now
+        return now + (1 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+
+class EditScheduler:
+    """
+    Central, rate-budgeted queue for progress message edits.
+
+    Progress loops submit their latest text and return immediately. Only the
+    newest text per message is kept, texts identical to what the message
+    already shows are dropped, and edits go out within a per-chat and a
+    global token bucket. A FloodWait blocks the chat for the requested time
+    and slows that chat down until edits succeed again.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(EditScheduler, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+        # (chat_id, message_id) -> (message, text, reply_markup), oldest first
+        self._pending: "OrderedDict[Tuple[int, int], tuple]" = OrderedDict()
+        self._shown: "OrderedDict[Tuple[int, int], tuple]" = OrderedDict()
+        # key -> Event set when the edit sent for it completes
+        self._inflight: Dict[Tuple[int, int], asyncio.Event] = {}
+        # In flight keys discarded meanwhile: a FloodWait must not requeue them
+        self._discarded: set = set()
+        self._chats: Dict[int, TokenBucket] = {}
+        self._backoff: Dict[int, float] = {}
+        self._blocked_until: Dict[int, float] = {}
+        self._global = TokenBucket(EDIT_GLOBAL_RATE, EDIT_GLOBAL_RATE)
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"sent": 0, "coalesced": 0, "unchanged": 0, "flood_waits": 0}
+        self._initialized = True
+
+    @staticmethod
+    def _key(message: Message) -> Tuple[int, int]:
+        return (message.chat.id, message.id)
+
+    def submit(
+        self,
+        message: Message,
+        text: str,
+        reply_markup: Optional[InlineKeyboardMarkup] = None,
+    ):
+        """Queues text as the next content of message. Never blocks or raises."""
+        if message is None:
+            return
+        key = self._key(message)
+        markup = str(reply_markup) if reply_markup else ""
+
+        if self._shown.get(key) == (text, markup) and key not in self._pending:
+            self.stats["unchanged"] += 1
+            return
+        if key in self._pending:
+            self.stats["coalesced"] += 1
+
+        self._discarded.discard(key)
+        self._pending[key] = (message, text, reply_markup)
+
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        self._wakeup.set()
+
+    def discard(self, message: Optional[Message]):
+        """Drops a pending edit, e.g. before a delete."""
+        if message is None:
+            return
+        key = self._key(message)
+        self._pending.pop(key, None)
+        if key in self._inflight:
+            self._discarded.add(key)
+
+    async def finish(self, message: Optional[Message]):
+        """
+        Drops a pending edit and waits for one already sent, so a final
+        status edit made next is not overwritten by progress.
+        """
+        if message is None:
+            return
+        self.discard(message)
+        done = self._inflight.get(self._key(message))
+        if done is not None:
+            try:
+                await asyncio.wait_for(done.wait(), timeout=FINISH_TIMEOUT)
+            except asyncio.TimeoutError:
+                log.warning(f"Edit of {self._key(message)} still in flight after {FINISH_TIMEOUT}s")
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = self._chats[chat_id] = TokenBucket(1 / EDIT_CHAT_INTERVAL, 2)
+        bucket.rate = 1 / (EDIT_CHAT_INTERVAL * self._backoff.get(chat_id, 1.0))
+        return bucket
+
+    def _chat_ready_at(self, chat_id: int, now: float) -> float:
+        return max(
+            self._blocked_until.get(chat_id, 0.0),
+            self._chat_bucket(chat_id).ready_at(now),
+        )
+
+    async def _run(self):
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            now = time.monotonic()
+            next_at = now + 1.0
+            for key in list(self._pending):
+                chat_id = key[0]
+                if key in self._inflight:
+                    next_at = min(next_at, now + 0.1)
+                    continue
+
+                ready_at = max(self._chat_ready_at(chat_id, now), self._global.ready_at(now))
+                if ready_at > now:
+                    next_at = min(next_at, ready_at)
+                    continue
+
+                self._chat_bucket(chat_id).take(now)
+                self._global.take(now)
+                edit = self._pending.pop(key)
+                self._inflight[key] = asyncio.Event()
+                asyncio.create_task(self._send(key, *edit))
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(0.05, next_at - now))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _send(self, key, message: Message, text: str, reply_markup):
+        chat_id = key[0]
+        try:
+            await message.edit(text, reply_markup=reply_markup)
+            self._remember(key, text, reply_markup)
+            self.stats["sent"] += 1
+            # Recover from earlier FloodWaits gradually
+            if chat_id in self._backoff:
+                self._backoff[chat_id] *= 0.9
+                if self._backoff[chat_id] <= 1.0:
+                    del self._backoff[chat_id]
+        except FloodWait as e:
+            wait = float(e.value or 1)
+            log.warning(f"FloodWait {wait}s editing in chat {chat_id}, backing off")
+            self.stats["flood_waits"] += 1
+            self._blocked_until[chat_id] = time.monotonic() + wait
+            self._backoff[chat_id] = min(MAX_BACKOFF, self._backoff.get(chat_id, 1.0) * 2)
+            # Retry unless a newer text arrived or the message was finished meanwhile
+            if key not in self._discarded:
+                self._pending.setdefault(key, (message, text, reply_markup))
+        except MessageNotModified:
+            self._remember(key, text, reply_markup)
+        except MessageIdInvalid:
+            # Message was deleted, stop updating it
+            self._pending.pop(key, None)
+            self._shown.pop(key, None)
+        except Exception as e:
+            log.error(f"Failed to edit message {key}: {e}")
+        finally:
+            self._discarded.discard(key)
+            done = self._inflight.pop(key, None)
+            if done is not None:
+                done.set()
+            if self._wakeup is not None:
+                self._wakeup.set()
+
+    def _remember(self, key, text: str, reply_markup):
+        self._shown[key] = (text, str(reply_markup) if reply_markup else "")
+        self._shown.move_to_end(key)
+        while len(self._shown) > MAX_TRACKED_MESSAGES:
+            self._shown.popitem(last=False)
+
+
+edit_scheduler = EditScheduler()
@@ -2,6 +2,7 @@
 from pyrogram import Client
 from pyrogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup
 
+from bot.func.edit_scheduler import edit_scheduler
 from bot.func.encode import active_encodings
 from bot.func.queue_manager import queue_manager
 from bot.logger import LOGGER
@@ -48,15 +49,22 @@ async def handle_encoding_callback(client: Client, callback_query: CallbackQuery
                 async def resume_worker(jid):
                     await resume_encoding_job(jid)
 
-                await queue_manager.add_job(
-                    process.user_id, resume_worker, process.job_id
+                # Already partly encoded, let it go ahead of the user's new jobs
+                job = queue_manager.get_job(process.job_id)
+                resume_id = await queue_manager.add_job(
+                    process.user_id,
+                    resume_worker,
+                    process.job_id,
+                    priority=1,
+                    cost=job.cost if job else 1.0,
                 )
 
-                q_pos = queue_manager._queue.qsize()
+                q_pos = queue_manager.get_position(resume_id)
                 await callback_query.answer(
                     f"⏳ Queued at position {q_pos}", show_alert=True
                 )
                 try:
+                    await edit_scheduler.finish(process.message)
                     await process.message.edit(
                         f"<blockquote>⏳ <b>Resume Queued</b>\n"
                         f"Job ID: <code>{process.job_id}</code>\n"
@@ -90,9 +98,10 @@ async def handle_encoding_callback(client: Client, callback_query: CallbackQuery
         else:
             for i, job in enumerate(jobs, 1):
                 status_icon = "⏳" if job.status == "pending" else "🏃"
+                priority = f" ⭐{job.priority}" if job.priority else ""
                 file_size = job.file_size if hasattr(job, "file_size") else "Unknown"
                 text += (
-                    f"<b>{i}.</b> <code>{job.job_id}</code> {status_icon}\n"
+                    f"<b>{i}.</b> <code>{job.job_id}</code> {status_icon}{priority}\n"
                     f"   ├ 📄 <code>{job.file_name}</code>\n"
                     f"   └ 📦 {file_size}\n\n"
                 )
@@ -104,6 +113,7 @@ async def handle_encoding_callback(client: Client, callback_query: CallbackQuery
                 ]
             ]
         )
+        await edit_scheduler.finish(process.message)
         await process.message.edit(text, reply_markup=buttons)
         await callback_query.answer()
 
@@ -1,23 +1,34 @@
 # Developed by ARGON telegram: @REACTIVEARGON
 import asyncio
-import json
-import math
+import glob
 import os
 import shlex
 import time
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 
 import psutil
 from pyrogram import Client
+from pyrogram.errors import FloodWait
 from pyrogram.types import InlineKeyboardButton, InlineKeyboardMarkup, Message
 
+from bot.config import ARCHIVE_CHANNELS, CHUNKED_MIN_DURATION, ENCODE_LOG_CHANNEL
+from bot.func.admission import estimate_cost
+from bot.func.auto_crf import AutoCRF
+from bot.func.chunked import ChunkedEncoder
+from bot.func.disk_budget import disk_budget, estimate_output_size
 from bot.func.download_manager import download_manager
+from bot.func.edit_scheduler import edit_scheduler
+from bot.func.ffmpeg_progress import ProgressReader, ProgressSnapshot
 from bot.func.ffmpeg_utils import generate_ffmpeg_cmd
-from bot.func.ffmpeg_utils import generate_ffmpeg_cmd
+from bot.func.probe import MediaInfo, probe_service
 from bot.func.pyroutils.progress import progress_for_pyrogram, humanbytes, TimeFormatter
 from bot.func.queue_manager import queue_manager
+from bot.func.result_cache import result_cache, settings_hash
+from bot.func.splitter import part_files, remove_parts, split_for_upload
+from bot.func.stream_input import StreamingInput
+from bot.func.sys_stats import stats_sampler
 from bot.func.upload_manager import upload_manager
 from bot.logger import LOGGER
 from database import get_user_settings
@@ -29,9 +40,6 @@ log = LOGGER(__name__)
 active_encodings = {}
 
 
-
-
-
 @dataclass
 class EncodingStats:
     percent: float = 0.0
@@ -63,6 +71,8 @@ class FFmpegProcess:
         current_step: int = 1,
         total_steps: int = 1,
         thumbnail_path: Optional[str] = None,
+        outputs: Optional[List[Dict[str, str]]] = None,
+        media_info: Optional[MediaInfo] = None,
     ):
         self.cmd = cmd
         self.input_file = input_file
@@ -77,12 +87,30 @@ class FFmpegProcess:
         self.current_step = current_step
         self.total_steps = total_steps
         self.thumbnail_path = thumbnail_path
+        # Renditions written by a single-decode command (output_file, suffix)
+        self.outputs = outputs or [{"output_file": output_file, "suffix": resolution}]
         self.process: Optional[asyncio.subprocess.Process] = None
+        # Set when the job runs on the chunked engine instead of one process
+        self.chunked: Optional[ChunkedEncoder] = None
+        self.chunked_task: Optional[asyncio.Task] = None
+        # (file_unique_id, settings hash) for the encoded-result cache
+        self.cache_key: Optional[tuple] = None
+        # Set when the input is fed to FFmpeg's stdin while it downloads
+        self.stream: Optional[StreamingInput] = None
+        self.pump_task: Optional[asyncio.Task] = None
+        self.progress: Optional[ProgressReader] = None
+        # Two-pass target size: pass 1 writes only the stats in passlog
+        self.analysis = False
+        self.passlog = ""
+        self.label = ""
         self.start_time = 0
         self.is_paused = False
         self.is_cancelled = False
         self.yield_queue = False  # New flag to indicate yielding
-        self.stats = EncodingStats()
+        # Steps of the job after this one, run once a yielded step is resumed
+        self.remaining_steps: List[Callable[[Message], Awaitable[str]]] = []
+        self.media_info = media_info or MediaInfo()
+        self.stats = EncodingStats(total_frames=self.media_info.frame_count)
         self.job_id = ""  # Set by manager
         self.message: Optional[Message] = None  # Store message for updates
         self.client: Optional[Client] = None
@@ -92,30 +120,65 @@ class FFmpegProcess:
     async def start(self):
         self.start_time = time.time()
 
+        if self.chunked:
+            log.info(f"Starting chunked encode: {self.input_file} -> {self.output_file}")
+            self.chunked_task = asyncio.create_task(self.chunked.run())
+            return
+
         # Parse command string into list for exec
         args = shlex.split(self.cmd)
 
-        # Ensure progress is monitored
+        # Ensure progress is monitored (global option, must precede outputs)
         if "-progress" not in args:
-            args.extend(["-progress", "pipe:1"])
+            args[1:1] = ["-progress", "pipe:1"]
+        # Progress comes from -progress, the stderr stats line is just noise
+        if "-nostats" not in args:
+            args[1:1] = ["-nostats"]
 
         executable = args[0] if args else "ffmpeg"
         cmd_args = args[1:] if len(args) > 1 else []
 
-        # Construct final arguments list: input -> encoding options -> output
-        # -> overwrite
-        final_args = ["-i", self.input_file] + cmd_args + [self.output_file, "-y"]
+        # Commands from generate_ffmpeg_cmd already carry their inputs
+        if "-i" not in cmd_args:
+            cmd_args = ["-i", self.input_file] + cmd_args
+
+        # Streaming: read the (still downloading) input from stdin
+        if self.stream:
+            for i in range(len(cmd_args) - 1):
+                if cmd_args[i] == "-i" and cmd_args[i + 1] == self.input_file:
+                    cmd_args[i + 1] = "pipe:0"
+                    break
+
+        # Construct final arguments list: overwrite -> input -> encoding
+        # options -> output(s). Multi-output commands already name their outputs.
+        final_args = ["-y"] + cmd_args
+        if len(self.outputs) == 1:
+            final_args.append(self.output_file)
 
         log.info(f"Starting FFmpeg: {executable} {' '.join(final_args)}")
 
         self.process = await asyncio.create_subprocess_exec(
             executable,
             *final_args,
+            stdin=asyncio.subprocess.PIPE if self.stream else None,
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE,
         )
+        self.progress = ProgressReader(self.process)
+        self.progress.subscribe(self._on_progress)
+        self.progress.start()
+
+        if self.stream:
+            self.pump_task = asyncio.create_task(self.stream.pump(self.process.stdin))
 
     async def pause(self):
+        if self.chunked and not self.is_paused:
+            self.chunked.pause()
+            self.is_paused = True
+            self.yield_queue = True
+            log.info(f"Chunked job {self.job_id} suspended.")
+            return
+
         if self.process and not self.is_paused:
             try:
                 parent = psutil.Process(self.process.pid)
@@ -136,6 +199,13 @@ class FFmpegProcess:
                 log.error(f"Failed to pause process: {e}")
 
     async def resume(self):
+        if self.chunked and self.is_paused:
+            self.chunked.resume()
+            self.is_paused = False
+            self.yield_queue = False
+            log.info(f"Chunked job {self.job_id} resumed.")
+            return
+
         if self.process and self.is_paused:
             try:
                 parent = psutil.Process(self.process.pid)
@@ -157,54 +227,113 @@ class FFmpegProcess:
 
     async def cancel(self):
         self.is_cancelled = True
+        if self.chunked:
+            self.chunked.cancel()
+        if self.stream:
+            self.stream.cancel()
         if self.process:
             try:
                 self.process.terminate()
             except Exception as e:
                 log.error(f"Failed to terminate process: {e}")
 
-    def parse_progress(self, line: str):
-        try:
-            parts = line.split("=")
-            if len(parts) != 2:
-                return
-            key, value = parts[0].strip(), parts[1].strip()
-
-            if key == "frame":
-                self.stats.frame = int(value)
-            elif key == "fps":
-                self.stats.fps = float(value)
-            elif key == "bitrate":
-                self.stats.bitrate = value
-            elif key == "speed":
-                self.stats.speed = value
-            elif key == "out_time_us":
-                us = int(value)
-                current_seconds = us / 1000000
-                if self.total_duration > 0:
-                    self.stats.percent = min(
-                        100.0, (current_seconds / self.total_duration) * 100
-                    )
+    def _on_progress(self, snapshot: ProgressSnapshot):
+        self.stats.frame = snapshot.frame
+        self.stats.fps = snapshot.fps
+        self.stats.bitrate = snapshot.bitrate
+        self.stats.speed = snapshot.speed
+
+        if self.total_duration > 0:
+            self.stats.percent = min(
+                100.0, (snapshot.out_seconds / self.total_duration) * 100
+            )
 
-                elapsed = time.time() - self.start_time
-                if self.stats.percent > 0:
-                    total_estimated = elapsed / (self.stats.percent / 100)
-                    eta_seconds = total_estimated - elapsed
-                    self.stats.eta = TimeFormatter(eta_seconds * 1000)
+        elapsed = time.time() - self.start_time
+        if self.stats.percent > 0:
+            total_estimated = elapsed / (self.stats.percent / 100)
+            eta_seconds = total_estimated - elapsed
+            self.stats.eta = TimeFormatter(eta_seconds * 1000)
 
-                self.stats.elapsed = TimeFormatter(elapsed * 1000)
+        self.stats.elapsed = TimeFormatter(elapsed * 1000)
 
-        except Exception:
-            pass
+    def update_chunked_stats(self):
+        """Aggregates the progress of all chunk processes into self.stats."""
+        encoded = self.chunked.encoded_seconds
+        elapsed = time.time() - self.start_time
+
+        if self.total_duration > 0:
+            self.stats.percent = min(100.0, (encoded / self.total_duration) * 100)
+        self.stats.fps = self.chunked.current_fps
+        self.stats.frame = self.chunked.total_frames
+        self.stats.bitrate = f"{self.chunked.stage} ({self.chunked.workers} workers)"
+        if elapsed > 0:
+            self.stats.speed = f"{encoded / elapsed:.2f}x"
+
+        if self.stats.percent > 0:
+            total_estimated = elapsed / (self.stats.percent / 100)
+            self.stats.eta = TimeFormatter((total_estimated - elapsed) * 1000)
+        self.stats.elapsed = TimeFormatter(elapsed * 1000)
+
+    async def get_error(self) -> str:
+        if self.chunked:
+            return self.chunked.error
+        await self.progress.wait()
+        stderr = self.progress.stderr_tail()
+        if self.stream and self.stream.error:
+            return f"{self.stream.error}\n{stderr}"
+        return stderr
+
+    def pids(self) -> List[int]:
+        if self.chunked:
+            return self.chunked.pids
+        if self.process and self.process.returncode is None:
+            return [self.process.pid]
+        return []
+
+    def output_files(self) -> List[str]:
+        return [out["output_file"] for out in self.outputs]
+
+    def _output_sizes(self) -> List[int]:
+        sizes = list(stats_sampler.usage(self.job_id).output_sizes)
+        return sizes + [0] * (len(self.outputs) - len(sizes))
+
+    def _stream_ui(self) -> str:
+        """Download progress while encoding a streamed input."""
+        if not self.stream or self.stream.done:
+            return ""
+        pct = self.stream.downloaded * 100 / self.stream.total_size if self.stream.total_size else 0
+        return (
+            f"<blockquote>📥 <b>Streaming Download:</b> "
+            f"{humanbytes(self.stream.downloaded)} / {humanbytes(self.stream.total_size)} "
+            f"({pct:.1f}%)</blockquote>\n\n"
+        )
+
+    def _renditions_ui(self) -> str:
+        """Per-rendition sizes for single-decode multi-output jobs."""
+        if len(self.outputs) <= 1:
+            return ""
+
+        lines = []
+        sizes = self._output_sizes()
+        for i, out in enumerate(self.outputs):
+            size = sizes[i]
+            estimated = "0 B"
+            if self.stats.percent > 0:
+                estimated = humanbytes(size / (self.stats.percent / 100))
+            branch = "┗" if i == len(self.outputs) - 1 else "┣"
+            lines.append(
+                f"{branch} <b>{out['suffix']}:</b> {humanbytes(size)} → {estimated}"
+            )
+
+        return "<blockquote>🎞️ <b>Renditions</b>\n" + "\n".join(lines) + "</blockquote>\n\n"
 
     def get_progress_ui(self) -> str:
         bar_length = 20
         filled = int(self.stats.percent / 100 * bar_length)
         bar = "▰" * filled + "▱" * (bar_length - filled)
 
-        current_size = 0
-        if os.path.exists(self.output_file):
-            current_size = os.path.getsize(self.output_file)
+        usage = stats_sampler.usage(self.job_id)
+        current_size = sum(self._output_sizes())
 
         self.stats.size = humanbytes(self.original_size)
         current_human = humanbytes(current_size)
@@ -217,12 +346,10 @@ class FFmpegProcess:
             if est_size > 0:
                 comp = self.original_size / est_size
 
-        # System Stats
-        cpu = psutil.cpu_percent()
-        ram = psutil.virtual_memory().percent
-        disk = psutil.disk_usage(".").percent
-        used_disk_gb = psutil.disk_usage(".").used / (1024**3)
-        free_disk_gb = psutil.disk_usage(".").free / (1024**3)
+        # System Stats (shared snapshot, refreshed in the background)
+        system = stats_sampler.get_snapshot()
+        used_disk_gb = system.disk_used / (1024**3)
+        free_disk_gb = system.disk_free / (1024**3)
 
         # Queue Info
         queue_pos = "Processing"
@@ -234,6 +361,15 @@ class FFmpegProcess:
         step_info = ""
         if self.total_steps > 1:
             step_info = f" (Quality {self.current_step}/{self.total_steps})"
+        if self.chunked and not self.is_paused:
+            status_text = f"Chunked {self.chunked.stage}"
+        if self.label:
+            step_info += f" · {self.label}"
+
+        source_fps = f"{self.media_info.fps:.2f}" if self.media_info.fps else "N/A"
+        frames = str(self.stats.frame)
+        if self.stats.total_frames:
+            frames += f" / {self.stats.total_frames}"
 
         return (
             f"🎬 <b>{status_text}</b> {status_icon}{step_info}\n"
@@ -249,114 +385,146 @@ class FFmpegProcess:
             f"┣ <b>⏱️ Elapsed:</b> {self.stats.elapsed}\n"
             f"┗ <b>💨 Speed:</b> {self.stats.speed}</blockquote>\n\n"
             f"<blockquote>📊 <b>Performance Stats</b> 🚀\n"
-            f"┣ <b>🎥 Video FPS:</b> 24.0 (original)\n"
+            f"┣ <b>🎥 Video FPS:</b> {source_fps} (original)\n"
             f"┣ <b>⚡ Encoding:</b> {self.stats.fps:.1f} fps\n"
             f"┣ <b>✨ Quality:</b> {self.stats.bitrate}\n"
-            f"┗ <b>📈 Frames:</b> {self.stats.frame}</blockquote>\n\n"
+            f"┗ <b>📈 Frames:</b> {frames}</blockquote>\n\n"
             f"<blockquote>💾 <b>File Information</b>\n"
             f"┣ <b>📥 Input:</b> {self.stats.size}\n"
             f"┣ <b>📤 Current:</b> {current_human}\n"
             f"┣ <b>🔮 Estimated:</b> {estimated}\n"
             f"┗ <b>🗜️ Compression:</b> {comp:.1f}x</blockquote>\n\n"
+            f"{self._renditions_ui()}"
+            f"{self._stream_ui()}"
             f"<blockquote>🖥️ <b>System Usage</b>\n"
-            f"┣ <b>🧠 CPU:</b> {cpu}%\n"
-            f"┣ <b>💡 RAM:</b> {ram}%\n"
-            f"┣ <b>💿 Disk:</b> {disk}%\n"
+            f"┣ <b>🧠 CPU:</b> {system.cpu}%\n"
+            f"┣ <b>💡 RAM:</b> {system.ram}%\n"
+            f"┣ <b>🎬 This Job:</b> {usage.cpu:.0f}% CPU | {humanbytes(usage.rss)} RAM\n"
+            f"┣ <b>💿 Disk:</b> {system.disk_percent}%\n"
             f"┣ <b>📦 Used Storage:</b> {used_disk_gb:.2f} GB\n"
             f"┗ <b>🆓 Free Storage:</b> {free_disk_gb:.2f} GB\n"
             f"</blockquote>\n\n"
-            "🔄 <i>Updates every 3 seconds</i>"
+            "🔄 <i>Updates every few seconds</i>"
         )
 
 
+async def _edit_progress(process: FFmpegProcess, now: float, last_update: float) -> float:
+    """
+    Hands the progress text to the edit scheduler if the render interval elapsed.
+    Returns the new last_update timestamp.
+    """
+    # The scheduler coalesces and rate-limits edits, this only bounds rendering
+    if now - last_update < 2.0:
+        return last_update
+
+    if not process.is_viewing_queue:
+        pause_text = "▶️ Resume" if process.is_paused else "⏸️ Pause"
+        buttons = InlineKeyboardMarkup(
+            [
+                [
+                    InlineKeyboardButton(
+                        pause_text, callback_data=f"enc_pause_{process.job_id}"
+                    ),
+                    InlineKeyboardButton(
+                        "❌ Cancel",
+                        callback_data=f"enc_cancel_{process.job_id}",
+                    ),
+                ],
+                [
+                    InlineKeyboardButton(
+                        "📋 Queue", callback_data=f"enc_queue_{process.job_id}"
+                    ),
+                ],
+            ]
+        )
+        edit_scheduler.submit(process.message, process.get_progress_ui(), reply_markup=buttons)
+    return now
+
+
+async def _monitor_chunked(process: FFmpegProcess) -> str:
+    """
+    Monitors a job running on the chunked engine.
+    Returns: 'FINISHED', 'FAILED', 'CANCELLED', or 'YIELDED'
+    """
+    last_update = 0
+
+    while not process.chunked_task.done():
+        if process.yield_queue:
+            return "YIELDED"
+
+        await asyncio.wait({process.chunked_task}, timeout=1.0)
+        process.update_chunked_stats()
+        last_update = await _edit_progress(process, time.time(), last_update)
+
+    if process.is_cancelled:
+        return "CANCELLED"
+
+    try:
+        ok = process.chunked_task.result()
+    except Exception as e:
+        log.error(f"Chunked encode crashed: {e}")
+        process.chunked.error = process.chunked.error or str(e)
+        ok = False
+
+    return "FINISHED" if ok else "FAILED"
+
+
 async def _monitor_process(process: FFmpegProcess) -> str:
     """
     Monitors the FFmpeg process.
     Returns: 'FINISHED', 'FAILED', 'CANCELLED', or 'YIELDED'
     """
+    stats_sampler.watch(process.job_id, process.pids, process.output_files)
+    try:
+        if process.chunked:
+            return await _monitor_chunked(process)
+        return await _monitor_single(process)
+    finally:
+        stats_sampler.unwatch(process.job_id)
+
+
+async def _monitor_single(process: FFmpegProcess) -> str:
+    """Monitors a job running as one FFmpeg process."""
     last_update = 0
+    # Progress is read by process.progress, this loop only waits and renders
+    exited = asyncio.ensure_future(process.process.wait())
 
-    while True:
+    while not exited.done():
         # Check if process is yielded (Paused and released from queue)
         if process.yield_queue:
+            exited.cancel()
             return "YIELDED"
 
-        if process.process.returncode is not None:
-            break
+        await asyncio.wait({exited}, timeout=1.0)
+        last_update = await _edit_progress(process, time.time(), last_update)
 
-        try:
-            # We need to handle the case where it hangs if paused?
-            # If paused, stdout might not produce output, but we still need to check yield_queue
-            # So we should use wait_for with timeout
-            try:
-                line = await asyncio.wait_for(
-                    process.process.stdout.readline(), timeout=1.0
-                )
-                if not line:
-                    break
-                process.parse_progress(line.decode().strip())
-            except asyncio.TimeoutError:
-                # Timeout is fine, just loop to check yield_queue and update UI
-                pass
+    await process.progress.wait()
 
-        except Exception:
-            break
-
-        now = time.time()
-        # Increased interval to 5.0s to avoid FloodWait
-        if now - last_update >= 5.0:
-            try:
-                if not process.is_viewing_queue:
-                    pause_text = "▶️ Resume" if process.is_paused else "⏸️ Pause"
-                    buttons = InlineKeyboardMarkup(
-                        [
-                            [
-                                InlineKeyboardButton(
-                                    pause_text, callback_data=f"enc_pause_{process.job_id}"
-                                ),
-                                InlineKeyboardButton(
-                                    "❌ Cancel",
-                                    callback_data=f"enc_cancel_{process.job_id}",
-                                ),
-                            ],
-                            [
-                                InlineKeyboardButton(
-                                    "📋 Queue", callback_data=f"enc_queue_{process.job_id}"
-                                ),
-                            ],
-                        ]
-                    )
-                    await process.message.edit(
-                        process.get_progress_ui(), reply_markup=buttons
-                    )
-                last_update = now
-            except Exception as e:
-                # Handle FloodWait specifically if possible, or just log
-                if "FLOOD_WAIT" in str(e):
-                    log.warning(f"FloodWait hit, backing off UI updates: {e}")
-                    last_update = now + 10 # Backoff for 10s
-                else:
-                    log.error(f"Failed to update UI: {e}")
-
-    await process.process.wait()
+    if process.stream and process.process.returncode != 0:
+        # FFmpeg gave up, no point in finishing the download
+        process.stream.cancel()
+    if process.pump_task:
+        await process.pump_task
 
     if process.is_cancelled:
         return "CANCELLED"
 
+    # A truncated stream can still make FFmpeg exit cleanly
+    if process.stream and process.stream.error:
+        return "FAILED"
+
     if process.process.returncode == 0:
         return "FINISHED"
     else:
         return "FAILED"
 
 
-# ... (existing imports)
-
-# ... (FFmpegProcess class and methods)
-
-
 async def _handle_job_completion(
     process: FFmpegProcess, status: str, cleanup_input: bool = True
 ):
+    # A queued or in flight progress edit must not overwrite the final status
+    await edit_scheduler.finish(process.message)
+
     if status == "YIELDED":
         try:
             # Delete the active progress message to clean up chat
@@ -414,27 +582,25 @@ async def _handle_job_completion(
         # Do NOT edit message to "Queuing Upload..."
         # Instead, just start the upload worker which will send its own message
 
-        async def upload_worker():
-            await _upload_video(
-                process.client,
-                process.user_id,
-                process.output_file,
-                None, # No progress_msg passed, it will create one
-                process.stats,
-                process.original_size,
-                codec=process.codec,
-                crf=process.crf,
-                preset=process.preset,
-                resolution=process.resolution,
-                thumb=process.thumbnail_path,
+        # One upload per rendition (single-decode jobs write several outputs)
+        if process.analysis:
+            outputs = []
+        else:
+            outputs = process.outputs
+            _remove_passlog(process)
+        for out in outputs:
+            params = _upload_params(process, out["output_file"], out["suffix"])
+            await upload_manager.add_upload_job(
+                process.user_id, reconstruct_upload(process.client, params), params=params
             )
 
-        await upload_manager.add_upload_job(process.user_id, upload_worker)
-
         # Cleanup input only if requested
         try:
-            if cleanup_input and os.path.exists(process.input_file):
-                os.remove(process.input_file)
+            if cleanup_input:
+                disk_budget.release(process.input_file)
+                if os.path.exists(process.input_file):
+                    os.remove(process.input_file)
+                remove_empty_dir(process.input_file)
         except Exception:
             pass
 
@@ -450,10 +616,10 @@ async def _handle_job_completion(
         return
 
     if status == "FAILED":
-        stderr = await process.process.stderr.read()
-        log.error(f"FFmpeg failed: {stderr.decode()}")
+        stderr = await process.get_error()
+        log.error(f"FFmpeg failed: {stderr}")
         await process.message.edit(
-            f"❌ <b>Encoding Failed</b>\n\n<code>{stderr.decode()[:1000]}</code>"
+            f"❌ <b>Encoding Failed</b>\n\n<code>{stderr[:1000]}</code>"
         )
         _cleanup_files(process, cleanup_input=True)  # Cleanup on fail
         if process.job_id in active_encodings:
@@ -461,16 +627,59 @@ async def _handle_job_completion(
         return
 
 
+def remove_empty_dir(file_path: str):
+    """Removes the per-request download dir of file_path once it is empty."""
+    parent = os.path.dirname(os.path.abspath(file_path))
+    if os.path.dirname(parent) != os.path.abspath("downloads"):
+        return
+    try:
+        os.rmdir(parent)
+    except OSError:
+        # Still holds other files of the request
+        pass
+
+
+def _remove_passlog(process: FFmpegProcess):
+    if not process.passlog:
+        return
+    for path in glob.glob(f"{glob.escape(process.passlog)}*"):
+        try:
+            os.remove(path)
+        except OSError as e:
+            log.error(f"Failed to remove pass log {path}: {e}")
+
+
 def _cleanup_files(process: FFmpegProcess, cleanup_input: bool = True):
     try:
-        if cleanup_input and os.path.exists(process.input_file):
-            os.remove(process.input_file)
-        if os.path.exists(process.output_file):
-            os.remove(process.output_file)
+        if cleanup_input:
+            disk_budget.release(process.input_file)
+            if os.path.exists(process.input_file):
+                os.remove(process.input_file)
+            remove_empty_dir(process.input_file)
+        _remove_passlog(process)
+        if process.analysis:
+            # Pass 1 writes to the null device, nothing else to remove
+            return
+        for out in process.outputs:
+            disk_budget.release(out["output_file"])
+            if os.path.exists(out["output_file"]):
+                os.remove(out["output_file"])
+            remove_empty_dir(out["output_file"])
     except Exception as e:
         log.error(f"Cleanup failed: {e}")
 
 
+def _output_files(commands: List[Dict]) -> List[str]:
+    """Every file the planned commands write."""
+    files = []
+    for cmd_info in commands:
+        if cmd_info.get("analysis"):
+            continue
+        for out in cmd_info.get("outputs") or [cmd_info]:
+            files.append(out["output_file"])
+    return files
+
+
 async def _run_encoding_job(
     ffmpeg_cmd: str,
     input_file: str,
@@ -487,37 +696,27 @@ async def _run_encoding_job(
     current_step: int = 1,
     total_steps: int = 1,
     thumbnail_path: Optional[str] = None,
-):
-    duration = 0
-    try:
-        proc = await asyncio.create_subprocess_exec(
-            "ffprobe",
-            "-v",
-            "quiet",
-            "-print_format",
-            "json",
-            "-show_format",
-            "-show_streams",
-            input_file,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-        )
-        out, err = await proc.communicate()
-        if proc.returncode == 0:
-            data = json.loads(out.decode())
-            if "format" in data and "duration" in data["format"]:
-                duration = float(data["format"]["duration"])
-            else:
-                for stream in data.get("streams", []):
-                    if "duration" in stream:
-                        duration = float(stream["duration"])
-                        break
-    except Exception:
-        duration = 100
+    outputs: Optional[List[Dict[str, str]]] = None,
+    chunk_args: Optional[Dict] = None,
+    cache_key: Optional[tuple] = None,
+    stream: Optional[StreamingInput] = None,
+    media_info: Optional[MediaInfo] = None,
+    analysis: bool = False,
+    passlog: str = "",
+    label: str = "",
+) -> str:
+    """Runs one step of a job. Returns its final status."""
+    if stream:
+        # Input is still downloading: probe its first megabytes instead
+        media_info = media_info or await stream.probe()
+        original_size = stream.total_size
+    else:
+        # Cached after the first probe, later steps of the job reuse it
+        media_info = media_info or await probe_service.probe(input_file)
+        original_size = os.path.getsize(input_file)
 
-    if duration == 0:
-        duration = 100
-    original_size = os.path.getsize(input_file)
+    media_info = media_info or MediaInfo()
+    duration = media_info.duration or 100
 
     process = FFmpegProcess(
         ffmpeg_cmd,
@@ -533,7 +732,19 @@ async def _run_encoding_job(
         current_step=current_step,
         total_steps=total_steps,
         thumbnail_path=thumbnail_path,
+        outputs=outputs,
+        media_info=media_info,
     )
+    if chunk_args and duration >= CHUNKED_MIN_DURATION:
+        process.chunked = ChunkedEncoder(
+            input_file, output_file, chunk_args, duration, thumbnail_path
+        )
+
+    process.cache_key = cache_key
+    process.stream = stream
+    process.analysis = analysis
+    process.passlog = passlog
+    process.label = label
     process.job_id = job_id
     process.message = message
     process.client = client
@@ -545,13 +756,41 @@ async def _run_encoding_job(
         await process.start()
         status = await _monitor_process(process)
         await _handle_job_completion(process, status, cleanup_input=cleanup_input)
+        return status
 
     except Exception as e:
         log.error(f"Encoding job failed: {e}")
+        if stream:
+            stream.cancel()
+        await edit_scheduler.finish(message)
         await message.edit(f"❌ <b>Encoding Failed</b>\n\n<code>{str(e)}</code>")
         _cleanup_files(process, cleanup_input=True)
         if job_id in active_encodings:
             del active_encodings[job_id]
+        return "FAILED"
+
+
+async def _run_steps(
+    job_id: str, message: Message, steps: List[Callable[[Message], Awaitable[str]]]
+):
+    """
+    Runs the steps of a job (renditions, or the passes of a two-pass encode)
+    in order, each given the message to report on.
+
+    A failed or cancelled step ends the job: its input is gone. A yielded
+    step is still suspended (pass 1 has not written its whole log yet), so
+    the later steps are handed to it and run by resume_encoding_job after it
+    finishes.
+    """
+    for i, step in enumerate(steps):
+        status = await step(message)
+        if status == "YIELDED":
+            process = active_encodings.get(job_id)
+            if process:
+                process.remaining_steps = steps[i + 1 :]
+            return
+        if status in ("FAILED", "CANCELLED"):
+            return
 
 
 async def resume_encoding_job(job_id: str):
@@ -580,8 +819,13 @@ async def resume_encoding_job(job_id: str):
     try:
         status = await _monitor_process(process)
         await _handle_job_completion(process, status)
+        # Continue with the steps that waited for this one (e.g. pass 2).
+        # Yielded again, they stay with it for the next resume.
+        if status == "FINISHED" and process.remaining_steps:
+            await _run_steps(job_id, process.message, process.remaining_steps)
     except Exception as e:
         log.error(f"Resumed job failed: {e}")
+        await edit_scheduler.finish(process.message)
         await process.message.edit(f"❌ <b>Resumed Job Failed</b>\n\n<code>{str(e)}</code>")
         _cleanup_files(process)
         if job_id in active_encodings:
@@ -609,6 +853,13 @@ async def safe_download_media(client: Client, message: Message, file_path: str,
         download_manager.release()
 
 
+def _is_complete(file_path: str, size: int) -> bool:
+    try:
+        return os.path.getsize(file_path) == size
+    except OSError:
+        return False
+
+
 def reconstruct_worker(job, client: Client):
     """
     Reconstructs the worker function for a restored job.
@@ -627,8 +878,8 @@ def reconstruct_worker(job, client: Client):
                 return
 
             # 2. Prepare download path
-            downloads_dir = Path("downloads")
-            downloads_dir.mkdir(exist_ok=True)
+            downloads_dir = Path("downloads") / f"{job.chat_id}_{job.message_id}"
+            downloads_dir.mkdir(parents=True, exist_ok=True)
 
             # Use stored filename or generate one
             file_name = job.file_name
@@ -638,34 +889,59 @@ def reconstruct_worker(job, client: Client):
             safe_filename = "".join(
                 c for c in file_name if c.isalnum() or c in (" ", "-", "_", ".")
             ).strip()
-            download_file_path = downloads_dir / safe_filename
+            # The input kept by the startup cleanup, so chunk checkpoints match
+            if job.input_file:
+                download_file_path = Path(job.input_file)
+                safe_filename = download_file_path.name
+            else:
+                download_file_path = downloads_dir / safe_filename
 
             # 3. Send/Update status message
             status_msg = await client.send_message(
                 job.user_id, f"🔄 **Restoring Job {job.job_id}...**"
             )
 
-            # 4. Download
-            downloaded_path = await safe_download_media(
-                client, message, str(download_file_path), status_msg
-            )
+            # Fetch settings
+            settings = await get_user_settings(job.user_id)
+            if not settings:
+                settings = {}  # Use defaults handled in utils
+
+            # 4. Reserve disk space and download
+            media = message.video or message.document
+            input_size = getattr(media, "file_size", 0) or job.size_bytes
+            if not await disk_budget.reserve(
+                str(download_file_path),
+                input_size,
+                estimate_output_size(settings, input_size),
+            ):
+                await status_msg.edit(
+                    "❌ **Restoration Failed:** Not enough disk space."
+                )
+                return
+
+            if input_size and _is_complete(str(download_file_path), input_size):
+                # Downloaded before the restart, skip the second download
+                log.info(f"Reusing downloaded input {download_file_path} for job {job.job_id}")
+                downloaded_path = str(download_file_path)
+            else:
+                downloaded_path = await safe_download_media(
+                    client, message, str(download_file_path), status_msg
+                )
 
             if not downloaded_path:
+                disk_budget.release(str(download_file_path))
                 await status_msg.edit(
                     "❌ **Restoration Failed:** Could not download file."
                 )
                 return
 
             # 5. Run Encoding
-            # Fetch settings
-            settings = await get_user_settings(job.user_id)
-            if not settings:
-                settings = {}  # Use defaults handled in utils
+            cache_key = (getattr(media, "file_unique_id", ""), settings_hash(settings))
 
             # Restore watermark assets if needed
             from bot.func.ffmpeg_utils import prepare_watermark_assets, prepare_thumbnail
-            prepare_watermark_assets(job.user_id, settings)
-            thumbnail_path = prepare_thumbnail(job.user_id, settings)
+            await prepare_watermark_assets(job.user_id, settings)
+            thumbnail_path = await prepare_thumbnail(job.user_id, settings)
 
             # Generate commands
             # We don't have a specific output base name here, so we derive it
@@ -673,35 +949,58 @@ def reconstruct_worker(job, client: Client):
             # Remove extension for base
             output_base = os.path.splitext(output_base)[0]
 
-            commands = generate_ffmpeg_cmd(settings, downloaded_path, output_base, thumbnail_path)
+            media_info = await probe_service.probe(
+                downloaded_path, getattr(media, "file_unique_id", "")
+            )
+            await _apply_auto_quality(
+                settings, downloaded_path, media_info, output_base, status_msg, job.cost
+            )
+            commands = generate_ffmpeg_cmd(
+                settings, downloaded_path, output_base, thumbnail_path, media_info=media_info
+            )
+            disk_budget.assign_outputs(str(download_file_path), _output_files(commands))
 
             # Extract settings for UI
             video_settings = settings.get("video", {})
             codec = video_settings.get("codec", "mpeg4")
             crf = video_settings.get("crf", "23")
             preset = video_settings.get("preset", "medium")
+            use_chunked = video_settings.get("chunked", False)
+
+            def make_step(i: int, cmd_info: Dict):
+                async def step(step_msg: Message) -> str:
+                    return await _run_encoding_job(
+                        cmd_info["cmd"],
+                        downloaded_path,
+                        cmd_info["output_file"],
+                        client,
+                        step_msg,
+                        job_id_arg,
+                        job.user_id,
+                        cleanup_input=i == len(commands) - 1,
+                        codec=codec,
+                        crf=str(crf),
+                        preset=preset,
+                        resolution=cmd_info.get("suffix", "1080p"),
+                        current_step=i + 1,
+                        total_steps=len(commands),
+                        thumbnail_path=thumbnail_path,
+                        outputs=cmd_info.get("outputs"),
+                        chunk_args=cmd_info.get("chunk_args") if use_chunked else None,
+                        analysis=cmd_info.get("analysis", False),
+                        passlog=cmd_info.get("passlog", ""),
+                        label=cmd_info.get("label", ""),
+                        cache_key=cache_key,
+                        media_info=media_info,
+                    )
 
-            for i, cmd_info in enumerate(commands):
-                is_last = i == len(commands) - 1
-                resolution = cmd_info.get("suffix", "1080p")
+                return step
 
-                await _run_encoding_job(
-                    cmd_info["cmd"],
-                    downloaded_path,
-                    cmd_info["output_file"],
-                    client,
-                    status_msg,
-                    job_id_arg,
-                    job.user_id,
-                    cleanup_input=is_last,
-                    codec=codec,
-                    crf=str(crf),
-                    preset=preset,
-                    resolution=resolution,
-                    current_step=i + 1,
-                    total_steps=len(commands),
-                    thumbnail_path=thumbnail_path,
-                )
+            await _run_steps(
+                job_id_arg,
+                status_msg,
+                [make_step(i, cmd_info) for i, cmd_info in enumerate(commands)],
+            )
 
         except Exception as e:
             log.error(f"Error in restored worker for job {job.job_id}: {e}")
@@ -709,6 +1008,93 @@ def reconstruct_worker(job, client: Client):
     return worker
 
 
+async def _apply_auto_quality(
+    settings: Dict,
+    input_file: str,
+    media_info: Optional[MediaInfo],
+    output_base: str,
+    message: Message,
+    cost: float = 1.0,
+):
+    """
+    Replaces the CRF in settings with the per-title pick of auto quality,
+    sampling within the job's admitted cost.
+    """
+    video_settings = settings.get("video", {})
+    if not video_settings.get("auto_quality") or video_settings.get("target_size_mb"):
+        return
+    if not media_info:
+        return
+
+    edit_scheduler.submit(message, "🔬 <b>Sampling the video to pick the best CRF...</b>")
+
+    try:
+        crf = await AutoCRF(
+            input_file, settings, media_info, f"{output_base}_autocrf", cost
+        ).select()
+    except Exception as e:
+        log.error(f"Auto quality failed, keeping CRF {video_settings.get('crf', '23')}: {e}")
+        return
+
+    if crf is not None:
+        log.info(f"Auto quality picked CRF {crf} for {Path(input_file).name}")
+        video_settings["crf"] = str(crf)
+
+
+def _upload_params(process: FFmpegProcess, output_file: str, resolution: str) -> Dict[str, Any]:
+    """Everything needed to redo an upload after a restart."""
+    return {
+        "user_id": process.user_id,
+        "file_path": output_file,
+        "stats": asdict(process.stats),
+        "original_size": process.original_size,
+        "codec": process.codec,
+        "crf": process.crf,
+        "preset": process.preset,
+        "resolution": resolution,
+        "thumb": process.thumbnail_path,
+        "cache_key": list(process.cache_key) if process.cache_key else None,
+        "targets": _delivery_targets(process.user_id),
+    }
+
+
+def _delivery_targets(user_id: int) -> List[Dict[str, Any]]:
+    """Destinations of a finished encode. The first one receives the upload."""
+    targets = [{"chat_id": user_id, "kind": "user"}]
+    if ENCODE_LOG_CHANNEL:
+        targets.append({"chat_id": ENCODE_LOG_CHANNEL, "kind": "log"})
+    targets.extend({"chat_id": chat_id, "kind": "archive"} for chat_id in ARCHIVE_CHANNELS)
+    return targets
+
+
+def reconstruct_upload(client: Client, params: Dict[str, Any]):
+    """Builds the upload worker for persisted upload params."""
+
+    async def upload_worker():
+        thumb = params.get("thumb")
+        if thumb and not os.path.exists(thumb):
+            thumb = None
+        cache_key = params.get("cache_key")
+        await _upload_video(
+            client,
+            params["user_id"],
+            params["file_path"],
+            None,  # No progress_msg passed, it will create one
+            EncodingStats(**params.get("stats", {})),
+            params.get("original_size", 0),
+            codec=params.get("codec", "Unknown"),
+            crf=params.get("crf", "N/A"),
+            preset=params.get("preset", "N/A"),
+            resolution=params.get("resolution", "N/A"),
+            thumb=thumb,
+            cache_key=tuple(cache_key) if cache_key else None,
+            targets=params.get("targets"),
+            params=params,
+        )
+
+    return upload_worker
+
+
 async def _upload_video(
     client: Client,
     user_id: int,
@@ -721,8 +1107,12 @@ async def _upload_video(
     preset: str = "N/A",
     resolution: str = "N/A",
     thumb: Optional[str] = None,
+    cache_key: Optional[tuple] = None,
+    targets: Optional[List[Dict[str, Any]]] = None,
+    params: Optional[Dict[str, Any]] = None,
 ):
     upload_msg = None
+    retry = False
     try:
         file_name = Path(file_path).name
         file_size = os.path.getsize(file_path)
@@ -746,26 +1136,83 @@ async def _upload_video(
             "👨‍💻 <b>Dev:</b> <a href='tg://user?id=7024179022'>Owner</a>"
         )
 
+        targets = targets or _delivery_targets(user_id)
+        primary, extra = targets[0], targets[1:]
+
         # Send new upload message
         upload_msg = await client.send_message(user_id, "📤 <b>Starting Upload...</b>")
 
-        await client.send_document(
-            chat_id=user_id,
-            document=file_path,
-            caption=caption,
-            thumb=thumb,
-            progress=progress_for_pyrogram,
-            progress_args=("📤 Uploading encoded video...", upload_msg, time.time())
-        )
+        # Outputs over the upload limit go up as an ordered series of parts.
+        # The persisted params record the parts sent, so a retry after a
+        # FloodWait or a restart resumes at the first unsent part.
+        progress = params if params is not None else {}
+        sent_ids: List[str] = progress.setdefault("sent_parts", [])
+        parts = part_files(file_path) if sent_ids else []
+        if len(parts) != progress.get("part_count"):
+            parts = await split_for_upload(file_path)
+        if len(parts) != progress.get("part_count", len(parts)):
+            log.warning(f"{file_name} was cut differently than before, uploading all parts again")
+            sent_ids.clear()
+            progress.pop("reply_to", None)
+        progress["part_count"] = len(parts)
+
+        if len(parts) > 1:
+            await upload_msg.edit(
+                f"✂️ <b>Output is {humanbytes(file_size)}, uploading in {len(parts)} parts...</b>"
+            )
+
+        def part_label(i: int) -> str:
+            return f"\n🧩 <b>Part:</b> {i}/{len(parts)}" if len(parts) > 1 else ""
+
+        # The bytes go up once, every other destination reuses the file_id
+        reply_to = progress.get("reply_to")
+        for i, part in enumerate(parts, 1):
+            if i <= len(sent_ids):
+                continue
+            sent = await client.send_document(
+                chat_id=primary["chat_id"],
+                document=part,
+                caption=caption + part_label(i),
+                thumb=thumb,
+                reply_to_message_id=reply_to,
+                progress=progress_for_pyrogram,
+                progress_args=(
+                    f"📤 Uploading encoded video{f' (part {i}/{len(parts)})' if len(parts) > 1 else ''}...",
+                    upload_msg,
+                    time.time(),
+                ),
+            )
+            if not sent or not sent.document:
+                raise RuntimeError(f"Upload of {Path(part).name} returned no document")
+            sent_ids.append(sent.document.file_id)
+            progress["reply_to"] = reply_to = sent.id
+            if params is not None:
+                await upload_manager.checkpoint(params)
 
         # Delete upload progress message
         await upload_msg.delete()
 
-        # Log to Channel
-        try:
-            log_channel = -1002252580234
-            user = await client.get_users(user_id)
-            user_link = f"<a href='tg://user?id={user_id}'>{user.first_name}</a>"
+        # Remember the upload so identical requests can skip the encode
+        # (the cache holds one file per rendition, split outputs are not cached)
+        if cache_key and len(sent_ids) == 1:
+            try:
+                await result_cache.store(
+                    cache_key[0],
+                    cache_key[1],
+                    resolution,
+                    sent_ids[0],
+                    file_name,
+                    file_size,
+                )
+            except Exception as cache_error:
+                log.error(f"Failed to cache result: {cache_error}")
+
+        if extra:
+            try:
+                user = await client.get_users(user_id)
+                user_link = f"<a href='tg://user?id={user_id}'>{user.first_name}</a>"
+            except Exception:
+                user_link = f"<a href='tg://user?id={user_id}'>User</a>"
 
             log_caption = (
                 f"<b>🎬 New Encode Completed</b>\n\n"
@@ -776,25 +1223,44 @@ async def _upload_video(
                 f"🤖 <b>Encoded by:</b> @{bot_username}"
             )
 
-            await client.send_document(
-                chat_id=log_channel,
-                document=file_path,
-                caption=log_caption
-            )
-        except Exception as log_error:
-            log.error(f"Failed to send log to channel: {log_error}")
+            for target in extra:
+                try:
+                    for i, file_id in enumerate(sent_ids, 1):
+                        base_caption = caption if target.get("kind") == "user" else log_caption
+                        await client.send_cached_media(
+                            chat_id=target["chat_id"],
+                            file_id=file_id,
+                            caption=base_caption + part_label(i),
+                        )
+                except Exception as fanout_error:
+                    log.error(
+                        f"Failed to deliver to {target.get('kind')} chat {target['chat_id']}: {fanout_error}"
+                    )
 
+    except FloodWait:
+        # The upload manager backs off and retries, keep the file and its parts
+        retry = True
+        if upload_msg:
+            try:
+                await upload_msg.delete()
+            except Exception:
+                pass
+        raise
     except Exception as e:
         log.error(f"Upload failed: {e}")
         if upload_msg:
             await upload_msg.edit(f"❌ <b>Upload Failed</b>\n\n<code>{str(e)}</code>")
     finally:
-        # Cleanup output file
-        try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-        except Exception as e:
-            log.error(f"Cleanup failed: {e}")
+        # Cleanup output file and its parts
+        if not retry:
+            remove_parts(file_path)
+            disk_budget.release(file_path)
+            try:
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+                remove_empty_dir(file_path)
+            except Exception as e:
+                log.error(f"Cleanup failed: {e}")
 
 
 async def encode(
@@ -808,7 +1274,16 @@ async def encode(
     message: Optional[Message] = None,
     chat_id: int = 0,
     message_id: int = 0,
+    file_unique_id: str = "",
+    stream_message: Optional[Message] = None,
+    file_size: int = 0,
 ) -> Dict[str, Any]:
+    """
+    Queues an encode of input_file with the user's settings.
+
+    With stream_message, input_file is not downloaded yet: the job downloads
+    it itself, streaming it into FFmpeg when the plan is a single command.
+    """
 
     if not custom_output_name:
         custom_output_name = f"encoded_{Path(input_file).name}"
@@ -832,58 +1307,128 @@ async def encode(
         if not settings:
             settings = {}
 
+        cache_key = (file_unique_id, settings_hash(settings))
+
         # Restore watermark assets if needed
         from bot.func.ffmpeg_utils import prepare_watermark_assets, prepare_thumbnail
-        prepare_watermark_assets(user_id, settings)
-        thumbnail_path = prepare_thumbnail(user_id, settings)
+        await prepare_watermark_assets(user_id, settings)
+        thumbnail_path = await prepare_thumbnail(user_id, settings)
 
         # Inject user_id for watermark font lookup
         settings["user_id"] = user_id
 
+        # A target size (duration up front, two passes) and auto quality
+        # (samples across the title) need the whole file before planning
+        stream_source = stream_message
+        video_settings = settings.get("video", {})
+        if stream_source and (
+            video_settings.get("target_size_mb") or video_settings.get("auto_quality")
+        ):
+            downloaded_path = await safe_download_media(client, stream_source, input_file, message)
+            if not downloaded_path:
+                disk_budget.release(input_file)
+                await message.edit("❌ <b>Download Failed</b>")
+                return
+            stream_source = None
+
+        # Probe once for the whole job (streamed inputs are probed once they start)
+        media_info = None
+        if not stream_source:
+            media_info = await probe_service.probe(input_file, file_unique_id)
+            job = queue_manager.get_job(job_id_arg)
+            await _apply_auto_quality(
+                settings,
+                input_file,
+                media_info,
+                output_base,
+                message,
+                job.cost if job else 1.0,
+            )
+
         # Generate commands
-        commands = generate_ffmpeg_cmd(settings, input_file, output_base, thumbnail_path)
+        commands = generate_ffmpeg_cmd(
+            settings, input_file, output_base, thumbnail_path, media_info=media_info
+        )
 
         # If commands is empty (shouldn't happen with defaults), fallback?
         if not commands:
             # Fallback to simple default
             commands = [
                 {
-                    "cmd": "ffmpeg -i {} -c:v mpeg4 -crf 23 -c:a aac -b:a 128k -y {}".format(
-                        shlex.quote(input_file), shlex.quote(output_base + ".mp4")
+                    "cmd": "ffmpeg -i {} -c:v mpeg4 -crf 23 -c:a aac -b:a 128k".format(
+                        shlex.quote(input_file)
                     ),
                     "output_file": output_base + ".mp4",
                 }
             ]
+        disk_budget.assign_outputs(input_file, _output_files(commands))
 
         # Extract settings for UI
         video_settings = settings.get("video", {})
         codec = video_settings.get("codec", "mpeg4")
         crf = video_settings.get("crf", "23")
         preset = video_settings.get("preset", "medium")
+        use_chunked = video_settings.get("chunked", False)
+
+        stream = None
+        if stream_source:
+            if len(commands) == 1 and not use_chunked:
+                # One FFmpeg process: feed it while the download runs
+                stream = StreamingInput(client, stream_source, input_file, file_size)
+                stream.start()
+            else:
+                # Several passes over the input need the complete file first
+                downloaded_path = await safe_download_media(
+                    client, stream_source, input_file, message
+                )
+                if not downloaded_path:
+                    disk_budget.release(input_file)
+                    await message.edit("❌ <b>Download Failed</b>")
+                    return
+
+        def make_step(i: int, cmd_info: Dict):
+            async def step(step_msg: Message) -> str:
+                return await _run_encoding_job(
+                    cmd_info["cmd"],
+                    input_file,
+                    cmd_info["output_file"],
+                    client,
+                    step_msg,
+                    job_id_arg,
+                    user_id,
+                    cleanup_input=i == len(commands) - 1,
+                    codec=codec,
+                    crf=str(crf),
+                    preset=preset,
+                    resolution=cmd_info.get("suffix", "1080p"),
+                    current_step=i + 1,
+                    total_steps=len(commands),
+                    thumbnail_path=thumbnail_path,
+                    outputs=cmd_info.get("outputs"),
+                    chunk_args=cmd_info.get("chunk_args") if use_chunked else None,
+                    analysis=cmd_info.get("analysis", False),
+                    passlog=cmd_info.get("passlog", ""),
+                    label=cmd_info.get("label", ""),
+                    cache_key=cache_key,
+                    stream=stream,
+                    media_info=media_info,
+                )
 
-        for i, cmd_info in enumerate(commands):
-            is_last = i == len(commands) - 1
-            resolution = cmd_info.get("suffix", "1080p")
+            return step
 
-            await _run_encoding_job(
-                cmd_info["cmd"],
-                input_file,
-                cmd_info["output_file"],
-                client,
-                message,
-                job_id_arg,
-                user_id,
-                cleanup_input=is_last,
-                codec=codec,
-                crf=str(crf),
-                preset=preset,
-                resolution=resolution,
-                current_step=i + 1,
-                total_steps=len(commands),
-                thumbnail_path=thumbnail_path,
-            )
+        await _run_steps(
+            job_id_arg, message, [make_step(i, cmd_info) for i, cmd_info in enumerate(commands)]
+        )
 
-    file_size_str = humanbytes(os.path.getsize(input_file))
+    size_bytes = file_size if stream_message else os.path.getsize(input_file)
+    file_size_str = humanbytes(size_bytes)
+
+    # Estimated CPU cost, used to admit the job when there is capacity for it
+    duration = 0
+    if not stream_message:
+        media_info = await probe_service.probe(input_file, file_unique_id)
+        duration = media_info.duration if media_info else 0
+    cost = estimate_cost(await get_user_settings(user_id), duration)
     file_name = Path(input_file).name
 
     job_id = await queue_manager.add_job(
@@ -897,9 +1442,19 @@ async def encode(
         task_type="encode",
         input_file=input_file,
         output_file=output_base,  # This is just for reference now
+        size_bytes=size_bytes,
+        cost=cost,
     )
 
     if job_id is None:
+        # This request's own copy, the queued job keeps its file and reservation
+        disk_budget.release(input_file)
+        try:
+            if os.path.exists(input_file):
+                os.remove(input_file)
+            remove_empty_dir(input_file)
+        except Exception as e:
+            log.error(f"Cleanup failed: {e}")
         await message.edit(
             "⚠️ <b>Duplicate Job Detected</b>\n\nYou already have this file in the queue."
         )
@@ -911,7 +1466,36 @@ async def encode(
     await message.edit(
         f"⏳ <b>Job Queued</b>\n"
         f"🆔 Job ID: <code>{job_id}</code>\n"
-        f"🔢 Position: {queue_manager._queue.qsize()}"
+        f"🔢 Position: {queue_manager.get_position(job_id)}"
     )
 
     return {"success": True, "job_id": job_id, "output_file": output_base}
+
+
+async def send_cached_results(
+    client: Client, user_id: int, results: List[Dict], original_size: int
+) -> bool:
+    """
+    Re-sends previously encoded renditions by Telegram file_id.
+    Returns False if any of them could not be delivered.
+    """
+    try:
+        bot_username = (await client.get_me()).username
+        for result in results:
+            file_size = result.get("file_size", 0)
+            comp = original_size / file_size if file_size else 1.0
+            caption = (
+                f"♻️ <b>Served from Cache</b>\n\n"
+                f"<blockquote>📁 <b>File:</b> <code>{result.get('file_name', 'Unknown')}</code>\n"
+                f"🎯 <b>Quality:</b> {result.get('resolution', 'N/A')}</blockquote>\n\n"
+                f"<blockquote>📊 <b>Stats</b>\n"
+                f"📁 <b>Original:</b> `{humanbytes(original_size)}`\n"
+                f"📤 <b>Encoded:</b> `{humanbytes(file_size)}`\n"
+                f"🗜️ <b>Compression:</b> `{comp:.1f}x`</blockquote>\n\n"
+                f"🤖 <b>Encoded by:</b> @{bot_username}"
+            )
+            await client.send_cached_media(user_id, result["file_id"], caption=caption)
+        return True
+    except Exception as e:
+        log.error(f"Failed to send cached results: {e}")
+        return False
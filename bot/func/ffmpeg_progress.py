@@ -0,0 +1,137 @@
+# Developed by ARGON telegram: @REACTIVEARGON
+import asyncio
+import re
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from bot.logger import LOGGER
+
+log = LOGGER(__name__)
+
+READ_SIZE = 64 * 1024
+# Lines of stderr kept for error reports
+STDERR_LINES = 200
+
+# Every -progress record ends with progress=continue or progress=end
+_RECORD_END = re.compile(rb"progress=\w+\r?\n")
+
+
+@dataclass(frozen=True)
+class ProgressSnapshot:
+    frame: int = 0
+    fps: float = 0.0
+    bitrate: str = "N/A"
+    speed: str = "N/A"
+    out_time_us: int = 0
+    total_size: int = 0
+    done: bool = False
+    updated: float = 0.0
+
+    @property
+    def out_seconds(self) -> float:
+        return self.out_time_us / 1000000
+
+
+def _to_int(value: Optional[str], default: int) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _to_float(value: Optional[str], default: float) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class ProgressReader:
+    """
+    Drains an FFmpeg process's stdout and stderr concurrently in blocks.
+
+    stdout must carry `-progress pipe:1`. Complete records are parsed in one
+    pass and published as immutable ProgressSnapshots to the subscribers.
+    stderr is always drained (a full pipe would stall FFmpeg) and its last
+    lines are kept for error reports.
+    """
+
+    def __init__(self, proc: asyncio.subprocess.Process, stderr_lines: int = STDERR_LINES):
+        self.proc = proc
+        self.latest = ProgressSnapshot()
+        self._subscribers: List[Callable[[ProgressSnapshot], None]] = []
+        self._stderr = deque(maxlen=stderr_lines)
+        self._tasks: List[asyncio.Task] = []
+
+    def subscribe(self, callback: Callable[[ProgressSnapshot], None]):
+        self._subscribers.append(callback)
+
+    def start(self) -> "ProgressReader":
+        if not self._tasks:
+            if self.proc.stdout is not None:
+                self._tasks.append(asyncio.create_task(self._read_progress()))
+            if self.proc.stderr is not None:
+                self._tasks.append(asyncio.create_task(self._read_stderr()))
+        return self
+
+    async def wait(self):
+        """Waits until both pipes are drained (i.e. the process closed them)."""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stderr_tail(self) -> str:
+        return "\n".join(self._stderr)
+
+    async def _read_progress(self):
+        buffer = b""
+        while True:
+            chunk = await self.proc.stdout.read(READ_SIZE)
+            if not chunk:
+                break
+            buffer += chunk
+
+            # Only the newest values matter, so everything up to the last
+            # complete record is parsed at once (later keys win)
+            end = None
+            for end in _RECORD_END.finditer(buffer):
+                pass
+            if end is None:
+                continue
+            self._publish(buffer[: end.end()])
+            buffer = buffer[end.end():]
+
+    async def _read_stderr(self):
+        partial = ""
+        while True:
+            chunk = await self.proc.stderr.read(READ_SIZE)
+            if not chunk:
+                break
+            lines = (partial + chunk.decode(errors="ignore")).replace("\r", "\n").split("\n")
+            partial = lines.pop()
+            self._stderr.extend(line for line in lines if line.strip())
+        if partial.strip():
+            self._stderr.append(partial)
+
+    def _publish(self, block: bytes):
+        values: Dict[str, str] = dict(
+            line.partition("=")[::2] for line in block.decode(errors="ignore").splitlines()
+        )
+        prev = self.latest
+        snapshot = ProgressSnapshot(
+            frame=_to_int(values.get("frame"), prev.frame),
+            fps=_to_float(values.get("fps"), prev.fps),
+            bitrate=values.get("bitrate", prev.bitrate).strip(),
+            speed=values.get("speed", prev.speed).strip(),
+            out_time_us=_to_int(values.get("out_time_us"), prev.out_time_us),
+            total_size=_to_int(values.get("total_size"), prev.total_size),
+            done=values.get("progress") == "end",
+            updated=time.time(),
+        )
+        self.latest = snapshot
+        for callback in self._subscribers:
+            try:
+                callback(snapshot)
+            except Exception as e:
+                log.error(f"Progress subscriber failed: {e}")
@@ -1,11 +1,18 @@
 # Developed by ARGON telegram: @REACTIVEARGON
 import os
 import shlex
+from bot.config import CHUNKED_MIN_DURATION
+from bot.func.asset_store import FONT_EXT, IMAGE_EXT, THUMBNAIL_EXT, materialize
+from bot.func.filter_graph import VideoGraph, WatermarkParts, compile_video_graph
+from bot.func.probe import MediaInfo
 from bot.logger import LOGGER
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 log = LOGGER(__name__)
 
+# Lowest video bitrate a target size may ask for
+MIN_TARGET_KBPS = 100
+
 
 def validate_ffmpeg_command(cmd: str) -> bool:
     """
@@ -28,77 +35,41 @@ def validate_ffmpeg_command(cmd: str) -> bool:
     except Exception:
         return False
 
-def prepare_watermark_assets(user_id: int, settings: Dict):
+async def prepare_watermark_assets(user_id: int, settings: Dict):
     """
-    Checks for watermark assets in settings and restores them to disk if missing.
-    Updates settings with local paths.
+    Resolves the watermark image and font assets to local files.
+    Updates settings with their paths.
     """
     wm = settings.get("watermark", {})
 
-    # Ensure directories
-    if not os.path.exists("watermarks"):
-        os.makedirs("watermarks")
-    if not os.path.exists("watermarks/fonts"):
-        os.makedirs("watermarks/fonts")
-
-    # Restore Image
-    if "image_data" in wm:
-        image_path = os.path.join(os.getcwd(), "watermarks", f"{user_id}.png")
-        if not os.path.exists(image_path):
-            try:
-                with open(image_path, "wb") as f:
-                    f.write(wm["image_data"])
-                log.info(f"Restored watermark image for user {user_id}")
-            except Exception as e:
-                log.error(f"Failed to restore watermark image: {e}")
-
-        # Update path in settings to ensure it points to the restored file
-        wm["image_path"] = image_path
-
-    # Restore Font
-    if "font_data" in wm:
-        font_path = f"watermarks/fonts/{user_id}.ttf"
-        if not os.path.exists(font_path):
-            try:
-                with open(font_path, "wb") as f:
-                    f.write(wm["font_data"])
-                log.info(f"Restored custom font for user {user_id}")
-            except Exception as e:
-                log.error(f"Failed to restore custom font: {e}")
-
-def prepare_thumbnail(user_id: int, settings: Dict) -> str:
+    if wm.get("image_hash"):
+        image_path = await materialize(wm["image_hash"], IMAGE_EXT)
+        if image_path:
+            wm["image_path"] = image_path
+
+    if wm.get("font_hash"):
+        font_path = await materialize(wm["font_hash"], FONT_EXT)
+        if font_path:
+            wm["font_path"] = font_path
+
+
+async def prepare_thumbnail(user_id: int, settings: Dict) -> str:
     """
-    Checks for thumbnail in settings and restores it to disk if missing.
+    Resolves the thumbnail asset to a local file.
     Returns the path to the thumbnail if it exists, else None.
     """
-    if "thumbnail" in settings:
-        # Ensure directory
-        if not os.path.exists("watermarks"):
-            os.makedirs("watermarks")
-
-        thumb_path = os.path.join(os.getcwd(), "watermarks", f"thumb_{user_id}.jpg")
-
-        if not os.path.exists(thumb_path):
-            try:
-                with open(thumb_path, "wb") as f:
-                    f.write(settings["thumbnail"])
-                log.info(f"Restored thumbnail for user {user_id}")
-            except Exception as e:
-                log.error(f"Failed to restore thumbnail: {e}")
-                return None
-
-        return thumb_path
-    return None
+    return await materialize(settings.get("thumbnail_hash"), THUMBNAIL_EXT)
 
-def generate_watermark_filter(settings: Dict, for_preview: bool = False) -> str:
+def watermark_parts(settings: Dict, for_preview: bool = False) -> Optional[WatermarkParts]:
     """
-    Generates the FFmpeg filter string for watermarks.
+    Builds the watermark of settings as filter pieces (see WatermarkParts),
+    or None when there is no watermark.
     """
     wm_settings = settings.get("watermark", {})
     wm_type = wm_settings.get("type", "none")
 
     if wm_type == "none":
-        return ""
+        return None
 
     position = wm_settings.get("position", "top-right")
     opacity = float(wm_settings.get("opacity", 0.5))
@@ -125,19 +96,28 @@ def generate_watermark_filter(settings: Dict, for_preview: bool = False) -> str:
     m_left = margins.get("left", 10)
     m_right = margins.get("right", 10)
 
+    # drawtext sizes the text as tw/th, overlay sizes the main video as W/H
+    # and the watermark as w/h
+    right_edge = {"text": f"w-tw-{m_right}", "image": f"W-w-{m_right}"}
+    bottom_edge = {"text": f"h-th-{m_bottom}", "image": f"H-h-{m_bottom}"}
+    kind = "image" if wm_type == "image" else "text"
+
     if position == "top-left":
         x, y = f"{m_left}", f"{m_top}"
-    elif position == "top-right":
-        x, y = f"w-tw-{m_right}", f"{m_top}"
     elif position == "bottom-left":
-        x, y = f"{m_left}", f"h-th-{m_bottom}"
+        x, y = f"{m_left}", bottom_edge[kind]
     elif position == "bottom-right":
-        x, y = f"w-tw-{m_right}", f"h-th-{m_bottom}"
+        x, y = right_edge[kind], bottom_edge[kind]
+    else:  # top-right
+        x, y = right_edge[kind], f"{m_top}"
 
-    credit_text = ""
+    credit = ()
     if for_preview:
         # Add Credit Text (Developed by Argon) only for preview
-        credit_text = ",drawtext=fontfile='bot/fonts/Roboto-Regular.ttf':text='Developed by Argon':fontsize=24:fontcolor=black:x=w-tw-10:y=h-th-10"
+        credit = (
+            "drawtext=fontfile='bot/fonts/Roboto-Regular.ttf':text='Developed by Argon'"
+            ":fontsize=24:fontcolor=black:x=w-tw-10:y=h-th-10",
+        )
 
     if wm_type == "text":
         text = wm_settings.get("text", "AutoAnimePro")
@@ -145,72 +125,300 @@ def generate_watermark_filter(settings: Dict, for_preview: bool = False) -> str:
         border_opacity = float(wm_settings.get("border_opacity", 0.5))
 
         # Font Selection
-        user_id = settings.get("user_id")
         font_path = "bot/fonts/Roboto-Regular.ttf" # Default
 
-        if user_id:
-            custom_font = f"watermarks/fonts/{user_id}.ttf"
-            if os.path.exists(custom_font):
-                font_path = custom_font
-
-        # Italic, Semi-transparent text with dark semi-transparent box border
-        # fontcolor=white@opacity
-        # box=1:boxcolor=black@border_opacity:boxborderw=5
+        custom_font = wm_settings.get("font_path")
+        if custom_font and os.path.exists(custom_font):
+            font_path = os.path.relpath(custom_font, os.getcwd()).replace("\\", "/")
 
         # Escape text for drawtext
         text = text.replace("'", "").replace(":", "\\:")
 
-        return (
+        # Semi-transparent text with a dark semi-transparent box border
+        drawtext = (
             f"drawtext=fontfile='{font_path}':text='{text}':fontsize={font_size}:fontcolor=white@{opacity}:"
             f"x={x}:y={y}:box=1:boxcolor=black@{border_opacity}:boxborderw=5{enable_expr}"
-            f"{credit_text}"
         )
+        return WatermarkParts(filters=(drawtext,) + credit)
 
     elif wm_type == "image":
         image_path = wm_settings.get("image_path", "")
         if not image_path:
-            return ""
-
-        log.info(f"Watermark Image Path: {image_path}")
-        log.info(f"Exists: {os.path.exists(image_path)}")
-        log.info(f"CWD: {os.getcwd()}")
-
-        scale = float(wm_settings.get("scale", 0.1)) # Scale relative to video width?
-        # Actually easier to just scale the overlay input
-        # We need a complex filter graph for image overlay
-        # [0:v][1:v] overlay...
-        # But here we are returning a filter string for -vf.
-        # So we use the 'movie' filter source.
-
-        # movie=filename [wm]; [wm] colorchannelmixer=aa=opacity [wm_trans]; [in][wm_trans] overlay=x:y
-        # Note: 'movie' filter path needs to be escaped properly
-
-        # For simplicity in this function, we return the filter chain part.
-        # However, 'movie' filter is tricky with windows paths.
-        # Let's try to use forward slashes.
-        # Try to use relative path to avoid double-prefix issues
+            return None
+
+        scale = float(wm_settings.get("scale", 0.1))
+
+        # The movie source needs a path without backslashes, relative to
+        # avoid double-prefix issues
         try:
             image_path = os.path.relpath(image_path, os.getcwd())
         except ValueError:
             pass # Keep absolute if on different drive
-
         image_path = image_path.replace("\\", "/")
 
-        # Resize image first?
-        # scale=iw*scale:-1
-
         # Ensure RGBA format for opacity to work on all image types
-        return (
-            f"movie='{image_path}',scale=iw*{scale}:-1,format=rgba,colorchannelmixer=aa={opacity}[wm];"
-            f"[0:v][wm]overlay=x={x.replace('tw', 'w').replace('th', 'h')}:y={y.replace('tw', 'w').replace('th', 'h')}{enable_expr}"
-            f"{credit_text}"
+        return WatermarkParts(
+            source=(
+                f"movie='{image_path}'",
+                f"scale=iw*{scale}:-1",
+                "format=rgba",
+                f"colorchannelmixer=aa={opacity}",
+            ),
+            overlay=f"overlay=x={x}:y={y}{enable_expr}",
+            filters=credit,
         )
 
+    return None
+
+
+def generate_watermark_filter(settings: Dict, for_preview: bool = False) -> str:
+    """
+    Generates the FFmpeg filter string for watermarks, applied to [0:v] with
+    one unlabeled output. Image watermarks need -filter_complex.
+    """
+    graph = compile_video_graph(watermark_parts(settings, for_preview), ("",))
+    return graph.filter if graph else ""
+
+
+def get_scale_filter(res: str) -> str:
+    """
+    Returns the scale filter for a resolution label, or "" if unknown.
+    """
+    if res == "1080p":
+        return "scale=-2:1080"
+    elif res == "720p":
+        return "scale=-2:720"
+    elif res == "480p":
+        return "scale=-2:480"
+    elif res == "360p":
+        return "scale=-2:360"
     return ""
 
 
+def _scale_for(res: str, media_info: Optional[MediaInfo] = None) -> str:
+    """
+    Scale filter for a rendition, or "" when the source already has that
+    size (scale=-2:H on an H-high, even-width source is a no-op pass).
+    """
+    scale_filter = get_scale_filter(res)
+    if (
+        scale_filter
+        and media_info
+        and media_info.width % 2 == 0
+        and scale_filter == f"scale=-2:{media_info.height}"
+    ):
+        return ""
+    return scale_filter
+
+
+def video_graph(
+    settings: Dict, resolutions: List[str], media_info: Optional[MediaInfo] = None
+) -> Optional[VideoGraph]:
+    """The (cached) filtergraph producing one watermarked stream per resolution."""
+    scales = tuple(_scale_for(res, media_info) for res in resolutions)
+    return compile_video_graph(watermark_parts(settings), scales)
+
+
+def _video_codec_args(settings: Dict, rate: Optional[Dict] = None) -> List[str]:
+    """
+    Builds the video encoder options (codec, CRF, preset).
+    With rate ({"kbps", "pass", "passlog"}) the CRF is replaced by a
+    two-pass average bitrate.
+    """
+    video_settings = settings.get("video", {})
+
+    crf = video_settings.get("crf", "23")
+    preset = video_settings.get("preset", "medium")
+    codec = video_settings.get("codec", "mpeg4")
+
+    if not rate:
+        return ["-c:v", codec, "-crf", str(crf), "-preset", preset]
+
+    args = ["-c:v", codec, "-b:v", f"{rate['kbps']}k", "-preset", preset]
+    if codec == "libx265":
+        # libx265 takes its pass options through x265-params
+        args.extend(["-x265-params", f"pass={rate['pass']}:stats={rate['passlog']}.log"])
+    else:
+        args.extend(["-pass", str(rate["pass"]), "-passlogfile", rate["passlog"]])
+    return args
+
+
+def _parse_bitrate_kbps(value: str) -> float:
+    """'128k' -> 128.0, '1.5M' -> 1500.0, '96000' -> 96.0"""
+    value = str(value).strip().lower()
+    try:
+        if value.endswith("k"):
+            return float(value[:-1])
+        if value.endswith("m"):
+            return float(value[:-1]) * 1000
+        return float(value) / 1000
+    except ValueError:
+        return 128.0
+
+
+def target_video_kbps(settings: Dict, media_info: Optional[MediaInfo]) -> int:
+    """
+    Video bitrate that makes one rendition land at video.target_size_mb,
+    from the probed duration and the audio bitrate. 0 when not applicable.
+    """
+    target_mb = float(settings.get("video", {}).get("target_size_mb", 0) or 0)
+    if target_mb <= 0 or not media_info or media_info.duration <= 0:
+        return 0
+
+    total_kbps = target_mb * 1024 * 1024 * 8 / 1000 / media_info.duration
+    audio_kbps = _parse_bitrate_kbps(settings.get("audio", {}).get("bitrate", "128k"))
+    audio_kbps *= max(1, media_info.audio_streams)
+    # Keep ~3% for container overhead and subtitles
+    return max(MIN_TARGET_KBPS, int(total_kbps * 0.97 - audio_kbps))
+
+
+def chunked_applies(settings: Dict, duration: float) -> bool:
+    """
+    Whether video.chunked takes effect for an input of duration seconds,
+    following the precedence documented in generate_ffmpeg_cmd.
+    """
+    video_settings = settings.get("video", {})
+    if not video_settings.get("chunked") or duration < CHUNKED_MIN_DURATION:
+        return False
+    if target_video_kbps(settings, MediaInfo(duration=duration)):
+        return False
+    resolutions = video_settings.get("resolution", ["1080p"])
+    if isinstance(resolutions, str):
+        resolutions = [resolutions]
+    return not (len(resolutions) > 1 and video_settings.get("single_decode", True))
+
+
+def _mux_args(settings: Dict) -> List[str]:
+    """
+    Builds the audio, subtitle and metadata options of an output.
+    """
+    audio_settings = settings.get("audio", {})
+    meta_settings = settings.get("metadata", {})
+
+    audio_bitrate = audio_settings.get("bitrate", "128k")
+
+    cmd = []
+
+    # Audio (AAC for compatibility)
+    cmd.extend(["-c:a", "aac"])
+    cmd.extend(["-b:a", audio_bitrate])
+
+    # Subtitles (Copy for MKV)
+    cmd.extend(["-c:s", "copy"])
+
+    # Metadata
+    # Smart Defaults (Branding)
+
+    # Global Defaults
+    global_meta = meta_settings.get("global", {}).copy()
+    if "title" not in global_meta: global_meta["title"] = "Encoded by @AutoAnimeProBot"
+    if "artist" not in global_meta: global_meta["artist"] = "@AutoAnimeProBot"
+    if "encoded_by" not in global_meta: global_meta["encoded_by"] = "@AutoAnimeProBot"
+
+    for key, value in global_meta.items():
+        if value:
+            cmd.extend(["-metadata", f"{key}={value}"])
+
+    # Video Stream Defaults
+    video_meta = meta_settings.get("video", {}).copy()
+    if "title" not in video_meta: video_meta["title"] = "Encoded by @AutoAnimeProBot"
+    if "handler_name" not in video_meta: video_meta["handler_name"] = "AutoAnimeProBot"
+
+    for key, value in video_meta.items():
+        if value:
+            cmd.extend(["-metadata:s:v", f"{key}={value}"])
+
+    # Audio Stream Defaults
+    audio_meta = meta_settings.get("audio", {}).copy()
+    if "title" not in audio_meta: audio_meta["title"] = "Encoded by @AutoAnimeProBot"
+    if "handler_name" not in audio_meta: audio_meta["handler_name"] = "AutoAnimeProBot"
+
+    for key, value in audio_meta.items():
+        if value:
+            cmd.extend(["-metadata:s:a", f"{key}={value}"])
+
+    # Subtitle Stream Defaults
+    # Do NOT default functional tags like language/forced/default
+    subtitle_meta = meta_settings.get("subtitle", {}).copy()
+    if "title" not in subtitle_meta: subtitle_meta["title"] = "Encoded by @AutoAnimeProBot"
+    if "handler_name" not in subtitle_meta: subtitle_meta["handler_name"] = "AutoAnimeProBot"
+
+    for key, value in subtitle_meta.items():
+        if value:
+            cmd.extend(["-metadata:s:s", f"{key}={value}"])
+
+    return cmd
+
+
+def _output_args(settings: Dict, rate: Optional[Dict] = None) -> List[str]:
+    """
+    Builds the per-output encoding options (codec, audio, subtitles, metadata).
+    """
+    return _video_codec_args(settings, rate) + _mux_args(settings)
+
+
+def _thumbnail_args() -> List[str]:
+    return ["-map", "1", "-c:v:1", "png", "-disposition:v:1", "attached_pic"]
+
+
+def _output_path(output_base: str, res: str, resolutions: List[str]) -> str:
+    # If multiple resolutions, append suffix
+    suffix = f"_{res}" if len(resolutions) > 1 else ""
+    return f"{output_base}{suffix}.mkv"
+
+
+def generate_single_decode_cmd(
+    settings: Dict,
+    input_file: str,
+    output_base: str,
+    thumbnail_path: str = None,
+    media_info: Optional[MediaInfo] = None,
+) -> Dict:
+    """
+    Generates ONE FFmpeg command that decodes the input once and fans out
+    to every selected resolution through a split filter graph.
+
+    Returns a dict shaped like the entries of generate_ffmpeg_cmd, plus an
+    "outputs" list with one {"output_file", "suffix"} entry per rendition.
+    """
+    resolutions = settings.get("video", {}).get("resolution", ["1080p"])
+    if isinstance(resolutions, str):
+        resolutions = [resolutions]
+
+    graph = video_graph(settings, resolutions, media_info)
+
+    cmd = ["ffmpeg", "-i", input_file]
+    if thumbnail_path:
+        cmd.extend(["-i", thumbnail_path])
+
+    # [0:v]split=N[d0][d1]... then one scale (+ watermark) chain per output
+    cmd.extend(graph.args())
+
+    output_args = _output_args(settings)
+    outputs = []
+    for i, res in enumerate(resolutions):
+        output_path = _output_path(output_base, res, resolutions)
+        cmd.extend(["-map", f"[{graph.outputs[i]}]", "-map", "0:a?", "-map", "0:s?"])
+        if thumbnail_path:
+            cmd.extend(_thumbnail_args())
+        cmd.extend(output_args)
+        cmd.append(output_path)
+        outputs.append({"output_file": output_path, "suffix": res})
+
+    return {
+        "cmd": shlex.join(cmd),
+        "output_file": outputs[0]["output_file"],
+        "suffix": ", ".join(resolutions),
+        "outputs": outputs,
+    }
+
+
 def generate_ffmpeg_cmd(
-    settings: Dict, input_file: str, output_base: str, thumbnail_path: str = None
+    settings: Dict,
+    input_file: str,
+    output_base: str,
+    thumbnail_path: str = None,
+    media_info: Optional[MediaInfo] = None,
 ) -> List[Dict[str, str]]:
     """
     Generates a list of FFmpeg commands based on user settings.
@@ -221,58 +429,49 @@ def generate_ffmpeg_cmd(
         {"cmd": "ffmpeg ...", "output_file": "/path/to/output_1080p.mp4", "suffix": "1080p"},
         ...
     ]
+
+    With several resolutions and "single_decode" enabled (default), a single
+    entry is returned whose command writes every rendition (see
+    generate_single_decode_cmd).
+
+    media_info (from the probe service) lets renditions that match the
+    source size skip the scale filter.
+
+    With video.target_size_mb (and a probed duration) every rendition is
+    encoded in two passes: an analysis entry ("analysis": True, writes no
+    file) followed by the real encode at the computed average bitrate.
+    Both carry a "label" for the progress UI.
+
+    The encode modes take precedence in this order: a target size (two
+    passes), then single decode (several resolutions in one process), then
+    chunked. Only the per-rendition CRF entries carry "chunk_args", and the
+    chunked engine runs them for inputs of at least CHUNKED_MIN_DURATION;
+    chunked_applies tells whether that is the case.
     """
     video_settings = settings.get("video", {})
-    audio_settings = settings.get("audio", {})
-    meta_settings = settings.get("metadata", {})
-
-    # Watermark Filter
-    wm_filter = generate_watermark_filter(settings)
 
-    crf = video_settings.get("crf", "23")
-    preset = video_settings.get("preset", "medium")
-    codec = video_settings.get("codec", "mpeg4")
     resolutions = video_settings.get("resolution", ["1080p"])
 
     # Ensure resolutions is a list
     if isinstance(resolutions, str):
         resolutions = [resolutions]
 
-    audio_bitrate = audio_settings.get("bitrate", "128k")
-    title = meta_settings.get("title", "")
-    author = meta_settings.get("author", "")
+    target_kbps = target_video_kbps(settings, media_info)
+
+    if len(resolutions) > 1 and video_settings.get("single_decode", True) and not target_kbps:
+        return [
+            generate_single_decode_cmd(
+                settings, input_file, output_base, thumbnail_path, media_info
+            )
+        ]
+
+    # Watermark pieces, shared by the graphs of every rendition
+    watermark = watermark_parts(settings)
 
     commands = []
 
     for res in resolutions:
-        # Determine scale filter
-        scale_filter = ""
-        if res == "1080p":
-            scale_filter = "scale=-2:1080"
-        elif res == "720p":
-            scale_filter = "scale=-2:720"
-        elif res == "480p":
-            scale_filter = "scale=-2:480"
-        elif res == "360p":
-            scale_filter = "scale=-2:360"
-
-        # Combine filters
-        video_filters = []
-        if wm_filter:
-            if "movie=" in wm_filter:
-                if scale_filter:
-                    wm_filter_adjusted = wm_filter.replace("[0:v]", "[scaled]")
-                    video_filters.append(f"{scale_filter} [scaled]; {wm_filter_adjusted}")
-                else:
-                    video_filters.append(wm_filter)
-            else:
-                # Text watermark (simple filter)
-                if scale_filter:
-                    video_filters.append(scale_filter)
-                video_filters.append(wm_filter)
-        else:
-            if scale_filter:
-                video_filters.append(scale_filter)
+        graph = compile_video_graph(watermark, (_scale_for(res, media_info),))
 
         # Build command
         cmd = ["ffmpeg"]
@@ -282,8 +481,7 @@ def generate_ffmpeg_cmd(
             cmd.extend(["-i", thumbnail_path])
 
         # Map streams
-        # Map streams
-        is_complex = video_filters and any("movie=" in f for f in video_filters)
+        is_complex = bool(graph and graph.complex)
 
         if not is_complex:
             cmd.extend(["-map", "0:v?"])
@@ -291,78 +489,64 @@ def generate_ffmpeg_cmd(
         cmd.extend(["-map", "0:a?", "-map", "0:s?"])
 
         if thumbnail_path:
-            cmd.extend(["-map", "1"])
-            cmd.extend(["-c:v:1", "png"])
-            cmd.extend(["-disposition:v:1", "attached_pic"])
-
-        if video_filters:
-            if any("movie=" in f for f in video_filters):
-                 cmd.extend(["-filter_complex", ",".join(video_filters)])
-            else:
-                 cmd.extend(["-vf", ",".join(video_filters)])
-
-        # Video
-        cmd.extend(["-c:v", codec])
-        cmd.extend(["-crf", str(crf)])
-        cmd.extend(["-preset", preset])
-
-        # Audio (AAC for compatibility)
-        cmd.extend(["-c:a", "aac"])
-        cmd.extend(["-b:a", audio_bitrate])
-
-        # Subtitles (Copy for MKV)
-        cmd.extend(["-c:s", "copy"])
-
-        # Metadata
-        # Smart Defaults (Branding)
-        bot_username = "AutoAnimeProBot" # Fallback
-
-        # Global Defaults
-        global_meta = meta_settings.get("global", {}).copy()
-        if "title" not in global_meta: global_meta["title"] = "Encoded by @AutoAnimeProBot"
-        if "artist" not in global_meta: global_meta["artist"] = "@AutoAnimeProBot"
-        if "encoded_by" not in global_meta: global_meta["encoded_by"] = "@AutoAnimeProBot"
-
-        for key, value in global_meta.items():
-            if value:
-                cmd.extend(["-metadata", f"{key}={value}"])
-
-        # Video Stream Defaults
-        video_meta = meta_settings.get("video", {}).copy()
-        if "title" not in video_meta: video_meta["title"] = "Encoded by @AutoAnimeProBot"
-        if "handler_name" not in video_meta: video_meta["handler_name"] = "AutoAnimeProBot"
-
-        for key, value in video_meta.items():
-            if value:
-                cmd.extend(["-metadata:s:v", f"{key}={value}"])
-
-        # Audio Stream Defaults
-        audio_meta = meta_settings.get("audio", {}).copy()
-        if "title" not in audio_meta: audio_meta["title"] = "Encoded by @AutoAnimeProBot"
-        if "handler_name" not in audio_meta: audio_meta["handler_name"] = "AutoAnimeProBot"
-
-        for key, value in audio_meta.items():
-            if value:
-                cmd.extend(["-metadata:s:a", f"{key}={value}"])
-
-        # Subtitle Stream Defaults
-        # Do NOT default functional tags like language/forced/default
-        subtitle_meta = meta_settings.get("subtitle", {}).copy()
-        if "title" not in subtitle_meta: subtitle_meta["title"] = "Encoded by @AutoAnimeProBot"
-        if "handler_name" not in subtitle_meta: subtitle_meta["handler_name"] = "AutoAnimeProBot"
-
-        for key, value in subtitle_meta.items():
-            if value:
-                cmd.extend(["-metadata:s:s", f"{key}={value}"])
+            cmd.extend(_thumbnail_args())
 
-        # Join command
-        cmd_str = shlex.join(cmd)
+        filter_args = graph.args() if graph else []
 
         # Output filename
-        # If multiple resolutions, append suffix
-        suffix = f"_{res}" if len(resolutions) > 1 else ""
-        output_path = f"{output_base}{suffix}.mkv"
+        output_path = _output_path(output_base, res, resolutions)
+
+        if target_kbps:
+            passlog = f"{os.path.splitext(output_path)[0]}_2pass"
+            first = {"kbps": target_kbps, "pass": 1, "passlog": passlog}
+            second = {"kbps": target_kbps, "pass": 2, "passlog": passlog}
+
+            # Pass 1 only analyses the video: no audio, subtitles or file
+            analysis = ["ffmpeg", "-i", input_file]
+            if not is_complex:
+                analysis.extend(["-map", "0:v:0"])
+            analysis.extend(filter_args + _video_codec_args(settings, first))
+            analysis.extend(["-an", "-sn", "-f", "null"])
+
+            commands.append(
+                {
+                    "cmd": shlex.join(analysis),
+                    "output_file": os.devnull,
+                    "suffix": res,
+                    "analysis": True,
+                    "passlog": passlog,
+                    "label": f"Pass 1/2 (analysis) · {target_kbps} kb/s",
+                }
+            )
+            commands.append(
+                {
+                    "cmd": shlex.join(cmd + filter_args + _output_args(settings, second)),
+                    "output_file": output_path,
+                    "suffix": res,
+                    "passlog": passlog,
+                    "label": f"Pass 2/2 · {target_kbps} kb/s",
+                }
+            )
+            continue
+
+        cmd.extend(filter_args)
+        cmd.extend(_output_args(settings))
 
-        commands.append({"cmd": cmd_str, "output_file": output_path, "suffix": res})
+        # Join command
+        cmd_str = shlex.join(cmd)
+
+        commands.append(
+            {
+                "cmd": cmd_str,
+                "output_file": output_path,
+                "suffix": res,
+                # Pieces used by the chunked engine (bot/func/chunked.py)
+                "chunk_args": {
+                    "video_args": filter_args + _video_codec_args(settings),
+                    "complex": is_complex,
+                    "mux_args": _mux_args(settings),
+                },
+            }
+        )
 
     return commands
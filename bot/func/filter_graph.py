@@ -0,0 +1,134 @@
+# Developed by ARGON telegram: @REACTIVEARGON
+from collections import defaultdict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+GRAPH_CACHE_SIZE = 128
+
+
+@dataclass(frozen=True)
+class WatermarkParts:
+    """
+    A watermark as filter pieces instead of a finished string.
+
+    Text watermarks are plain filters on the video (filters). Image
+    watermarks add a source chain (movie=..., scaled and faded) that is
+    overlaid with overlay, followed by filters.
+    """
+
+    filters: Tuple[str, ...] = ()
+    source: Tuple[str, ...] = ()
+    overlay: str = ""
+
+
+@dataclass(frozen=True)
+class Chain:
+    """One filter chain: input pads, comma-joined filters, output pads."""
+
+    inputs: Tuple[str, ...]
+    filters: Tuple[str, ...]
+    outputs: Tuple[str, ...]
+
+    def compile(self) -> str:
+        pads_in = "".join(f"[{pad}]" for pad in self.inputs)
+        pads_out = "".join(f"[{pad}]" for pad in self.outputs)
+        return f"{pads_in}{','.join(self.filters)}{pads_out}"
+
+
+class FilterGraph:
+    """Builds a filtergraph from chains, handing out unique pad labels."""
+
+    def __init__(self):
+        self.chains: List[Chain] = []
+        self._counters: Dict[str, int] = defaultdict(int)
+
+    def pad(self, prefix: str) -> str:
+        label = f"{prefix}{self._counters[prefix]}"
+        self._counters[prefix] += 1
+        return label
+
+    def chain(
+        self, inputs: Sequence[str], filters: Sequence[str], outputs: Sequence[str] = ()
+    ) -> Tuple[str, ...]:
+        """Appends a chain and returns its output pads."""
+        self.chains.append(Chain(tuple(inputs), tuple(filters), tuple(outputs)))
+        return tuple(outputs)
+
+    @property
+    def is_simple(self) -> bool:
+        """One chain on the first video stream with one unlabeled output: fits -vf."""
+        if len(self.chains) != 1:
+            return False
+        chain = self.chains[0]
+        return chain.inputs in ((), ("0:v",)) and not chain.outputs
+
+    def compile(self) -> str:
+        if self.is_simple:
+            return ",".join(self.chains[0].filters)
+        return ";".join(chain.compile() for chain in self.chains)
+
+
+@dataclass(frozen=True)
+class VideoGraph:
+    """
+    A compiled video filtergraph. outputs holds the pad to -map per rendition,
+    or None for a lone rendition whose unlabeled output FFmpeg maps itself.
+    """
+
+    filter: str
+    complex: bool
+    outputs: Tuple[Optional[str], ...]
+
+    def args(self) -> List[str]:
+        return ["-filter_complex" if self.complex else "-vf", self.filter]
+
+
+@lru_cache(maxsize=GRAPH_CACHE_SIZE)
+def compile_video_graph(
+    watermark: Optional[WatermarkParts], scales: Tuple[str, ...]
+) -> Optional[VideoGraph]:
+    """
+    Compiles the graph that turns the input video into one stream per entry
+    of scales (a scale filter, or "" to keep the size), each watermarked.
+
+    Several renditions decode once and split. An image watermark is read and
+    prepared once, then split to every rendition. Memoized on the watermark
+    parts and scales, so jobs with the same settings reuse the graph.
+    Returns None when there is nothing to filter.
+    """
+    count = len(scales)
+    if count == 1 and not watermark and not scales[0]:
+        return None
+
+    graph = FilterGraph()
+    labeled = count > 1
+
+    heads: Sequence[str] = ("0:v",)
+    if labeled:
+        heads = graph.chain(["0:v"], [f"split={count}"], [graph.pad("d") for _ in scales])
+
+    overlays: Sequence[str] = ()
+    if watermark and watermark.source:
+        source = list(watermark.source)
+        if labeled:
+            source.append(f"split={count}")
+        overlays = graph.chain([], source, [graph.pad("wm") for _ in scales])
+
+    outputs = []
+    for i, scale in enumerate(scales):
+        out = [graph.pad("v")] if labeled else []
+        filters = [scale] if scale else []
+
+        if overlays:
+            video = heads[i]
+            if filters:
+                video = graph.chain([video], filters, [graph.pad("s")])[0]
+            graph.chain([video, overlays[i]], [watermark.overlay, *watermark.filters], out)
+        else:
+            if watermark:
+                filters.extend(watermark.filters)
+            graph.chain([heads[i]], filters or ["null"], out)
+        outputs.append(out[0] if out else None)
+
+    return VideoGraph(graph.compile(), not graph.is_simple, tuple(outputs))
@@ -0,0 +1,113 @@
+# Developed by ARGON telegram: @REACTIVEARGON
+import os
+from typing import List, Sequence, Tuple
+
+from pyrogram import Client
+from pyrogram.types import Message
+
+from bot.config import SS_RANGE_HEAD_MB, SS_RANGE_WINDOW_MB
+from bot.func.download_manager import download_manager
+from bot.logger import LOGGER
+
+log = LOGGER(__name__)
+
+# Pyrogram's stream_media offsets and limits count 1 MiB chunks
+CHUNK_SIZE = 1024 * 1024
+
+
+def _merge(ranges: Sequence[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Sorts [start, end) chunk ranges and joins the overlapping ones."""
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class PartialMedia:
+    """
+    A local sparse copy of a Telegram document holding only some byte ranges.
+
+    The file has the document's full size but only the fetched chunks take
+    disk space; the rest reads as zeros. The container header and tail (where
+    MP4 moov atoms and MKV cues usually live) plus a window around each
+    requested timestamp are enough for FFmpeg to seek and decode single
+    frames, without downloading the whole file.
+    """
+
+    def __init__(self, client: Client, message: Message, file_path: str, size: int):
+        self.client = client
+        self.message = message
+        self.file_path = file_path
+        self.size = size
+        self.total_chunks = -(-size // CHUNK_SIZE)
+        self.fetched: List[Tuple[int, int]] = []
+
+    @property
+    def fetched_bytes(self) -> int:
+        return min(self.size, sum(end - start for start, end in self.fetched) * CHUNK_SIZE)
+
+    def _missing(self, ranges: Sequence[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        """The parts of ranges not fetched yet."""
+        missing = []
+        for start, end in _merge(ranges):
+            for done_start, done_end in self.fetched:
+                if done_end <= start or done_start >= end:
+                    continue
+                if done_start > start:
+                    missing.append((start, done_start))
+                start = max(start, done_end)
+            if start < end:
+                missing.append((start, end))
+        return missing
+
+    async def fetch(self, ranges: Sequence[Tuple[int, int]]):
+        """Downloads the [start, end) chunk ranges not fetched yet into the sparse file."""
+        ranges = [
+            (max(0, start), min(self.total_chunks, end))
+            for start, end in ranges
+            if end > start
+        ]
+        missing = self._missing(ranges)
+        if not missing:
+            return
+
+        if not os.path.exists(self.file_path):
+            with open(self.file_path, "wb") as f:
+                f.truncate(self.size)
+
+        await download_manager.acquire()
+        try:
+            with open(self.file_path, "r+b") as f:
+                for start, end in missing:
+                    f.seek(start * CHUNK_SIZE)
+                    async for chunk in self.client.stream_media(
+                        self.message, limit=end - start, offset=start
+                    ):
+                        f.write(chunk)
+        finally:
+            download_manager.release()
+
+        self.fetched = _merge(self.fetched + missing)
+
+    async def fetch_container(self):
+        """Fetches the header and the tail, enough to probe and index the file."""
+        head = max(1, SS_RANGE_HEAD_MB)
+        await self.fetch([(0, head), (self.total_chunks - head, self.total_chunks)])
+
+    async def fetch_around(self, timestamps: Sequence[float], duration: float):
+        """
+        Fetches a window around the estimated byte position of each timestamp.
+        Positions assume a roughly constant bitrate, so most of the window
+        lies before the timestamp where the keyframe to decode from is.
+        """
+        if not duration:
+            return
+        window = max(2, SS_RANGE_WINDOW_MB)
+        ranges = []
+        for ts in timestamps:
+            center = int(self.total_chunks * min(1.0, ts / duration))
+            ranges.append((center - window * 3 // 4, center + window - window * 3 // 4))
+        await self.fetch(ranges)
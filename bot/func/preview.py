@@ -1,45 +1,126 @@
 # Developed by ARGON telegram: @REACTIVEARGON
 import asyncio
+import hashlib
+import json
 import os
 import shlex
-from bot.func.ffmpeg_utils import generate_watermark_filter, prepare_watermark_assets
+from typing import Dict, Optional
+
+from bot.config import PREVIEW_CACHE_SIZE, PREVIEW_WIDTH
+from bot.func.ffmpeg_utils import prepare_watermark_assets, watermark_parts
+from bot.func.filter_graph import compile_video_graph
 from bot.logger import LOGGER
 
 log = LOGGER(__name__)
 
-async def generate_preview(user_id: int, settings: dict) -> str:
+PREVIEW_DIR = "watermarks/previews"
+
+# Settings that only locate assets on this machine, their content is hashed instead
+_LOCAL_PATH_KEYS = ("image_path", "font_path")
+
+
+def _file_digest(path: str) -> str:
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return ""
+
+
+def preview_key(settings: Dict) -> str:
     """
-    Generates a preview image with the current watermark settings.
-    Returns the path to the preview image.
+    Canonical hash of what a preview shows: the watermark settings, the
+    content of its image and font, and the preview width.
     """
-    try:
-        # Ensure directory exists
-        if not os.path.exists("watermarks"):
-            os.makedirs("watermarks")
+    wm = settings.get("watermark", {})
+    normalized = {k: v for k, v in wm.items() if k not in _LOCAL_PATH_KEYS}
+    if normalized.get("type", "none") == "image" and not wm.get("image_hash"):
+        normalized["image_hash"] = _file_digest(wm.get("image_path", ""))
+    if wm.get("font_path") and not wm.get("font_hash"):
+        normalized["font_hash"] = _file_digest(wm["font_path"])
+    normalized["preview_width"] = PREVIEW_WIDTH
 
-        # Inject user_id for watermark font lookup
-        settings["user_id"] = user_id
+    payload = json.dumps(normalized, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
 
-        # Restore watermark assets if needed
-        prepare_watermark_assets(user_id, settings)
 
-        wm_filter = generate_watermark_filter(settings, for_preview=True)
-        if not wm_filter:
-            log.warning(f"Preview Gen: No watermark filter generated for user {user_id}")
+class PreviewCache:
+    """
+    Rendered watermark previews on disk, keyed by preview_key, so reopening
+    the menu or toggling back to earlier settings does not spawn FFmpeg.
+    The least recently used files are evicted past PREVIEW_CACHE_SIZE, and
+    concurrent requests for the same key share one render.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(PreviewCache, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._initialized = True
+
+    @staticmethod
+    def _path(key: str) -> str:
+        return os.path.join(PREVIEW_DIR, f"{key}.jpg")
+
+    async def get(self, settings: Dict) -> Optional[str]:
+        """Returns the preview image for settings, rendering it on a miss."""
+        key = preview_key(settings)
+        path = self._path(key)
+        if os.path.exists(path):
+            # mtime tracks last use for the eviction
+            os.utime(path)
+            return path
+
+        if key in self._inflight:
+            return await self._inflight[key]
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await self._render(settings, path)
+            future.set_result(result)
+            if result:
+                self._evict()
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            # Waiters see the render error, not a cancellation
+            future.set_exception(e)
+            # Marks it retrieved, so no warning when nobody was waiting
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _render(self, settings: Dict, path: str) -> Optional[str]:
+        graph = compile_video_graph(watermark_parts(settings, for_preview=True), ("",))
+        if not graph:
+            log.warning("Preview Gen: No watermark filter generated")
             return None
 
-        output_path = f"watermarks/preview_{user_id}.jpg"
+        os.makedirs(PREVIEW_DIR, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp.jpg"
         cmd = ["ffmpeg", "-y"]
 
-        # Input: White background
+        # Input: White background at full size, so sizes and margins in pixels
+        # look as on a 1080p video; the result is then scaled down
         cmd.extend(["-f", "lavfi", "-i", "color=c=white:s=1920x1080:d=0.1"])
 
-        if "movie=" in wm_filter:
-            cmd.extend(["-filter_complex", wm_filter])
-        else:
-            cmd.extend(["-vf", wm_filter])
+        # The graph's last chain is the unlabeled output, scale after it
+        wm_filter = f"{graph.filter},scale={PREVIEW_WIDTH}:-2"
+        cmd.extend(["-filter_complex" if graph.complex else "-vf", wm_filter])
 
-        cmd.extend(["-frames:v", "1", output_path])
+        cmd.extend(["-frames:v", "1", "-q:v", "3", tmp_path])
 
         log.info(f"Preview CMD: {shlex.join(cmd)}")
 
@@ -48,14 +129,55 @@ async def generate_preview(user_id: int, settings: dict) -> str:
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE,
         )
-
         stdout, stderr = await process.communicate()
 
-        if process.returncode != 0:
-            log.error(f"Preview Gen Failed: {stderr.decode()}")
+        if process.returncode != 0 or not os.path.exists(tmp_path):
+            log.error(f"Preview Gen Failed: {stderr.decode(errors='ignore')}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
             return None
 
-        return output_path
+        os.replace(tmp_path, path)
+        return path
+
+    def _evict(self):
+        try:
+            entries = [
+                entry
+                for entry in os.scandir(PREVIEW_DIR)
+                if entry.is_file() and entry.name.endswith(".jpg") and ".tmp" not in entry.name
+            ]
+        except OSError:
+            return
+        if len(entries) <= PREVIEW_CACHE_SIZE:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[: len(entries) - PREVIEW_CACHE_SIZE]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+
+preview_cache = PreviewCache()
+
+
+async def generate_preview(user_id: int, settings: dict) -> str:
+    """
+    Generates a preview image with the current watermark settings.
+    Returns the path to the cached preview image, which callers must not delete.
+    """
+    try:
+        # Inject user_id for watermark font lookup
+        settings["user_id"] = user_id
+
+        # Restore watermark assets if needed
+        await prepare_watermark_assets(user_id, settings)
+
+        path = await preview_cache.get(settings)
+        if not path:
+            log.warning(f"Preview Gen: No preview generated for user {user_id}")
+        return path
 
     except Exception as e:
         log.error(f"Preview Error: {e}", exc_info=True)
@@ -0,0 +1,182 @@
+# Developed by ARGON telegram: @REACTIVEARGON
+import asyncio
+import json
+import os
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from bot.logger import LOGGER
+
+log = LOGGER(__name__)
+
+PROBE_CACHE_SIZE = 256
+
+
+def _parse_rate(rate: str) -> float:
+    """Parses an ffprobe rational like '24000/1001'."""
+    try:
+        num, _, den = (rate or "0").partition("/")
+        return float(num) / float(den or 1) if float(den or 1) else 0.0
+    except ValueError:
+        return 0.0
+
+
+@dataclass(frozen=True)
+class MediaInfo:
+    """What the bot needs to know about an input, from one ffprobe run."""
+
+    duration: float = 0.0
+    size: int = 0
+    bit_rate: int = 0
+    video_codec: str = ""
+    width: int = 0
+    height: int = 0
+    fps: float = 0.0
+    frame_count: int = 0
+    audio_streams: int = 0
+    subtitle_streams: int = 0
+
+    @classmethod
+    def from_ffprobe(cls, data: Dict) -> "MediaInfo":
+        fmt = data.get("format", {})
+        streams = data.get("streams", [])
+        video = next(
+            (
+                s
+                for s in streams
+                if s.get("codec_type") == "video"
+                and not s.get("disposition", {}).get("attached_pic")
+            ),
+            {},
+        )
+
+        duration = float(fmt.get("duration", 0) or 0)
+        if not duration:
+            for stream in streams:
+                if "duration" in stream:
+                    duration = float(stream["duration"])
+                    break
+
+        fps = _parse_rate(video.get("avg_frame_rate")) or _parse_rate(video.get("r_frame_rate"))
+        frame_count = int(video.get("nb_frames", 0) or 0) or int(duration * fps)
+
+        return cls(
+            duration=duration,
+            size=int(fmt.get("size", 0) or 0),
+            bit_rate=int(fmt.get("bit_rate", 0) or 0),
+            video_codec=video.get("codec_name", ""),
+            width=int(video.get("width", 0) or 0),
+            height=int(video.get("height", 0) or 0),
+            fps=fps,
+            frame_count=frame_count,
+            audio_streams=sum(1 for s in streams if s.get("codec_type") == "audio"),
+            subtitle_streams=sum(1 for s in streams if s.get("codec_type") == "subtitle"),
+        )
+
+
+class ProbeService:
+    """
+    Runs ffprobe once per input and caches the parsed MediaInfo, keyed by
+    Telegram file_unique_id when known, else by path, size and mtime.
+    Concurrent probes of the same input share one ffprobe process.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ProbeService, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+        self._cache: "OrderedDict[Tuple, MediaInfo]" = OrderedDict()
+        self._inflight: Dict[Tuple, asyncio.Future] = {}
+        self._initialized = True
+
+    @staticmethod
+    def _path_key(path: str) -> Optional[Tuple]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return ("path", os.path.abspath(path), st.st_size, st.st_mtime_ns)
+
+    def _remember(self, key: Tuple, info: MediaInfo):
+        self._cache[key] = info
+        self._cache.move_to_end(key)
+        while len(self._cache) > PROBE_CACHE_SIZE:
+            self._cache.popitem(last=False)
+
+    async def _run_ffprobe(self, path: str) -> Optional[MediaInfo]:
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                "ffprobe",
+                "-v",
+                "quiet",
+                "-print_format",
+                "json",
+                "-show_format",
+                "-show_streams",
+                path,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            out, _ = await proc.communicate()
+            if proc.returncode != 0:
+                log.error(f"ffprobe failed for {path} (exit {proc.returncode})")
+                return None
+            return MediaInfo.from_ffprobe(json.loads(out.decode() or "{}"))
+        except Exception as e:
+            log.error(f"Failed to probe {path}: {e}")
+            return None
+
+    async def probe(
+        self, path: str, file_unique_id: str = "", cache: bool = True
+    ) -> Optional[MediaInfo]:
+        """
+        Returns the MediaInfo of path, or None if it could not be probed.
+        Use cache=False for files that are still being written.
+        """
+        if not cache:
+            return await self._run_ffprobe(path)
+
+        keys = []
+        if file_unique_id:
+            keys.append(("fuid", file_unique_id))
+        path_key = self._path_key(path)
+        if path_key:
+            keys.append(path_key)
+
+        for key in keys:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        if not keys:
+            return None
+
+        key = keys[0]
+        if key in self._inflight:
+            return await self._inflight[key]
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            info = await self._run_ffprobe(path)
+            if info:
+                for k in keys:
+                    self._remember(k, info)
+            future.set_result(info)
+            return info
+        except BaseException:
+            future.cancel()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+
+probe_service = ProbeService()
@@ -4,26 +4,32 @@ import time
 
 from pyrogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 
+from bot.func.edit_scheduler import edit_scheduler
 from bot.logger import LOGGER
 
 log = LOGGER(__name__)
 
 
-# Global state for rate limiting
+# Last render time per message, edits themselves are paced by edit_scheduler
 _progress_state = {}
 
 
 async def progress_for_pyrogram(
     current, total, ud_type, message, start, last_update_time=None
 ):
-    # Use global state for rate limiting
     unique_id = f"{message.chat.id}_{message.id}"
     last_time = _progress_state.get(unique_id, 0)
 
     now = time.time()
     diff = now - start
 
-    if now - last_time >= 3 or current == total:
+    if current == total:
+        # The caller edits the message next, don't let a queued edit overwrite it
+        _progress_state.pop(unique_id, None)
+        await edit_scheduler.finish(message)
+        return
+
+    if now - last_time >= 1:
         if total == 0:
             percentage = 0
         else:
@@ -65,25 +71,14 @@ async def progress_for_pyrogram(
  └ <b>ETA:</b> {estimated_total_time_str if estimated_total_time_str else "calculating..."}
 </blockquote>"""
 
-        try:
-            await message.edit(
-                text=progress_text,
-                reply_markup=InlineKeyboardMarkup(
-                    [[InlineKeyboardButton("❌ Cancel", callback_data="cb_close")]]
-                ),
-            )
-            if current == total:
-                if unique_id in _progress_state:
-                    del _progress_state[unique_id]
-            else:
-                _progress_state[unique_id] = now
-        except Exception as e:
-            if "MESSAGE_ID_INVALID" in str(e):
-                # Message was deleted, stop updating
-                if unique_id in _progress_state:
-                    del _progress_state[unique_id]
-            else:
-                log.error(f"Error updating progress: {e}")
+        edit_scheduler.submit(
+            message,
+            progress_text,
+            reply_markup=InlineKeyboardMarkup(
+                [[InlineKeyboardButton("❌ Cancel", callback_data="cb_close")]]
+            ),
+        )
+        _progress_state[unique_id] = now
 
 
 def humanbytes(size):
@@ -1,11 +1,17 @@
 # Developed by ARGON telegram: @REACTIVEARGON
 import asyncio
+import os
+import time
 import uuid
 from dataclasses import dataclass, field
-from typing import Any, Awaitable, Callable, Dict, Optional
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
 
+from bot.config import QUEUE_SAVE_DEBOUNCE
+from bot.func.admission import admission
+from bot.func.disk_budget import disk_budget
+from bot.func.scheduler import FairQueue
 from bot.logger import LOGGER
-from database import get_variable, set_variable
+from database import get_queue_jobs, get_variable, set_variable, write_queue_jobs
 
 log = LOGGER(__name__)
 
@@ -25,6 +31,10 @@ class Job:
     task_type: str = "generic"
     input_file: str = ""
     output_file: str = ""
+    priority: int = 0  # Higher runs first within the user's jobs
+    size_bytes: int = 0
+    cost: float = 1.0  # Estimated CPU cores, see admission.estimate_cost
+    created: float = field(default_factory=time.time)
 
     def to_dict(self):
         return {
@@ -38,6 +48,10 @@ class Job:
             "task_type": self.task_type,
             "input_file": self.input_file,
             "output_file": self.output_file,
+            "priority": self.priority,
+            "size_bytes": self.size_bytes,
+            "cost": self.cost,
+            "created": self.created,
             "args": self.args,
             "kwargs": self.kwargs,
         }
@@ -56,6 +70,10 @@ class Job:
             task_type=data.get("task_type", "generic"),
             input_file=data.get("input_file", ""),
             output_file=data.get("output_file", ""),
+            priority=data.get("priority", 0),
+            size_bytes=data.get("size_bytes", 0),
+            cost=data.get("cost", 1.0),
+            created=data.get("created", 0.0),
             args=tuple(data.get("args", ())),
             kwargs=data.get("kwargs", {}),
         )
@@ -73,39 +91,90 @@ class QueueManager:
     def __init__(self):
         if self._initialized:
             return
-        self._queue = asyncio.Queue()
+        self._queue = FairQueue()  # Per-user deficit round-robin
         self._active_jobs: Dict[str, Job] = {} # Changed from _active_job to dict
         self._jobs: Dict[str, Job] = {}
         self._worker_task: Optional[asyncio.Task] = None
-        self._semaphore = asyncio.Semaphore(4) # Limit concurrent jobs
+        self._dirty: Set[str] = set()  # Job ids changed since the last flush
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
         self._initialized = True
-        log.info("QueueManager initialized with 4 concurrent slots")
+        log.info("QueueManager initialized with adaptive admission")
 
     async def start(self):
         if self._worker_task is None:
             self._worker_task = asyncio.create_task(self._worker())
             log.info("QueueManager worker started")
 
+    def _mark_dirty(self, job: Job):
+        """Schedules a debounced write of the job's current state."""
+        self._dirty.add(job.job_id)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self):
+        await asyncio.sleep(QUEUE_SAVE_DEBOUNCE)
+        await self.save_queue()
+
     async def save_queue(self):
-        try:
-            # Save only pending and running jobs
-            # For running jobs, we save them as pending so they restart
-            jobs_data = []
-            for job in self._jobs.values():
-                if job.status in ["pending", "running"]:
+        """
+        Writes the jobs changed since the last flush, one document per job.
+        Pending and running jobs are upserted (running ones as pending so they
+        restart), finished ones are deleted.
+        """
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+
+            dirty, self._dirty = self._dirty, set()
+            upserts, deletes = [], []
+            for job_id in dirty:
+                job = self._jobs.get(job_id)
+                if job and job.status in ["pending", "running"]:
                     job_dict = job.to_dict()
-                    # If it was running, mark as pending for restart
-                    if job_dict["status"] == "running":
-                        job_dict["status"] = "pending"
-                    jobs_data.append(job_dict)
+                    job_dict["status"] = "pending"
+                    upserts.append(job_dict)
+                else:
+                    deletes.append(job_id)
 
-            await set_variable("queue_state", jobs_data)
-        except Exception as e:
-            log.error(f"Failed to save queue: {e}")
+            try:
+                await write_queue_jobs(upserts, deletes)
+            except Exception as e:
+                log.error(f"Failed to save queue: {e}")
+                # Retry on the next flush
+                self._dirty |= dirty
+
+    async def flush(self):
+        """Writes all pending changes now. Called on shutdown and restart."""
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self.save_queue()
+
+    @staticmethod
+    async def referenced_files() -> Set[str]:
+        """
+        Absolute paths restored jobs still need: their downloaded inputs and
+        the chunk checkpoints of interrupted encodes.
+        """
+        from bot.func.chunked import checkpoint_dirs
+
+        inputs = set()
+        for data in await get_queue_jobs():
+            if data.get("task_type") == "encode" and data.get("input_file"):
+                inputs.add(os.path.abspath(data["input_file"]))
+        return inputs | checkpoint_dirs(inputs)
 
     async def restore_queue(self, client):
         try:
-            jobs_data = await get_variable("queue_state", [])
+            jobs_data = await get_queue_jobs()
+
+            # Migrate the legacy single-document queue state
+            legacy = await get_variable("queue_state", [])
+            if legacy:
+                known = {data["job_id"] for data in jobs_data}
+                jobs_data.extend(data for data in legacy if data["job_id"] not in known)
+                log.info(f"Migrating {len(legacy)} jobs from legacy queue state")
+
             if not jobs_data:
                 log.info("Got none older queue")
                 return
@@ -130,6 +199,16 @@ class QueueManager:
                     await self._queue.put(job)
                     log.info(f"Restored job {job.job_id}")
 
+                    if legacy:
+                        self._dirty.add(job.job_id)
+                else:
+                    # Not restorable, drop its document
+                    self._dirty.add(job.job_id)
+
+            await self.save_queue()
+            if legacy and not self._dirty:
+                await set_variable("queue_state", [])
+
             if self._jobs:
                 await self.start()
 
@@ -148,6 +227,9 @@ class QueueManager:
         task_type: str = "generic",
         input_file: str = "",
         output_file: str = "",
+        priority: int = 0,
+        size_bytes: int = 0,
+        cost: float = 1.0,
         **kwargs,
     ) -> Optional[str]:
         # Check for duplicates
@@ -177,12 +259,15 @@ class QueueManager:
             task_type=task_type,
             input_file=input_file,
             output_file=output_file,
+            priority=priority,
+            size_bytes=size_bytes,
+            cost=cost,
         )
         self._jobs[job_id] = job
         await self._queue.put(job)
         log.info(f"Job {job_id} added to queue for user {user_id}")
 
-        await self.save_queue()
+        self._mark_dirty(job)
 
         # Ensure worker is running
         if self._worker_task is None or self._worker_task.done():
@@ -200,6 +285,7 @@ class QueueManager:
         def clean_files(j: Job):
             import os
 
+            disk_budget.release(j.input_file, j.output_file)
             try:
                 if j.input_file and os.path.exists(j.input_file):
                     os.remove(j.input_file)
@@ -219,14 +305,14 @@ class QueueManager:
             # For now, we just mark it. The encode process checks `is_cancelled` flag.
             # And we clean files.
 
-            await self.save_queue()
+            self._mark_dirty(job)
             return True
 
         elif job.status == "pending":
             job.status = "cancelled"
             log.info(f"Pending job {job_id} cancelled")
             clean_files(job)  # Clean files immediately for pending jobs
-            await self.save_queue()
+            self._mark_dirty(job)
             return True
 
         return False
@@ -249,56 +335,28 @@ class QueueManager:
             except asyncio.QueueEmpty:
                 break
 
-        await self.save_queue()
         log.info("Queue cleared")
 
     async def _worker(self):
         log.info("Queue worker loop started")
         while True:
             try:
-                # Wait for slot
-                await self._semaphore.acquire()
-
                 job = await self._queue.get()
 
                 if job.status == "cancelled":
                     log.info(f"Skipping cancelled job {job.job_id}")
                     self._queue.task_done()
-                    self._semaphore.release()
-                    await self.save_queue()
+                    self._mark_dirty(job)
                     continue
 
+                # Wait until the job's estimated cost fits the current capacity.
+                # This blocks the loop, so the scheduled order is kept; jobs
+                # cancelled meanwhile are skipped in _process_job.
+                await admission.acquire(job.job_id, job.cost)
+
                 # Spawn task
                 asyncio.create_task(self._process_job(job))
 
-                # We don't mark task_done here immediately if we want to throttle?
-                # Actually, we should throttle BEFORE getting next job or inside process_job?
-                # If we throttle here, we block the queue.
-                # If we use semaphore, we can acquire it here.
-
-                # Wait for slot
-                # Note: This blocks the loop from picking up more jobs until a slot is free.
-                # This effectively limits concurrent jobs.
-                # However, we need to release it in _process_job.
-                # But we can't pass the semaphore easily or we can just acquire here and release there?
-                # Better: acquire here.
-
-                # But if we await acquire, we block. That's what we want.
-                # We want to pick up jobs only when we have capacity.
-
-                # WAIT! If we block here, we can't process cancellations effectively for queued items?
-                # No, cancellations update the job status in the dict.
-                # When we finally unblock and pick it up, we check status.
-
-                # BUT, if we have 4 running, and 100 pending.
-                # We are blocked at acquire.
-                # User cancels job #50.
-                # Job #50 is in self._queue.
-                # We won't see it until we process 46 others.
-                # But cancel_job updates the status in self._jobs.
-                # So when we eventually get it, we skip it.
-                # This is fine.
-
             except Exception as e:
                 log.error(f"Error in queue worker: {e}")
                 await asyncio.sleep(1)
@@ -311,8 +369,8 @@ class QueueManager:
                 return
 
             self._active_jobs[job.job_id] = job
+            # Running jobs persist as pending, so nothing to write here
             job.status = "running"
-            await self.save_queue()
             log.info(f"Starting job {job.job_id}")
 
             try:
@@ -328,9 +386,9 @@ class QueueManager:
                 if job.job_id in self._active_jobs:
                     del self._active_jobs[job.job_id]
                 self._queue.task_done()
-                await self.save_queue()
+                self._mark_dirty(job)
         finally:
-            self._semaphore.release()
+            await admission.release(job.job_id)
 
     def get_user_jobs(self, user_id: int) -> list[Job]:
         return [
@@ -340,9 +398,29 @@ class QueueManager:
         ]
 
     def get_all_jobs(self) -> list[Job]:
-        return [
-            job for job in self._jobs.values() if job.status in ["pending", "running"]
-        ]
+        """Running jobs, then pending jobs in scheduled order."""
+        running = [job for job in self._jobs.values() if job.status == "running"]
+        pending = [job for job in self._queue.scheduled() if job.status == "pending"]
+        return running + pending
+
+    def get_position(self, job_id: str) -> int:
+        """1-based position of a pending job in the scheduled order, 0 if not queued."""
+        pending = [job for job in self._queue.scheduled() if job.status == "pending"]
+        for i, job in enumerate(pending, 1):
+            if job.job_id == job_id:
+                return i
+        return 0
+
+    async def set_priority(self, job_id: str, priority: int) -> bool:
+        job = self._jobs.get(job_id)
+        if not job or job.status != "pending":
+            return False
+
+        job.priority = priority
+        self._queue.reprioritize(job)
+        self._mark_dirty(job)
+        log.info(f"Job {job_id} priority set to {priority}")
+        return True
 
     def get_job(self, job_id: str) -> Optional[Job]:
         return self._jobs.get(job_id)
@@ -0,0 +1,151 @@
+# Developed by ARGON telegram: @REACTIVEARGON
+import hashlib
+import json
+import time
+from typing import Dict, List, Optional
+
+from bot.config import RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_TTL_DAYS
+from bot.logger import LOGGER
+from database import (
+    count_cache_entries,
+    evict_cache_entries,
+    get_cache_entry,
+    get_variable,
+    incr_counters,
+    set_cache_result,
+    touch_cache_entry,
+)
+
+log = LOGGER(__name__)
+
+# Settings keys that never change the encoded output
+IGNORED_SETTINGS_KEYS = {"custom_ffmpeg", "user_id"}
+
+
+def _canonical(value):
+    if isinstance(value, bytes):
+        # Binary assets (thumbnail, watermark image, font) by content
+        return {"__sha256__": hashlib.sha256(value).hexdigest()}
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    return value
+
+
+def settings_hash(settings: Dict) -> str:
+    """
+    Canonical SHA-256 of the settings that influence the encoded output.
+    """
+    effective = {k: v for k, v in settings.items() if k not in IGNORED_SETTINGS_KEYS}
+    video = dict(effective.get("video", {}))
+
+    # Resolution order does not change the outputs
+    resolutions = video.get("resolution", ["1080p"])
+    if isinstance(resolutions, str):
+        resolutions = [resolutions]
+    video["resolution"] = sorted(resolutions)
+    effective["video"] = video
+
+    payload = json.dumps(_canonical(effective), sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    Persistent cache of finished encodes.
+    Key: source file_unique_id + settings hash. Value: the Telegram file_id of
+    every uploaded rendition, so a repeated request can be re-sent directly.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ResultCache, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+        self._ttl = RESULT_CACHE_TTL_DAYS * 86400
+        self._max_entries = RESULT_CACHE_MAX_ENTRIES
+        self._initialized = True
+        log.info(
+            f"ResultCache initialized (TTL {RESULT_CACHE_TTL_DAYS}d, max {self._max_entries})"
+        )
+
+    @staticmethod
+    def make_key(file_unique_id: str, digest: str) -> str:
+        return f"{file_unique_id}:{digest}"
+
+    async def lookup(self, file_unique_id: str, settings: Dict) -> Optional[List[Dict]]:
+        """
+        Returns the cached results (one per resolution) or None on a miss.
+        A hit requires every selected resolution to be cached and unexpired.
+        """
+        if not file_unique_id:
+            return None
+
+        key = self.make_key(file_unique_id, settings_hash(settings))
+        entry = await get_cache_entry(key)
+        now = time.time()
+
+        resolutions = settings.get("video", {}).get("resolution", ["1080p"])
+        if isinstance(resolutions, str):
+            resolutions = [resolutions]
+
+        results = (entry or {}).get("results", {})
+        fresh = entry and now - entry.get("last_used", 0) <= self._ttl
+
+        if not fresh or any(res not in results for res in resolutions):
+            await incr_counters("cache_stats", misses=1)
+            return None
+
+        await touch_cache_entry(key, now)
+        await incr_counters("cache_stats", hits=1)
+        log.info(f"Result cache hit for {key}")
+        return [results[res] for res in resolutions]
+
+    async def store(
+        self,
+        file_unique_id: str,
+        digest: str,
+        resolution: str,
+        file_id: str,
+        file_name: str,
+        file_size: int,
+    ):
+        """Records an uploaded rendition and evicts stale entries."""
+        if not file_unique_id or not digest:
+            return
+
+        now = time.time()
+        await set_cache_result(
+            self.make_key(file_unique_id, digest),
+            resolution,
+            {
+                "file_id": file_id,
+                "file_name": file_name,
+                "file_size": file_size,
+                "resolution": resolution,
+            },
+            now,
+        )
+        await evict_cache_entries(now - self._ttl, self._max_entries)
+
+    async def get_stats(self) -> Dict:
+        counters = await get_variable("cache_stats", {})
+        hits = counters.get("hits", 0)
+        misses = counters.get("misses", 0)
+        total = hits + misses
+        return {
+            "entries": await count_cache_entries(),
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": (hits / total * 100) if total else 0.0,
+        }
+
+
+result_cache = ResultCache()
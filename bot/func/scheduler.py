@@ -0,0 +1,161 @@
+# Developed by ARGON telegram: @REACTIVEARGON
+import asyncio
+import copy
+import itertools
+from collections import deque
+from typing import Deque, Dict, List
+
+from bot.config import (
+    OWNER_ID,
+    OWNER_WEIGHT,
+    PREMIUM_USERS,
+    PREMIUM_WEIGHT,
+    SCHEDULER_QUANTUM_MB,
+)
+from bot.logger import LOGGER
+
+log = LOGGER(__name__)
+
+QUANTUM_BYTES = SCHEDULER_QUANTUM_MB * 1024 * 1024
+
+
+def user_weight(user_id: int) -> float:
+    if user_id == OWNER_ID:
+        return OWNER_WEIGHT
+    if user_id in PREMIUM_USERS:
+        return PREMIUM_WEIGHT
+    return 1.0
+
+
+def job_cost(job) -> float:
+    """Scheduling cost of a job, in quanta. Unknown sizes count as one quantum."""
+    size = getattr(job, "size_bytes", 0) or QUANTUM_BYTES
+    return size / QUANTUM_BYTES
+
+
+class _State:
+    """Deficit round-robin state, kept separate so it can be simulated."""
+
+    def __init__(self):
+        self.queues: Dict[int, List] = {}  # user_id -> [(sort_key, job)]
+        self.ring: Deque[int] = deque()  # users with queued jobs, in visit order
+        self.deficit: Dict[int, float] = {}
+        self.visiting = False  # head of ring already got its quantum
+
+    def push(self, sort_key: tuple, job):
+        queue = self.queues.setdefault(job.user_id, [])
+        queue.append((sort_key, job))
+        queue.sort(key=lambda item: item[0])
+        if job.user_id not in self.ring:
+            self.ring.append(job.user_id)
+            self.deficit.setdefault(job.user_id, 0.0)
+
+    def pop(self):
+        """Next job in deficit round-robin order."""
+        while self.ring:
+            user_id = self.ring[0]
+            queue = self.queues[user_id]
+
+            if not self.visiting:
+                self.deficit[user_id] += user_weight(user_id)
+                self.visiting = True
+
+            cost = job_cost(queue[0][1])
+            if self.deficit[user_id] >= cost:
+                self.deficit[user_id] -= cost
+                _, job = queue.pop(0)
+                if not queue:
+                    # Idle users do not bank credit
+                    del self.queues[user_id]
+                    self.deficit.pop(user_id, None)
+                    self.ring.popleft()
+                    self.visiting = False
+                return job
+
+            # Not enough credit left this round, move on
+            self.ring.rotate(-1)
+            self.visiting = False
+        raise asyncio.QueueEmpty
+
+    def __len__(self):
+        return sum(len(q) for q in self.queues.values())
+
+
+class FairQueue:
+    """
+    Drop-in replacement for asyncio.Queue that hands out jobs fairly.
+
+    Every user has a sub-queue ordered by job priority (higher first), then
+    submission order. Users are served by deficit round-robin: each round a
+    user earns credit equal to its weight (owner/premium earn more) and spends
+    it on jobs costing their size in quanta, so one user's batch of large
+    files cannot starve everyone else while small jobs get through quickly.
+    """
+
+    def __init__(self):
+        self._state = _State()
+        self._seq = itertools.count()
+        self._not_empty = asyncio.Event()
+        self._unfinished = 0
+        self._finished = asyncio.Event()
+        self._finished.set()
+
+    def qsize(self) -> int:
+        return len(self._state)
+
+    def empty(self) -> bool:
+        return not self._state.ring
+
+    def put_nowait(self, job):
+        self._state.push((-getattr(job, "priority", 0), next(self._seq)), job)
+        self._unfinished += 1
+        self._finished.clear()
+        self._not_empty.set()
+
+    async def put(self, job):
+        self.put_nowait(job)
+
+    def get_nowait(self):
+        job = self._state.pop()
+        if self.empty():
+            self._not_empty.clear()
+        return job
+
+    async def get(self):
+        while self.empty():
+            await self._not_empty.wait()
+        return self.get_nowait()
+
+    def task_done(self):
+        if self._unfinished <= 0:
+            raise ValueError("task_done() called too many times")
+        self._unfinished -= 1
+        if self._unfinished == 0:
+            self._finished.set()
+
+    async def join(self):
+        await self._finished.wait()
+
+    def reprioritize(self, job) -> bool:
+        """Re-sorts a queued job after its priority changed."""
+        queue = self._state.queues.get(job.user_id, [])
+        for i, (key, queued) in enumerate(queue):
+            if queued is job:
+                queue[i] = ((-job.priority, key[1]), job)
+                queue.sort(key=lambda item: item[0])
+                return True
+        return False
+
+    def scheduled(self) -> List:
+        """Queued jobs in the order they will be dequeued."""
+        state = copy.copy(self._state)
+        state.queues = {uid: list(q) for uid, q in self._state.queues.items()}
+        state.ring = deque(self._state.ring)
+        state.deficit = dict(self._state.deficit)
+
+        order = []
+        while True:
+            try:
+                order.append(state.pop())
+            except asyncio.QueueEmpty:
+                return order
@@ -0,0 +1,150 @@
+# Developed by ARGON telegram: @REACTIVEARGON
+import asyncio
+import math
+import os
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence
+
+from bot.config import SS_DEFAULT_COUNT, SS_MAX_COUNT, SS_SHEET_WIDTH, SS_WORKERS
+from bot.logger import LOGGER
+
+log = LOGGER(__name__)
+
+_TIMESTAMP_RE = re.compile(r"^(?:(\d+):)?(?:(\d+):)?(\d+(?:\.\d+)?)s?$")
+
+# Shared by every /ss request, bounds the FFmpeg processes running at once
+_pool = asyncio.Semaphore(max(1, SS_WORKERS))
+
+
+@dataclass
+class ScreenshotRequest:
+    """What /ss was asked for: a frame count or explicit timestamps, optionally tiled."""
+
+    count: int = SS_DEFAULT_COUNT
+    timestamps: List[float] = field(default_factory=list)
+    sheet: bool = False
+
+    def resolve(self, duration: float) -> List[float]:
+        """The seek positions in seconds, kept inside the video."""
+        last = max(0.0, duration - 0.5) if duration else None
+        if self.timestamps:
+            points = self.timestamps
+        else:
+            # Evenly spaced, skipping the very start and end
+            points = [duration * (i + 1) / (self.count + 1) for i in range(self.count)]
+        if last is not None:
+            points = [min(max(0.0, ts), last) for ts in points]
+        return points[:SS_MAX_COUNT]
+
+
+def parse_timestamp(text: str) -> Optional[float]:
+    """Parses '90', '90s', '1:30' or '1:02:30' into seconds."""
+    match = _TIMESTAMP_RE.match(text.strip())
+    if not match:
+        return None
+    parts = [p for p in match.groups() if p is not None]
+    seconds = 0.0
+    for part in parts:
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+def parse_request(args: Sequence[str]) -> ScreenshotRequest:
+    """
+    Parses the /ss arguments: a plain number is the frame count, 'sheet' tiles
+    the frames into one image, and anything with ':' or a trailing 's' is a
+    timestamp. Raises ValueError on anything else.
+    """
+    request = ScreenshotRequest()
+    for arg in args:
+        lowered = arg.lower()
+        if lowered in ("sheet", "grid", "tile"):
+            request.sheet = True
+        elif arg.isdigit():
+            request.count = min(max(1, int(arg)), SS_MAX_COUNT)
+        else:
+            ts = parse_timestamp(arg) if (":" in arg or lowered.endswith("s")) else None
+            if ts is None:
+                raise ValueError(f"Unknown argument: {arg}")
+            request.timestamps.append(ts)
+    return request
+
+
+def format_timestamp(seconds: float) -> str:
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{secs:02d}"
+    return f"{minutes}:{secs:02d}"
+
+
+async def _run(args: List[str]) -> bool:
+    async with _pool:
+        proc = await asyncio.create_subprocess_exec(
+            "ffmpeg",
+            "-v",
+            "error",
+            "-y",
+            *args,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        _, err = await proc.communicate()
+    if proc.returncode != 0:
+        log.error(f"Screenshot FFmpeg failed: {err.decode(errors='ignore')[-500:]}")
+        return False
+    return True
+
+
+async def _grab(input_file: str, ts: float, output: str, strict: bool) -> Optional[str]:
+    # Input seeking jumps to the keyframe before ts and decodes a few frames,
+    # far cheaper than a select filter decoding everything up to the last one
+    args = ["-xerror", "-err_detect", "explode"] if strict else []
+    args.extend(["-ss", f"{ts:.3f}", "-i", input_file, "-frames:v", "1", "-q:v", "2", output])
+    ok = await _run(args)
+    return output if ok and os.path.exists(output) else None
+
+
+async def extract_frames(
+    input_file: str, timestamps: Sequence[float], output_prefix: str, strict: bool = False
+) -> List[Optional[str]]:
+    """
+    Grabs one JPEG per timestamp, all seeks running concurrently in the shared
+    pool. Returns the paths in timestamp order, None where a grab failed.
+    With strict, any corrupt data fails the grab instead of being concealed
+    (used on partial copies, where missing ranges read as zeros).
+    """
+    return list(
+        await asyncio.gather(
+            *(
+                _grab(input_file, ts, f"{output_prefix}_{i:03d}.jpg", strict)
+                for i, ts in enumerate(timestamps)
+            )
+        )
+    )
+
+
+async def contact_sheet(frames: Sequence[str], output: str) -> Optional[str]:
+    """Tiles the frames into one image, about square, SS_SHEET_WIDTH pixels wide."""
+    if not frames:
+        return None
+    columns = math.ceil(math.sqrt(len(frames)))
+    rows = math.ceil(len(frames) / columns)
+    tile_width = max(2, SS_SHEET_WIDTH // columns // 2 * 2)
+
+    args = []
+    for frame in frames:
+        args.extend(["-i", frame])
+    scaled = "".join(
+        f"[{i}:v]scale={tile_width}:-2,setsar=1[s{i}];" for i in range(len(frames))
+    )
+    pads = "".join(f"[s{i}]" for i in range(len(frames)))
+    graph = (
+        f"{scaled}{pads}concat=n={len(frames)}:v=1:a=0,"
+        f"tile={columns}x{rows}:padding=4:margin=4"
+    )
+    args.extend(["-filter_complex", graph, "-frames:v", "1", "-q:v", "3", output])
+
+    ok = await _run(args)
+    return output if ok and os.path.exists(output) else None
@@ -0,0 +1,95 @@
+# Developed by ARGON telegram: @REACTIVEARGON
+import asyncio
+import glob
+import math
+import os
+from typing import List
+
+from bot.config import UPLOAD_PART_SIZE_MB
+from bot.func.probe import probe_service
+from bot.logger import LOGGER
+
+log = LOGGER(__name__)
+
+# Segments only end on keyframes, so aim below the limit
+SPLIT_HEADROOM = 0.9
+MAX_SPLIT_ATTEMPTS = 4
+
+
+def part_files(file_path: str) -> List[str]:
+    base, ext = os.path.splitext(file_path)
+    return sorted(glob.glob(f"{glob.escape(base)}.part*{ext}"))
+
+
+def remove_parts(file_path: str):
+    for part in part_files(file_path):
+        try:
+            os.remove(part)
+        except OSError as e:
+            log.error(f"Failed to remove part {part}: {e}")
+
+
+async def _segment(file_path: str, segment_time: float):
+    base, ext = os.path.splitext(file_path)
+    proc = await asyncio.create_subprocess_exec(
+        "ffmpeg",
+        "-v",
+        "error",
+        "-y",
+        "-i",
+        file_path,
+        # Attached pictures (thumbnails) can't be segmented, the upload sets the thumb
+        "-map",
+        "0:V",
+        "-map",
+        "0:a?",
+        "-map",
+        "0:s?",
+        "-c",
+        "copy",
+        "-f",
+        "segment",
+        "-segment_time",
+        f"{segment_time:.3f}",
+        "-segment_start_number",
+        "1",
+        "-reset_timestamps",
+        "1",
+        f"{base}.part%03d{ext}",
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    _, stderr = await proc.communicate()
+    if proc.returncode != 0:
+        raise RuntimeError(f"Splitting failed: {stderr.decode(errors='ignore')[-500:]}")
+
+
+async def split_for_upload(file_path: str, max_size: int = UPLOAD_PART_SIZE_MB * 1024 * 1024) -> List[str]:
+    """
+    Returns the files to upload for file_path: the file itself when it fits,
+    otherwise parts cut at keyframes with stream copy, each under max_size.
+    """
+    size = os.path.getsize(file_path)
+    if size <= max_size:
+        return [file_path]
+
+    info = await probe_service.probe(file_path)
+    if not info.duration:
+        raise RuntimeError(f"Cannot split {os.path.basename(file_path)}: unknown duration")
+
+    count = math.ceil(size / (max_size * SPLIT_HEADROOM))
+    for attempt in range(MAX_SPLIT_ATTEMPTS):
+        remove_parts(file_path)
+        await _segment(file_path, info.duration / count)
+
+        parts = part_files(file_path)
+        biggest = max((os.path.getsize(p) for p in parts), default=0)
+        if parts and biggest <= max_size:
+            log.info(f"Split {file_path} into {len(parts)} parts")
+            return parts
+
+        # Sparse keyframes made a part too big, cut finer
+        count = max(count + 1, math.ceil(count * biggest / (max_size * SPLIT_HEADROOM)))
+
+    remove_parts(file_path)
+    raise RuntimeError(f"Could not split {os.path.basename(file_path)} under {max_size} bytes")
@@ -0,0 +1,143 @@
+# Developed by ARGON telegram: @REACTIVEARGON
+import asyncio
+import os
+from dataclasses import replace
+from typing import Optional
+
+from pyrogram import Client
+from pyrogram.types import Message
+
+from bot.config import STREAM_PROBE_BYTES
+from bot.func.download_manager import download_manager
+from bot.func.probe import MediaInfo, probe_service
+from bot.logger import LOGGER
+
+log = LOGGER(__name__)
+
+# Containers FFmpeg can demux from a non-seekable pipe.
+# MP4/MOV are excluded: their index (moov) is often at the end of the file.
+STREAMABLE_EXTENSIONS = {
+    ".mkv",
+    ".webm",
+    ".ts",
+    ".mts",
+    ".m2ts",
+    ".flv",
+    ".vob",
+}
+
+
+def is_streamable(file_name: str) -> bool:
+    return os.path.splitext(file_name or "")[1].lower() in STREAMABLE_EXTENSIONS
+
+
+class StreamingInput:
+    """
+    Downloads a Telegram document to disk chunk by chunk while feeding the
+    bytes already on disk into an FFmpeg stdin pipe.
+
+    The file keeps growing on disk (so it can still be cleaned up, probed or
+    reused), and encoding starts after the first megabytes instead of after
+    the whole download.
+    """
+
+    def __init__(self, client: Client, message: Message, file_path: str, total_size: int):
+        self.client = client
+        self.message = message
+        self.file_path = file_path
+        self.total_size = total_size
+        self.downloaded = 0
+        self.done = False
+        self.error = ""
+        self._task: Optional[asyncio.Task] = None
+        self._progress = asyncio.Event()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._download())
+
+    async def _download(self):
+        await download_manager.acquire()
+        try:
+            with open(self.file_path, "wb") as f:
+                async for chunk in self.client.stream_media(self.message):
+                    f.write(chunk)
+                    f.flush()
+                    self.downloaded += len(chunk)
+                    self._progress.set()
+
+            if self.total_size and self.downloaded < self.total_size:
+                self.error = (
+                    f"Download ended early ({self.downloaded}/{self.total_size} bytes)"
+                )
+        except asyncio.CancelledError:
+            self.error = self.error or "Download cancelled"
+            raise
+        except Exception as e:
+            self.error = f"Download failed: {e}"
+            log.error(f"Streaming download of {self.file_path} failed: {e}")
+        finally:
+            self.done = True
+            self._progress.set()
+            download_manager.release()
+
+    async def _wait_progress(self):
+        await self._progress.wait()
+        self._progress.clear()
+
+    async def wait_for(self, size: int):
+        """Waits until `size` bytes are on disk or the download ended."""
+        while self.downloaded < size and not self.done:
+            await self._wait_progress()
+
+    async def probe(self) -> Optional[MediaInfo]:
+        """
+        Probes the partially downloaded file (the container header is enough).
+        TS/FLV headers carry no duration, so the probe only sees the bytes on
+        disk; Telegram's duration of the video is preferred when it has one.
+        """
+        await self.wait_for(STREAM_PROBE_BYTES)
+        # Not cached: the file is still growing
+        info = await probe_service.probe(self.file_path, cache=False)
+        video = getattr(self.message, "video", None)
+        if info and video and video.duration:
+            # Frame counts of a partial file are partial too
+            info = replace(
+                info,
+                duration=float(video.duration),
+                frame_count=int(video.duration * info.fps) or info.frame_count,
+            )
+        return info
+
+    async def pump(self, stdin: asyncio.StreamWriter):
+        """Copies the growing file into FFmpeg's stdin until the download ends."""
+        try:
+            with open(self.file_path, "rb") as f:
+                position = 0
+                while True:
+                    if position < self.downloaded:
+                        data = f.read(min(1024 * 1024, self.downloaded - position))
+                        if not data:
+                            await asyncio.sleep(0.1)
+                            continue
+                        stdin.write(data)
+                        await stdin.drain()
+                        position += len(data)
+                    elif self.done:
+                        break
+                    else:
+                        await self._wait_progress()
+        except (BrokenPipeError, ConnectionResetError):
+            # FFmpeg exited early, its own return code tells what happened
+            pass
+        except Exception as e:
+            log.error(f"Streaming pump for {self.file_path} failed: {e}")
+        finally:
+            try:
+                stdin.close()
+            except Exception:
+                pass
+
+    def cancel(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
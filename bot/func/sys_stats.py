@@ -0,0 +1,153 @@
+# Developed by ARGON telegram: @REACTIVEARGON
+import asyncio
+import os
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+import psutil
+
+from bot.config import SYSTEM_SAMPLE_INTERVAL
+from bot.logger import LOGGER
+
+log = LOGGER(__name__)
+
+
+@dataclass(frozen=True)
+class SystemSnapshot:
+    cpu: float = 0.0
+    ram: float = 0.0
+    disk_percent: float = 0.0
+    disk_used: int = 0
+    disk_free: int = 0
+    disk_total: int = 0
+    taken: float = 0.0
+
+
+@dataclass(frozen=True)
+class JobUsage:
+    # Sum over the job's processes, 100 = one full core
+    cpu: float = 0.0
+    rss: int = 0
+    output_sizes: Tuple[int, ...] = ()
+
+
+class StatsSampler:
+    """
+    Samples system CPU/RAM/disk and the usage of every watched job in one
+    background task, so progress renderers read a shared snapshot instead
+    of calling psutil and stat() on every render.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(StatsSampler, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+        self.snapshot = SystemSnapshot()
+        # key -> (pids provider, output files provider)
+        self._jobs: Dict[str, Tuple[Callable[[], List[int]], Callable[[], List[str]]]] = {}
+        self._usage: Dict[str, JobUsage] = {}
+        # psutil.Process objects must persist between samples for cpu_percent
+        self._procs: Dict[int, psutil.Process] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._initialized = True
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def get_snapshot(self) -> SystemSnapshot:
+        """Latest system snapshot (sampled right away on first use)."""
+        if not self.snapshot.taken:
+            self._sample_system()
+        self._ensure_started()
+        return self.snapshot
+
+    def watch(
+        self,
+        key: str,
+        pids: Callable[[], List[int]],
+        files: Callable[[], List[str]],
+    ):
+        self._jobs[key] = (pids, files)
+        self._sample_job(key)
+        self._ensure_started()
+
+    def unwatch(self, key: str):
+        self._jobs.pop(key, None)
+        self._usage.pop(key, None)
+
+    def usage(self, key: str) -> JobUsage:
+        return self._usage.get(key, JobUsage())
+
+    async def _run(self):
+        psutil.cpu_percent(interval=None)  # Prime the counter
+        while True:
+            await asyncio.sleep(SYSTEM_SAMPLE_INTERVAL)
+            try:
+                self._sample_system()
+                seen = set()
+                for key in list(self._jobs):
+                    seen.update(self._sample_job(key))
+                for pid in set(self._procs) - seen:
+                    del self._procs[pid]
+            except Exception as e:
+                log.error(f"Stats sampling failed: {e}")
+
+    def _sample_system(self):
+        disk = psutil.disk_usage(".")
+        self.snapshot = SystemSnapshot(
+            cpu=psutil.cpu_percent(interval=None),
+            ram=psutil.virtual_memory().percent,
+            disk_percent=disk.percent,
+            disk_used=disk.used,
+            disk_free=disk.free,
+            disk_total=disk.total,
+            taken=time.time(),
+        )
+
+    def _process(self, pid: int) -> psutil.Process:
+        proc = self._procs.get(pid)
+        if proc is None:
+            proc = self._procs[pid] = psutil.Process(pid)
+            proc.cpu_percent(interval=None)  # Prime, first reading is 0.0
+        return proc
+
+    def _sample_job(self, key: str) -> List[int]:
+        """Samples one job and returns the pids it covered."""
+        entry = self._jobs.get(key)
+        if entry is None:
+            return []
+        pids_fn, files_fn = entry
+
+        cpu, rss, covered = 0.0, 0, []
+        for pid in pids_fn():
+            try:
+                parent = self._process(pid)
+                for proc in [parent] + parent.children(recursive=True):
+                    proc = self._process(proc.pid)
+                    cpu += proc.cpu_percent(interval=None)
+                    rss += proc.memory_info().rss
+                    covered.append(proc.pid)
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                self._procs.pop(pid, None)
+
+        sizes = []
+        for path in files_fn():
+            try:
+                sizes.append(os.path.getsize(path))
+            except OSError:
+                sizes.append(0)
+
+        self._usage[key] = JobUsage(cpu=cpu, rss=rss, output_sizes=tuple(sizes))
+        return covered
+
+
+stats_sampler = StatsSampler()
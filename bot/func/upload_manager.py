@@ -1,10 +1,21 @@
 # Developed by ARGON telegram: @REACTIVEARGON
 import asyncio
+import os
+import time
 import uuid
 from dataclasses import dataclass, field
-from typing import Any, Awaitable, Callable, Dict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
 
+from pyrogram.errors import FloodWait
+
+from bot.config import (
+    UPLOAD_AGING_SECONDS,
+    UPLOAD_WORKERS,
+    UPLOAD_WORKERS_MAX,
+    UPLOAD_WORKERS_MIN,
+)
 from bot.logger import LOGGER
+from database import delete_upload_job, get_upload_jobs, save_upload_job
 
 log = LOGGER(__name__)
 
@@ -17,9 +28,32 @@ class UploadJob:
     args: tuple = field(default_factory=tuple)
     kwargs: Dict[str, Any] = field(default_factory=dict)
     status: str = "pending"
+    # Serializable description of the upload (file_path, caption fields,
+    # targets). Jobs with params are persisted and resumed after a restart.
+    params: Optional[Dict[str, Any]] = None
+    created: float = field(default_factory=time.time)
+    size_bytes: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "user_id": self.user_id,
+            "params": self.params,
+            "created": self.created,
+        }
 
 
 class UploadManager:
+    """
+    Runs upload jobs with an adaptive number of concurrent uploads.
+
+    The limit starts at UPLOAD_WORKERS and hill-climbs on the aggregate
+    throughput measured when uploads finish while every slot is busy. A
+    FloodWait halves it and pauses new uploads. Waiting jobs are started
+    smallest first, with waiting time counting against the size so large
+    files still get their turn.
+    """
+
     _instance = None
 
     def __new__(cls):
@@ -31,59 +65,217 @@ class UploadManager:
     def __init__(self):
         if self._initialized:
             return
-        self._queue = asyncio.Queue()
+        self._pending: List[UploadJob] = []
         self._active_jobs: Dict[str, UploadJob] = {}
-        self._worker_tasks: list[asyncio.Task] = []
-        self._max_concurrent = 2
+        self._running: Dict[str, asyncio.Task] = {}
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self.limit = max(UPLOAD_WORKERS_MIN, min(UPLOAD_WORKERS, UPLOAD_WORKERS_MAX))
+        self._paused_until = 0.0
+        self._last_aggregate = 0.0
+        self.throughput = 0.0  # Smoothed aggregate bytes/s
+        self.uploaded_bytes = 0
+        self.flood_waits = 0
         self._initialized = True
         log.info("UploadManager initialized")
 
     async def start(self):
-        if not self._worker_tasks:
-            for i in range(self._max_concurrent):
-                task = asyncio.create_task(self._worker(i))
-                self._worker_tasks.append(task)
-            log.info(f"UploadManager started with {self._max_concurrent} workers")
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+            log.info(f"UploadManager started with {self.limit} upload slots")
+
+    def _wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
 
     async def add_upload_job(
-        self, user_id: int, func: Callable[..., Awaitable[Any]], *args, **kwargs
+        self,
+        user_id: int,
+        func: Callable[..., Awaitable[Any]],
+        *args,
+        params: Optional[Dict[str, Any]] = None,
+        **kwargs,
     ) -> str:
         job_id = str(uuid.uuid4())[:8]
         job = UploadJob(
-            job_id=job_id, user_id=user_id, func=func, args=args, kwargs=kwargs
+            job_id=job_id,
+            user_id=user_id,
+            func=func,
+            args=args,
+            kwargs=kwargs,
+            params=params,
         )
-        self._active_jobs[job_id] = job
-        await self._queue.put(job)
+        file_path = (params or {}).get("file_path")
+        if file_path and os.path.exists(file_path):
+            job.size_bytes = os.path.getsize(file_path)
+        await self._enqueue(job)
         log.info(f"Upload job {job_id} added to queue for user {user_id}")
-
-        if not self._worker_tasks:
-            await self.start()
-
         return job_id
 
-    async def _worker(self, worker_id: int):
-        log.info(f"Upload worker {worker_id} started")
-        while True:
+    async def _enqueue(self, job: UploadJob):
+        if job.params is not None:
             try:
-                job = await self._queue.get()
+                await save_upload_job(job.to_dict())
+            except Exception as e:
+                log.error(f"Failed to persist upload job {job.job_id}: {e}")
 
-                job.status = "uploading"
-                log.info(f"Worker {worker_id} starting upload job {job.job_id}")
+        self._active_jobs[job.job_id] = job
+        self._pending.append(job)
+        await self.start()
+        self._wake()
 
+    async def checkpoint(self, params: Dict[str, Any]):
+        """Persists the updated params of the job owning them (e.g. parts already sent)."""
+        for job in self._active_jobs.values():
+            if job.params is params:
                 try:
-                    await job.func(*job.args, **job.kwargs)
-                    job.status = "completed"
+                    await save_upload_job(job.to_dict())
                 except Exception as e:
-                    job.status = "failed"
-                    log.error(f"Upload job {job.job_id} failed: {e}")
-                finally:
-                    if job.job_id in self._active_jobs:
-                        del self._active_jobs[job.job_id]
-                    self._queue.task_done()
+                    log.error(f"Failed to checkpoint upload job {job.job_id}: {e}")
+                return
+
+    async def restore_uploads(self, client):
+        """Re-queues the uploads that were pending when the bot stopped."""
+        jobs_data = await get_upload_jobs()
+        if not jobs_data:
+            return
+
+        # Import here to avoid circular dependency
+        from bot.func.encode import reconstruct_upload
+
+        restored = 0
+        for data in jobs_data:
+            params = data.get("params") or {}
+            file_path = params.get("file_path", "")
+            if not file_path or not os.path.exists(file_path):
+                log.warning(f"Dropping upload job {data['job_id']}: {file_path} is gone")
+                await delete_upload_job(data["job_id"])
+                continue
+
+            job = UploadJob(
+                job_id=data["job_id"],
+                user_id=data["user_id"],
+                func=reconstruct_upload(client, params),
+                params=params,
+                created=data.get("created", time.time()),
+                size_bytes=os.path.getsize(file_path),
+            )
+            self._active_jobs[job.job_id] = job
+            self._pending.append(job)
+            restored += 1
+
+        if restored:
+            log.info(f"Restored {restored} upload jobs")
+            await self.start()
+
+    @staticmethod
+    async def referenced_files() -> Set[str]:
+        """Absolute paths of the files persisted uploads still need."""
+        files = set()
+        for data in await get_upload_jobs():
+            file_path = (data.get("params") or {}).get("file_path")
+            if file_path:
+                files.add(os.path.abspath(file_path))
+        return files
 
+    def _pick(self) -> UploadJob:
+        """Smallest waiting job first, aged by how long it has waited."""
+        now = time.time()
+        job = min(
+            self._pending,
+            key=lambda j: j.size_bytes / (1 + (now - j.created) / UPLOAD_AGING_SECONDS),
+        )
+        self._pending.remove(job)
+        return job
+
+    async def _dispatch(self):
+        while True:
+            try:
+                now = time.time()
+                if self._paused_until > now:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+
+                if not self._pending or len(self._running) >= self.limit:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+
+                job = self._pick()
+                self._running[job.job_id] = asyncio.create_task(self._run_job(job))
             except Exception as e:
-                log.error(f"Error in upload worker {worker_id}: {e}")
+                log.error(f"Error in upload dispatcher: {e}")
                 await asyncio.sleep(1)
 
+    async def _run_job(self, job: UploadJob):
+        job.status = "uploading"
+        concurrency = len(self._running)
+        started = time.time()
+        log.info(f"Starting upload job {job.job_id} ({concurrency}/{self.limit} slots)")
+
+        try:
+            await job.func(*job.args, **job.kwargs)
+            job.status = "completed"
+            self._record(job, time.time() - started, (concurrency + len(self._running)) / 2)
+        except FloodWait as e:
+            job.status = "pending"
+            self._on_flood_wait(float(e.value or 1))
+            # Retry after the wait, the file and the persisted job are kept
+            self._pending.append(job)
+            return
+        except Exception as e:
+            job.status = "failed"
+            log.error(f"Upload job {job.job_id} failed: {e}")
+        finally:
+            self._running.pop(job.job_id, None)
+            self._wake()
+
+        if job.job_id in self._active_jobs:
+            del self._active_jobs[job.job_id]
+        if job.params is not None:
+            await delete_upload_job(job.job_id)
+
+    def _record(self, job: UploadJob, duration: float, concurrency: float):
+        """Feeds a finished upload into the throughput estimate and the limit."""
+        self.uploaded_bytes += job.size_bytes
+        # Tiny files say more about latency than bandwidth
+        if job.size_bytes < 1024 * 1024 or duration <= 0:
+            return
+
+        aggregate = job.size_bytes / duration * max(1.0, concurrency)
+        self.throughput = (
+            aggregate if not self.throughput else 0.7 * self.throughput + 0.3 * aggregate
+        )
+
+        # Only a saturated pool tells whether more slots would help
+        if self._pending and concurrency >= self.limit - 0.5:
+            if aggregate > self._last_aggregate * 1.1 and self.limit < UPLOAD_WORKERS_MAX:
+                self.limit += 1
+                log.info(f"Upload throughput rising, {self.limit} slots")
+            elif aggregate < self._last_aggregate * 0.9 and self.limit > UPLOAD_WORKERS_MIN:
+                self.limit -= 1
+                log.info(f"Upload throughput falling, {self.limit} slots")
+            self._last_aggregate = aggregate
+
+    def _on_flood_wait(self, wait: float):
+        self.flood_waits += 1
+        self._paused_until = max(self._paused_until, time.time() + wait)
+        self.limit = max(UPLOAD_WORKERS_MIN, self.limit // 2)
+        self._last_aggregate = 0.0
+        log.warning(f"FloodWait {wait}s on upload, pausing and using {self.limit} slots")
+
+    def get_stats(self) -> Dict:
+        return {
+            "limit": self.limit,
+            "active": len(self._running),
+            "queued": len(self._pending),
+            "queued_bytes": sum(j.size_bytes for j in self._pending),
+            "throughput": self.throughput,
+            "uploaded": self.uploaded_bytes,
+            "flood_waits": self.flood_waits,
+        }
+
 
 upload_manager = UploadManager()
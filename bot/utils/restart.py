@@ -2,6 +2,8 @@
 import os
 import sys
 
+import psutil
+
 from bot.decorator import task
 from bot.logger import LOGGER
 
@@ -20,6 +22,19 @@ async def restart_bot(client, message):
         else:
             await message.reply_text("⚠️ Update failed! Restarting bot anyway...")
 
+        # Persist queue changes still waiting on the debounce timer
+        from bot.func.queue_manager import queue_manager
+
+        await queue_manager.flush()
+
+        # Stop running FFmpeg processes so no half written chunk outlives us,
+        # the restored jobs continue from their last finished chunk
+        for child in psutil.Process().children(recursive=True):
+            try:
+                child.kill()
+            except psutil.Error:
+                pass
+
         # Restart the bot process
         os.execv(sys.executable, ["python3", "-m", "bot"])
     except Exception as e:
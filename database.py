@@ -1,9 +1,14 @@
 # Developed by ARGON telegram: @REACTIVEARGON
+import copy
+import hashlib
+import time as _time
+from collections import OrderedDict
 from datetime import datetime, time
 
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import DeleteOne, ReplaceOne
 
-from bot.config import DB_NAME, DB_URI
+from bot.config import DB_NAME, DB_URI, SETTINGS_CACHE_SIZE, SETTINGS_CACHE_TTL
 from bot.logger import LOGGER
 
 log = LOGGER(__name__)
@@ -39,6 +44,10 @@ dbclient = AsyncIOMotorClient(DB_URI)
 database = dbclient[DB_NAME]
 user_data = database["users"]
 config_data = database["config"]
+cache_data = database["encode_cache"]
+queue_data = database["queue_jobs"]
+upload_data = database["upload_jobs"]
+asset_data = database["assets"]
 
 
 async def add_user(user_id: int):
@@ -75,25 +84,70 @@ async def full_userbase():
         return []
 
 
+# --- User Settings (cached) ---
+
+# Binary assets that older settings documents embed (moved to the asset store on startup)
+BLOB_FIELDS = (("thumbnail",), ("watermark", "image_data"), ("watermark", "font_data"))
+
+# user_id -> {"settings": dict, "expires": float}, least recently used first
+_settings_cache: "OrderedDict[int, dict]" = OrderedDict()
+
+
+def _iter_blobs(settings: dict):
+    """Yields (parent dict, key) for every blob field present in settings."""
+    for path in BLOB_FIELDS:
+        parent = settings
+        for key in path[:-1]:
+            parent = parent.get(key)
+            if not isinstance(parent, dict):
+                break
+        else:
+            if path[-1] in parent:
+                yield parent, path[-1]
+
+
+def _cache_settings(user_id: int, settings: dict):
+    _settings_cache[user_id] = {
+        "settings": copy.deepcopy(settings),
+        "expires": _time.monotonic() + SETTINGS_CACHE_TTL,
+    }
+    _settings_cache.move_to_end(user_id)
+    while len(_settings_cache) > SETTINGS_CACHE_SIZE:
+        _settings_cache.popitem(last=False)
+
+
 async def get_user_settings(user_id: int):
-    """Retrieve user settings from the database."""
+    """
+    Retrieve user settings, served from an LRU/TTL cache.
+
+    Returns a private copy the caller may modify. A failed load raises
+    instead of returning defaults that a later update would save.
+    """
+    entry = _settings_cache.get(user_id)
+    if entry and entry["expires"] >= _time.monotonic():
+        _settings_cache.move_to_end(user_id)
+        return copy.deepcopy(entry["settings"])
+    _settings_cache.pop(user_id, None)
+
     try:
-        user = await user_data.find_one({"_id": user_id})
-        if user and "settings" in user:
-            return user["settings"]
-        return {}
+        user = await user_data.find_one({"_id": user_id}, {"settings": 1})
     except Exception as e:
         log.error(f"Error getting settings for {user_id}: {e}")
-        return {}
+        raise
+    settings = (user or {}).get("settings") or {}
+    _cache_settings(user_id, settings)
+    return copy.deepcopy(settings)
 
 
 async def update_user_settings(user_id: int, settings: dict):
-    """Update user settings in the database."""
+    """Update user settings in the database (write-through to the cache)."""
     try:
         await user_data.update_one(
             {"_id": user_id}, {"$set": {"settings": settings}}, upsert=True
         )
+        _cache_settings(user_id, settings)
     except Exception as e:
+        _settings_cache.pop(user_id, None)
         log.error(f"Error updating settings for {user_id}: {e}")
 
 
@@ -131,3 +185,171 @@ async def get_all_variables():
     async for entry in cursor:
         variables.append((entry["_id"], entry["value"]))
     return variables
+
+
+# --- Encoded Result Cache ---
+
+
+async def get_cache_entry(key: str):
+    """Retrieve an encoded-result cache entry."""
+    try:
+        return await cache_data.find_one({"_id": key})
+    except Exception as e:
+        log.error(f"Error getting cache entry {key}: {e}")
+        return None
+
+
+async def set_cache_result(key: str, resolution: str, result: dict, now: float):
+    """Store the cached upload of one rendition under a cache entry."""
+    try:
+        await cache_data.update_one(
+            {"_id": key},
+            {
+                "$set": {f"results.{resolution}": result, "last_used": now},
+                "$setOnInsert": {"created": now},
+            },
+            upsert=True,
+        )
+    except Exception as e:
+        log.error(f"Error saving cache entry {key}: {e}")
+
+
+async def touch_cache_entry(key: str, now: float):
+    """Mark a cache entry as recently used."""
+    try:
+        await cache_data.update_one(
+            {"_id": key}, {"$set": {"last_used": now}, "$inc": {"hits": 1}}
+        )
+    except Exception as e:
+        log.error(f"Error touching cache entry {key}: {e}")
+
+
+async def evict_cache_entries(expire_before: float, max_entries: int) -> int:
+    """Drop expired entries, then the least recently used beyond max_entries."""
+    try:
+        result = await cache_data.delete_many({"last_used": {"$lt": expire_before}})
+        removed = result.deleted_count
+
+        overflow = await cache_data.count_documents({}) - max_entries
+        if overflow > 0:
+            cursor = cache_data.find({}, {"_id": 1}).sort("last_used", 1).limit(overflow)
+            stale = [doc["_id"] async for doc in cursor]
+            result = await cache_data.delete_many({"_id": {"$in": stale}})
+            removed += result.deleted_count
+
+        return removed
+    except Exception as e:
+        log.error(f"Error evicting cache entries: {e}")
+        return 0
+
+
+async def count_cache_entries() -> int:
+    try:
+        return await cache_data.count_documents({})
+    except Exception as e:
+        log.error(f"Error counting cache entries: {e}")
+        return 0
+
+
+async def incr_counters(key: str, **counters):
+    """Atomically increment numeric counters stored in a config document."""
+    try:
+        await config_data.update_one(
+            {"_id": key},
+            {"$inc": {f"value.{name}": amount for name, amount in counters.items()}},
+            upsert=True,
+        )
+    except Exception as e:
+        log.error(f"Error incrementing counters {key}: {e}")
+
+
+# --- Queue Jobs ---
+
+
+async def write_queue_jobs(upserts: list, deletes: list):
+    """Write only the changed queue jobs: one document per job."""
+    ops = [ReplaceOne({"_id": doc["job_id"]}, clean_value(doc), upsert=True) for doc in upserts]
+    ops.extend(DeleteOne({"_id": job_id}) for job_id in deletes)
+    if not ops:
+        return
+    await queue_data.bulk_write(ops, ordered=False)
+
+
+async def get_queue_jobs():
+    """Retrieve all persisted queue jobs in submission order."""
+    try:
+        cursor = queue_data.find({}).sort("created", 1)
+        return [restore_value(doc) async for doc in cursor]
+    except Exception as e:
+        log.error(f"Error retrieving queue jobs: {e}")
+        return []
+
+
+async def save_upload_job(doc: dict):
+    """Persist a pending upload so it survives a restart."""
+    await upload_data.replace_one({"_id": doc["job_id"]}, clean_value(doc), upsert=True)
+
+
+async def delete_upload_job(job_id: str):
+    try:
+        await upload_data.delete_one({"_id": job_id})
+    except Exception as e:
+        log.error(f"Error deleting upload job {job_id}: {e}")
+
+
+async def get_upload_jobs():
+    """Retrieve all persisted upload jobs in submission order."""
+    try:
+        cursor = upload_data.find({}).sort("created", 1)
+        return [restore_value(doc) async for doc in cursor]
+    except Exception as e:
+        log.error(f"Error retrieving upload jobs: {e}")
+        return []
+
+
+# --- Assets (content-addressed) ---
+
+# Legacy blob field -> hash field that replaces it
+ASSET_HASH_FIELDS = {"thumbnail": "thumbnail_hash", "image_data": "image_hash", "font_data": "font_hash"}
+
+
+async def put_asset(digest: str, data: bytes):
+    """Store an asset once under its SHA-256."""
+    await asset_data.update_one(
+        {"_id": digest},
+        {"$setOnInsert": {"data": data, "size": len(data), "created": datetime.now()}},
+        upsert=True,
+    )
+
+
+async def get_asset(digest: str):
+    """Retrieve the bytes of an asset, or None if unknown."""
+    try:
+        doc = await asset_data.find_one({"_id": digest})
+        return doc["data"] if doc else None
+    except Exception as e:
+        log.error(f"Error getting asset {digest}: {e}")
+        return None
+
+
+async def migrate_settings_blobs():
+    """Moves blobs embedded in user settings into the asset store, leaving their hashes."""
+    query = {"$or": [{"settings." + ".".join(path): {"$exists": True}} for path in BLOB_FIELDS]}
+    migrated = 0
+    try:
+        async for user in user_data.find(query, {"settings": 1}):
+            settings = user["settings"]
+            for parent, key in list(_iter_blobs(settings)):
+                data = parent.pop(key)
+                digest = hashlib.sha256(data).hexdigest()
+                await put_asset(digest, data)
+                parent[ASSET_HASH_FIELDS[key]] = digest
+
+            await user_data.update_one({"_id": user["_id"]}, {"$set": {"settings": settings}})
+            _settings_cache.pop(user["_id"], None)
+            migrated += 1
+    except Exception as e:
+        log.error(f"Error migrating settings blobs: {e}")
+
+    if migrated:
+        log.info(f"Moved assets of {migrated} users into the asset store")
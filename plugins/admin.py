@@ -37,6 +37,20 @@ async def handle_shell(client, message):
     await shell_command(client, message)
 
 
+@Client.on_message(filters.command("cachestats") & filters.user(OWNER_ID))
+async def cache_stats_command(client, message):
+    from bot.func.result_cache import result_cache
+
+    stats = await result_cache.get_stats()
+    await message.reply_text(
+        f"<b>♻️ Result Cache</b>\n\n"
+        f"<blockquote>📦 <b>Entries:</b> <code>{stats['entries']}</code>\n"
+        f"✅ <b>Hits:</b> <code>{stats['hits']}</code>\n"
+        f"❌ <b>Misses:</b> <code>{stats['misses']}</code>\n"
+        f"📈 <b>Hit Rate:</b> <code>{stats['hit_rate']:.1f}%</code></blockquote>"
+    )
+
+
 @Client.on_message(filters.command("broadcast") & filters.private)
 async def broadcast_command(client, message):
     admin = await get_variable("admin", [])
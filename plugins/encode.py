@@ -6,8 +6,18 @@ from pathlib import Path
 from pyrogram import Client, filters
 from pyrogram.types import Message
 
-from bot.func.encode import encode, safe_download_media
+from bot.config import STREAMING_ENCODE
+from bot.func.disk_budget import disk_budget, estimate_output_size
+from bot.func.encode import (
+    encode,
+    remove_empty_dir,
+    safe_download_media,
+    send_cached_results,
+)
+from bot.func.result_cache import result_cache
+from bot.func.stream_input import is_streamable
 from bot.logger import LOGGER
+from database import get_user_settings
 
 log = LOGGER(__name__)
 
@@ -40,6 +50,7 @@ async def check_and_process_video_document(message: Message) -> dict:
         "file_size": getattr(doc, "file_size", 0),
         "mime_type": getattr(doc, "mime_type", ""),
         "file_id": getattr(doc, "file_id", ""),
+        "file_unique_id": getattr(doc, "file_unique_id", ""),
         "duration": getattr(doc, "duration", 0),
         "width": getattr(doc, "width", 0),
         "height": getattr(doc, "height", 0),
@@ -157,10 +168,20 @@ async def enhanced_document_handler(client: Client, message: Message):
             )
             return
 
+        # Same file with the same settings already encoded? Re-send it.
+        file_unique_id = video_info["file_info"]["file_unique_id"]
+        settings = await get_user_settings(user_id)
+        cached = await result_cache.lookup(file_unique_id, settings or {})
+        if cached and await send_cached_results(
+            client, user_id, cached, video_info["file_info"]["file_size"]
+        ):
+            return
+
         # Video is ready for encoding
         # Create download path
-        downloads_dir = Path("downloads")
-        downloads_dir.mkdir(exist_ok=True)
+        # One dir per request, so same-named files never share a path or reservation
+        downloads_dir = Path("downloads") / f"{message.chat.id}_{message.id}"
+        downloads_dir.mkdir(parents=True, exist_ok=True)
 
         file_name = video_info["file_info"]["file_name"]
         # Sanitize filename
@@ -173,13 +194,47 @@ async def enhanced_document_handler(client: Client, message: Message):
         download_file_path = downloads_dir / safe_filename
         log.info(f"Download path: {download_file_path}")
 
+        # Reserve room for the input and the estimated outputs before downloading
+        input_size = video_info["file_info"]["file_size"]
+        output_size = estimate_output_size(settings or {}, input_size)
+        if not disk_budget.fits(input_size + output_size):
+            download_msg = await message.reply_text("💾 **Waiting for disk space...**")
+        if not await disk_budget.reserve(str(download_file_path), input_size, output_size):
+            text = "❌ **Not enough disk space** to process this file right now."
+            if download_msg:
+                await download_msg.edit(text)
+            else:
+                await message.reply_text(text)
+            return
+
+        # Streamable containers are downloaded by the job itself while FFmpeg
+        # already encodes the first megabytes
+        if STREAMING_ENCODE and is_streamable(safe_filename):
+            await encode(
+                ffmpeg_cmd="", # Ignored, uses User Settings
+                input_file=str(download_file_path),
+                client=client,
+                user_id=user_id,
+                message=download_msg,
+                chat_id=message.chat.id,
+                message_id=message.id,
+                file_unique_id=file_unique_id,
+                stream_message=message,
+                file_size=video_info["file_info"]["file_size"],
+            )
+            return
+
         # Start download
-        download_msg = await message.reply_text("📥 **Downloading...**")
+        if download_msg:
+            await download_msg.edit("📥 **Downloading...**")
+        else:
+            download_msg = await message.reply_text("📥 **Downloading...**")
         downloaded_path = await safe_download_media(
             client, message, str(download_file_path), download_msg
         )
 
         if not downloaded_path:
+            disk_budget.release(str(download_file_path))
             await download_msg.edit("❌ **Download Failed**")
             return
 
@@ -199,6 +254,7 @@ async def enhanced_document_handler(client: Client, message: Message):
             message=download_msg,
             chat_id=message.chat.id,
             message_id=message.id,
+            file_unique_id=file_unique_id,
         )
 
     except Exception as e:
@@ -210,6 +266,8 @@ async def enhanced_document_handler(client: Client, message: Message):
 
         # Cleanup if we failed before queuing (and file exists but wasn't queued)
         # If queued, encode function handles cleanup
+        if download_file_path:
+            disk_budget.release(str(download_file_path))
         if download_file_path and os.path.exists(download_file_path):
             # We only clean up here if we didn't reach the encode call or it failed immediately
             # But encode returns a dict, so we can check success?
@@ -218,6 +276,7 @@ async def enhanced_document_handler(client: Client, message: Message):
             try:
                 os.remove(download_file_path)
                 log.info(f"Cleaned up file after error: {download_file_path}")
+                remove_empty_dir(download_file_path)
             except Exception as cleanup_error:
                 log.error(
                     f"Failed to cleanup file {download_file_path}: {cleanup_error}"
@@ -67,14 +67,16 @@ async def queue_command(client: Client, message: Message):
         await message.reply_text("📭 <b>Queue is empty.</b>")
         return
 
+    # Running jobs first, then pending ones in the order they will start
     text = "<blockquote>📋 <b>Current Queue</b></blockquote>\n\n"
     for i, job in enumerate(jobs, 1):
         status_icon = "⏳" if job.status == "pending" else "🏃"
+        priority = f" ⭐{job.priority}" if job.priority else ""
         user_link = f"<a href='tg://user?id={job.user_id}'>{job.user_id}</a>"
         file_size = job.file_size if hasattr(job, "file_size") else "Unknown"
 
         text += (
-            f"<b>{i}.</b> <code>{job.job_id}</code> {status_icon}\n"
+            f"<b>{i}.</b> <code>{job.job_id}</code> {status_icon}{priority}\n"
             f"   ├ 👤 {user_link}\n"
             f"   ├ 📄 <code>{job.file_name}</code>\n"
             f"   └ 📦 {file_size}\n\n"
@@ -83,6 +85,23 @@ async def queue_command(client: Client, message: Message):
     await message.reply_text(text)
 
 
+@Client.on_message(filters.command("priority") & filters.user(OWNER_ID))
+async def priority_command(client: Client, message: Message):
+    args = message.command
+    if len(args) < 3 or not args[2].lstrip("-").isdigit():
+        await message.reply_text("⚠️ Usage: `/priority <job_id> <number>`")
+        return
+
+    job_id, priority = args[1], int(args[2])
+    if await queue_manager.set_priority(job_id, priority):
+        position = queue_manager.get_position(job_id)
+        await message.reply_text(
+            f"✅ Job `{job_id}` priority set to {priority} (position {position})."
+        )
+    else:
+        await message.reply_text("⚠️ Job not found or not pending.")
+
+
 @Client.on_message(filters.command("info") & filters.user(OWNER_ID))
 async def info_command(client: Client, message: Message):
     try:
@@ -1,17 +1,70 @@
 # Developed by ARGON telegram: @REACTIVEARGON
-import asyncio
 import os
 import time
-import shlex
 from pathlib import Path
 from pyrogram import Client, filters
 from pyrogram.types import Message, InputMediaPhoto
 
+from bot.config import SS_RANGE_MIN_MB
+from bot.func.edit_scheduler import edit_scheduler
+from bot.func.partial_media import PartialMedia
+from bot.func.probe import probe_service
+from bot.func.screenshots import (
+    contact_sheet,
+    extract_frames,
+    format_timestamp,
+    parse_request,
+)
 from bot.logger import LOGGER
 from bot.decorator import task
 
 log = LOGGER(__name__)
 
+
+async def _partial_frames(client: Client, target_msg: Message, file_path: Path, request):
+    """
+    Grabs the frames from a sparse copy holding only the container index and
+    the ranges around each timestamp. Returns (duration, timestamps, frames),
+    or None when the partial copy is not enough and a full download is needed.
+    """
+    media = target_msg.video or target_msg.document
+    partial = PartialMedia(client, target_msg, str(file_path), media.file_size)
+    try:
+        await partial.fetch_container()
+
+        duration = getattr(target_msg.video, "duration", 0) or 0
+        if not duration:
+            # Not cached: the copy is sparse
+            media_info = await probe_service.probe(str(file_path), cache=False)
+            duration = media_info.duration if media_info else 0
+        if not duration:
+            return None
+
+        timestamps = request.resolve(duration)
+        await partial.fetch_around(timestamps, duration)
+        frames = await extract_frames(
+            str(file_path),
+            timestamps,
+            str(file_path.parent / f"ss_{file_path.stem}"),
+            strict=True,
+        )
+    except Exception as e:
+        log.warning(f"Partial screenshot fetch failed, downloading the whole file: {e}")
+        return None
+
+    if not all(frames):
+        # A keyframe fell outside the fetched windows
+        for frame in frames:
+            if frame and os.path.exists(frame):
+                os.remove(frame)
+        return None
+
+    log.info(
+        f"Screenshots of {file_path.name} from {partial.fetched_bytes} of {media.file_size} bytes"
+    )
+    return duration, timestamps, frames
+
+
 @Client.on_message(filters.command("ss"))
 @task
 async def screenshot_command(client: Client, message: Message, query=False):
@@ -30,7 +83,19 @@ async def screenshot_command(client: Client, message: Message, query=False):
         await message.reply_text("❌ <b>File is not a video.</b>")
         return
 
+    # /ss [count] [sheet] [timestamps...], e.g. /ss 9 sheet or /ss 1:30 12:05
+    try:
+        request = parse_request(message.command[1:])
+    except ValueError as e:
+        await message.reply_text(
+            f"❌ <b>{e}</b>\n\n"
+            "Usage: <code>/ss [count] [sheet] [timestamps]</code>\n"
+            "e.g. <code>/ss 9 sheet</code> or <code>/ss 1:30 12:05 1:02:30</code>"
+        )
+        return
+
     status_msg = await message.reply_text("📥 <b>Downloading Video...</b>")
+    screenshots = []
 
     # Prepare paths
     downloads_dir = Path("downloads")
@@ -46,100 +111,103 @@ async def screenshot_command(client: Client, message: Message, query=False):
     file_path = downloads_dir / f"ss_{int(time.time())}_{safe_filename}"
 
     try:
-        # Download
-        # We use direct download here for simplicity, or we could import safe_download_media
-        # Let's use direct client.download_media with progress
-
-        start_time = time.time()
-        async def progress(current, total):
-            now = time.time()
-            if now - start_time > 3: # Update every 3s
-                try:
+        result = None
+        media = target_msg.video or target_msg.document
+        if (media.file_size or 0) >= SS_RANGE_MIN_MB * 1024 * 1024:
+            # Big files: fetch only the ranges the frames need
+            await status_msg.edit("📸 <b>Fetching frames...</b>")
+            result = await _partial_frames(client, target_msg, file_path, request)
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+        if result:
+            duration, timestamps, frames = result
+        else:
+            # Download
+            # We use direct download here for simplicity, or we could import safe_download_media
+            # Let's use direct client.download_media with progress
+
+            async def progress(current, total):
+                if total:
                     pct = current * 100 / total
-                    await status_msg.edit(f"📥 <b>Downloading...</b> {pct:.1f}%")
-                except:
-                    pass
-
-        downloaded_path = await client.download_media(
-            target_msg,
-            file_name=str(file_path),
-            progress=progress
-        )
+                    edit_scheduler.submit(status_msg, f"📥 <b>Downloading...</b> {pct:.0f}%")
 
-        if not downloaded_path:
-            await status_msg.edit("❌ <b>Download Failed.</b>")
-            return
+            downloaded_path = await client.download_media(
+                target_msg,
+                file_name=str(file_path),
+                progress=progress
+            )
 
-        await status_msg.edit("📸 <b>Generating Screenshots...</b>")
+            await edit_scheduler.finish(status_msg)
+            if not downloaded_path:
+                await status_msg.edit("❌ <b>Download Failed.</b>")
+                return
 
-        # Get duration
-        duration = 0
-        if target_msg.video:
-            duration = target_msg.video.duration
+            await status_msg.edit("📸 <b>Generating Screenshots...</b>")
 
-        if not duration:
-            # Probe
-            cmd = f"ffprobe -v error -show_entries format=duration -of default=noprint_wrappers=1:nokey=1 {shlex.quote(downloaded_path)}"
-            proc = await asyncio.create_subprocess_shell(
-                cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
-            )
-            out, _ = await proc.communicate()
-            try:
-                duration = float(out.decode().strip())
-            except:
-                duration = 100 # Fallback
-
-        # Generate 5 screenshots
-        timestamps = [
-            duration * 0.2,
-            duration * 0.35,
-            duration * 0.5,
-            duration * 0.65,
-            duration * 0.8
-        ]
-
-        screenshots = []
-        for i, ts in enumerate(timestamps):
-            ss_path = str(file_path.parent / f"ss_{i}_{file_path.stem}.jpg")
-            # ffmpeg -ss {ts} -i {input} -frames:v 1 -q:v 2 {output}
-            cmd = f"ffmpeg -ss {ts} -i {shlex.quote(downloaded_path)} -frames:v 1 -q:v 2 -y {shlex.quote(ss_path)}"
-
-            proc = await asyncio.create_subprocess_shell(
-                cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
-            )
-            await proc.communicate()
+            # Get duration
+            duration = 0
+            if target_msg.video:
+                duration = target_msg.video.duration
+
+            if not duration:
+                media_info = await probe_service.probe(
+                    downloaded_path, getattr(target_msg.video or target_msg.document, "file_unique_id", "")
+                )
+                duration = media_info.duration if media_info and media_info.duration else 100 # Fallback
 
-            if os.path.exists(ss_path):
-                screenshots.append(ss_path)
+            timestamps = request.resolve(duration)
+            frames = await extract_frames(
+                downloaded_path, timestamps, str(file_path.parent / f"ss_{file_path.stem}")
+            )
+        shots = [(ts, ss) for ts, ss in zip(timestamps, frames) if ss]
+        screenshots = [ss for _, ss in shots]
 
         if not screenshots:
             await status_msg.edit("❌ <b>Failed to generate screenshots.</b>")
-            # Cleanup
-            os.remove(downloaded_path)
             return
 
         await status_msg.edit("📤 <b>Uploading Screenshots...</b>")
 
-        # Upload as album
-        media_group = [InputMediaPhoto(ss, caption=f"Timestamp: {timestamps[i]:.1f}s") for i, ss in enumerate(screenshots)]
-
-        # Set caption only on first item
-        media_group[0].caption = (
+        header = (
             f"📸 <b>Screenshots Generated</b>\n"
             f"📁 <b>File:</b> {file_name}\n"
-            f"⏱️ <b>Duration:</b> {duration:.1f}s"
+            f"⏱️ <b>Duration:</b> {format_timestamp(duration)}"
         )
 
-        await message.reply_media_group(media_group)
+        if request.sheet:
+            sheet_path = await contact_sheet(
+                screenshots, str(file_path.parent / f"sheet_{file_path.stem}.jpg")
+            )
+            if sheet_path:
+                screenshots.append(sheet_path)
+                await message.reply_photo(sheet_path, caption=header)
+                await status_msg.delete()
+                return
+
+        # Albums hold at most 10 photos
+        for start in range(0, len(shots), 10):
+            media_group = [
+                InputMediaPhoto(ss, caption=f"Timestamp: {format_timestamp(ts)}")
+                for ts, ss in shots[start : start + 10]
+            ]
+            if start == 0:
+                # Set caption only on first item
+                media_group[0].caption = header
+            if len(media_group) == 1:
+                await message.reply_photo(media_group[0].media, caption=media_group[0].caption)
+            else:
+                await message.reply_media_group(media_group)
         await status_msg.delete()
 
     except Exception as e:
         log.error(f"Screenshot error: {e}")
+        await edit_scheduler.finish(status_msg)
         await status_msg.edit(f"❌ <b>Error:</b> {e}")
 
     finally:
         # Cleanup
-        if 'downloaded_path' in locals() and os.path.exists(downloaded_path):
+        if 'downloaded_path' in locals() and downloaded_path and os.path.exists(downloaded_path):
             os.remove(downloaded_path)
         for ss in screenshots:
             if os.path.exists(ss):
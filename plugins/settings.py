@@ -4,8 +4,10 @@ import os
 from pyrogram import Client, filters
 from pyrogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup
 
+from bot.config import CHUNKED_MIN_DURATION
 from bot.decorator import task
-from bot.func.ffmpeg_utils import validate_ffmpeg_command
+from bot.func.asset_store import FONT_EXT, IMAGE_EXT, THUMBNAIL_EXT, asset_path, store_asset
+from bot.func.ffmpeg_utils import prepare_thumbnail, validate_ffmpeg_command
 from bot.logger import LOGGER
 from database import get_user_settings, update_user_settings
 
@@ -17,7 +19,7 @@ log = LOGGER(__name__)
 
 # Default Settings
 DEFAULT_SETTINGS = {
-    "video": {"crf": "23", "preset": "medium", "resolution": ["1080p"], "codec": "mpeg4"},
+    "video": {"crf": "23", "preset": "medium", "resolution": ["1080p"], "codec": "mpeg4", "single_decode": True},
     "audio": {"bitrate": "128k"},
     "metadata": {
         "global": {"title": "Auto Encoded", "author": "AutoAnimePro"},
@@ -28,6 +30,22 @@ DEFAULT_SETTINGS = {
     "custom_ffmpeg": {},
 }
 
+def _target_display(settings: dict) -> str:
+    target = settings.get("video", {}).get("target_size_mb", 0)
+    return f"{target} MB" if target else "Off"
+
+
+def _auto_quality_display(settings: dict) -> str:
+    floor = settings.get("video", {}).get("auto_quality", 0)
+    return f"VMAF ≥ {floor}" if floor else "Off"
+
+
+# Boolean video settings toggled from the video menu, with their defaults
+VIDEO_TOGGLES = {
+    "single_decode": True,
+    "chunked": False,
+}
+
 METADATA_KEYS = {
     "global": [
         "title", "artist", "album", "album_artist", "genre", "track", "disc", "date",
@@ -78,7 +96,9 @@ async def settings_command(client, message, query=False):
         f"• Codec: <code>{settings.get('video', {}).get('codec', 'mpeg4')}</code>\n"
         f"• CRF: <code>{settings.get('video', {}).get('crf', '23')}</code>\n"
         f"• Preset: <code>{settings.get('video', {}).get('preset', 'medium')}</code>\n"
-        f"• Resolution: <code>{res_display}</code>\n\n"
+        f"• Resolution: <code>{res_display}</code>\n"
+        f"• Target Size: <code>{_target_display(settings)}</code>\n"
+        f"• Auto Quality: <code>{_auto_quality_display(settings)}</code>\n\n"
         f"<b>Audio:</b>\n"
         f"• Bitrate: <code>{settings.get('audio', {}).get('bitrate', '128k')}</code>\n\n"
         f"<b>Metadata:</b>\n"
@@ -125,6 +145,12 @@ async def settings_callback(client, callback_query: CallbackQuery):
 
     if data == "set_video":
         text = "<b>🎬 Video Settings</b>\n\nSelect a parameter to edit:"
+        if settings.get("video", {}).get("chunked", False):
+            text += (
+                f"\n\n<i>Chunked only applies to videos of at least "
+                f"{int(CHUNKED_MIN_DURATION // 60)} min. A target size or Single Decode "
+                "with several resolutions takes precedence over it.</i>"
+            )
         buttons = InlineKeyboardMarkup(
             [
                 [
@@ -146,7 +172,27 @@ async def settings_callback(client, callback_query: CallbackQuery):
                 [
                     InlineKeyboardButton(
                         "Resolution (Multi)", callback_data="edit_video_res"
-                    )
+                    ),
+                    InlineKeyboardButton(
+                        f"Target Size ({_target_display(settings)})",
+                        callback_data="edit_video_target",
+                    ),
+                ],
+                [
+                    InlineKeyboardButton(
+                        f"Auto Quality ({_auto_quality_display(settings)})",
+                        callback_data="edit_video_autoq",
+                    ),
+                ],
+                [
+                    InlineKeyboardButton(
+                        f"Single Decode ({'On' if settings.get('video', {}).get('single_decode', True) else 'Off'})",
+                        callback_data="toggle_video_single_decode",
+                    ),
+                    InlineKeyboardButton(
+                        f"Chunked ({'On' if settings.get('video', {}).get('chunked', False) else 'Off'})",
+                        callback_data="toggle_video_chunked",
+                    ),
                 ],
                 [InlineKeyboardButton("🔙 Back", callback_data="set_main")],
             ]
@@ -503,6 +549,19 @@ async def edit_callback(client, callback_query: CallbackQuery):
         prompt = "<b>Enter new CRF value (0-51):</b>\n<i>Lower is better quality. Default: 23</i>"
     elif data == "edit_video_preset":
         prompt = "<b>Enter new Preset:</b>\n<i>(ultrafast, superfast, veryfast, faster, fast, medium, slow, slower, veryslow)</i>"
+    elif data == "edit_video_target":
+        prompt = (
+            "<b>Enter the target size per resolution in MB:</b>\n"
+            "<i>Encodes in two passes at the bitrate that fits this size, "
+            "instead of CRF. Send 0 to turn it off.</i>"
+        )
+    elif data == "edit_video_autoq":
+        prompt = (
+            "<b>Enter the minimum quality (VMAF, 1-100):</b>\n"
+            "<i>Samples of each video are encoded at several CRFs and the "
+            "smallest one that keeps this quality is used. Around 93 is "
+            "visually transparent for most content. Send 0 to turn it off.</i>"
+        )
     elif data == "edit_audio_bitrate":
         prompt = "<b>Enter new Audio Bitrate:</b>\n<i>Example: 128k, 192k, 320k</i>"
     elif data.startswith("edit_meta_val_"):
@@ -552,6 +611,30 @@ async def edit_callback(client, callback_query: CallbackQuery):
         await update_user_settings(user_id, settings)
         await message.reply_text(f"✅ Preset set to <code>{text}</code>")
 
+    elif data == "edit_video_target":
+        if not text.isdigit():
+            await message.reply_text("❌ <b>Invalid Size!</b>\nSend a whole number of MB, or 0 to turn it off.")
+            return
+        if "video" not in settings: settings["video"] = {}
+        settings["video"]["target_size_mb"] = int(text)
+        await update_user_settings(user_id, settings)
+        if int(text):
+            await message.reply_text(f"✅ Target size set to <code>{text} MB</code> (two-pass)")
+        else:
+            await message.reply_text("✅ Target size off, using CRF")
+
+    elif data == "edit_video_autoq":
+        if not text.isdigit() or not (0 <= int(text) <= 100):
+            await message.reply_text("❌ <b>Invalid Quality!</b>\nPlease enter a number between 0 and 100.")
+            return
+        if "video" not in settings: settings["video"] = {}
+        settings["video"]["auto_quality"] = int(text)
+        await update_user_settings(user_id, settings)
+        if int(text):
+            await message.reply_text(f"✅ Auto quality set to <code>VMAF ≥ {text}</code>")
+        else:
+            await message.reply_text("✅ Auto quality off, using the fixed CRF")
+
     elif data == "edit_audio_bitrate":
         if not text.endswith("k") or not text[:-1].isdigit():
              await message.reply_text("❌ <b>Invalid Bitrate!</b>\nFormat: 128k, 192k, etc.")
@@ -613,6 +696,29 @@ async def toggle_res_callback(client, callback_query: CallbackQuery):
     await edit_callback(client, callback_query)
 
 
+@Client.on_callback_query(filters.regex("^toggle_video_"))
+async def toggle_video_callback(client, callback_query: CallbackQuery):
+    """Flips boolean video settings (e.g. single_decode)."""
+    key = callback_query.data.replace("toggle_video_", "")
+    user_id = callback_query.from_user.id
+
+    if key not in VIDEO_TOGGLES:
+        await callback_query.answer("Invalid option.", show_alert=True)
+        return
+
+    settings = await get_user_settings(user_id)
+    if "video" not in settings:
+        settings["video"] = {}
+
+    settings["video"][key] = not settings["video"].get(key, VIDEO_TOGGLES[key])
+    await update_user_settings(user_id, settings)
+    await callback_query.answer("✅ Updated", show_alert=False)
+
+    # Refresh menu
+    callback_query.data = "set_video"
+    await settings_callback(client, callback_query)
+
+
 @Client.on_callback_query(filters.regex("^add_custom"))
 async def add_custom_callback(client, callback_query: CallbackQuery):
     user_id = callback_query.from_user.id
@@ -721,7 +827,7 @@ async def watermark_callback(client, callback_query: CallbackQuery):
         )
 
         if wm['type'] == 'text':
-            has_font = "✅ Custom" if os.path.exists(f"watermarks/fonts/{user_id}.ttf") else "🤖 Default"
+            has_font = "✅ Custom" if wm.get("font_hash") else "🤖 Default"
             text += (
                 f"📝 <b>Text Settings:</b>\n"
                 f"<blockquote>• <b>Content:</b> <code>{wm['text']}</code>\n"
@@ -865,7 +971,6 @@ async def watermark_callback(client, callback_query: CallbackQuery):
                 caption="<b>💧 Watermark Preview</b>",
                 reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🗑 Delete", callback_data="cb_close")]])
             )
-            os.remove(preview_path)
         else:
             await message.reply_text("❌ <b>Preview Failed!</b>\nCheck logs or ensure settings are valid.")
 
@@ -993,11 +1098,13 @@ async def wm_upload_callback(client, callback_query: CallbackQuery):
         # Read binary data
         with open(path, "rb") as f:
             image_data = f.read()
+        os.remove(path)
 
+        digest = await store_asset(image_data, IMAGE_EXT)
         settings = await get_user_settings(user_id)
         if "watermark" not in settings: settings["watermark"] = {}
-        settings["watermark"]["image_path"] = path
-        settings["watermark"]["image_data"] = image_data # Save to DB
+        settings["watermark"]["image_path"] = asset_path(digest, IMAGE_EXT)
+        settings["watermark"]["image_hash"] = digest # Save reference to DB
         await update_user_settings(user_id, settings)
 
         await message.reply_text("✅ Watermark Image Saved!")
@@ -1111,10 +1218,13 @@ async def wm_upload_font_callback(client, callback_query: CallbackQuery):
         # Read binary data
         with open(path, "rb") as f:
             font_data = f.read()
+        os.remove(path)
 
+        digest = await store_asset(font_data, FONT_EXT)
         settings = await get_user_settings(user_id)
         if "watermark" not in settings: settings["watermark"] = {}
-        settings["watermark"]["font_data"] = font_data # Save to DB
+        settings["watermark"]["font_path"] = asset_path(digest, FONT_EXT)
+        settings["watermark"]["font_hash"] = digest # Save reference to DB
         await update_user_settings(user_id, settings)
 
         await message.reply_text("✅ Custom Font Saved!")
@@ -1183,7 +1293,7 @@ async def thumbnail_callback(client, callback_query):
     data = callback_query.data
 
     if data == "set_thumbnail":
-        thumb_exists = "thumbnail" in settings
+        thumb_exists = "thumbnail_hash" in settings
         status = "✅ Set" if thumb_exists else "❌ Not Set"
 
         text = (
@@ -1207,20 +1317,15 @@ async def thumbnail_callback(client, callback_query):
         await callback_query.message.edit(text, reply_markup=buttons)
 
     elif data == "set_thumbnail_view":
-        if "thumbnail" not in settings:
+        thumb_path = await prepare_thumbnail(user_id, settings)
+        if not thumb_path:
             await callback_query.answer("No thumbnail set!", show_alert=True)
             return
 
-        # Save temp file to send
-        import io
-        thumb_data = settings["thumbnail"]
-        f = io.BytesIO(thumb_data)
-        f.name = "thumbnail.jpg"
-
         try:
             await client.send_photo(
                 chat_id=user_id,
-                photo=f,
+                photo=thumb_path,
                 caption="<b>🖼️ Your Current Thumbnail</b>"
             )
             await callback_query.answer()
@@ -1229,8 +1334,9 @@ async def thumbnail_callback(client, callback_query):
             await callback_query.answer("Failed to send thumbnail.", show_alert=True)
 
     elif data == "set_thumbnail_delete":
-        if "thumbnail" in settings:
-            del settings["thumbnail"]
+        if "thumbnail_hash" in settings:
+            # The asset itself stays: other settings may reference the same hash
+            del settings["thumbnail_hash"]
             await update_user_settings(user_id, settings)
             await callback_query.answer("Thumbnail deleted!", show_alert=True)
 
@@ -1266,8 +1372,8 @@ async def thumbnail_callback(client, callback_query):
                 with open(file_path, "rb") as f:
                     thumb_data = f.read()
 
-                # Save to settings
-                settings["thumbnail"] = thumb_data
+                # Save reference to settings
+                settings["thumbnail_hash"] = await store_asset(thumb_data, THUMBNAIL_EXT)
                 await update_user_settings(user_id, settings)
 
                 # Cleanup
@@ -3,6 +3,12 @@ from pyrogram import Client, filters
 from pyrogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup
 
 from bot.decorator import task
+from bot.func.admission import admission
+from bot.func.disk_budget import disk_budget
+from bot.func.pyroutils.progress import humanbytes
+from bot.func.queue_manager import queue_manager
+from bot.func.sys_stats import stats_sampler
+from bot.func.upload_manager import upload_manager
 from bot.logger import LOGGER
 from database import full_userbase, add_user
 
@@ -138,17 +144,38 @@ async def help_command(client, message):
     await message.reply_text(text=HELP_TEXT, reply_markup=buttons)
 
 
-@Client.on_message(filters.command("stats"))
-async def stats_command(client, message):
+async def get_stats_text() -> str:
     users = await full_userbase()
     total_users = len(users)
+    slots = admission.get_stats()
+    pressure = f" ⚠️ {slots['pressure']}" if slots["pressure"] else ""
+    disk = disk_budget.get_stats()
+    system = stats_sampler.get_snapshot()
+    uploads = upload_manager.get_stats()
 
-    stats_text = (
+    return (
         f"<b>📊 System Metrics</b>\n\n"
         f"<blockquote>👥 <b>Active Users:</b> <code>{total_users}</code>\n"
-        "⚡ <b>Uptime:</b> <code>100%</code></blockquote>"
+        "⚡ <b>Uptime:</b> <code>100%</code></blockquote>\n"
+        f"<blockquote>⚙️ <b>Encode Slots:</b> <code>{slots['running']} running, "
+        f"{slots['in_use']:.1f}/{slots['capacity']:.1f} cores</code>{pressure}\n"
+        f"⏳ <b>Queued:</b> <code>{queue_manager._queue.qsize()}</code>\n"
+        f"🧠 <b>CPU / RAM:</b> <code>{system.cpu}% / {system.ram}%</code></blockquote>\n"
+        f"<blockquote>💾 <b>Disk Free:</b> <code>{humanbytes(disk['free'])} / {humanbytes(disk['total'])}</code>\n"
+        f"📌 <b>Reserved:</b> <code>{humanbytes(disk['reserved'])}</code> "
+        f"(<code>{humanbytes(disk['outstanding'])}</code> not yet written)</blockquote>\n"
+        f"<blockquote>📤 <b>Uploads:</b> <code>{uploads['active']}/{uploads['limit']} slots, "
+        f"{uploads['queued']} queued ({humanbytes(uploads['queued_bytes'])})</code>\n"
+        f"🚀 <b>Throughput:</b> <code>{humanbytes(uploads['throughput'])}/s</code> "
+        f"(<code>{humanbytes(uploads['uploaded'])}</code> sent, "
+        f"<code>{uploads['flood_waits']}</code> FloodWaits)</blockquote>"
     )
 
+
+@Client.on_message(filters.command("stats"))
+async def stats_command(client, message):
+    stats_text = await get_stats_text()
+
     buttons = InlineKeyboardMarkup(
         [[InlineKeyboardButton("❌ Close", callback_data="cb_close")]]
     )
@@ -205,14 +232,7 @@ async def handle_callbacks(client, callback_query: CallbackQuery):
             await message.edit_text(text=TUTORIAL_TEXT, reply_markup=buttons)
 
     elif data == "cb_stats":
-        users = await full_userbase()
-        total_users = len(users)
-
-        stats_text = (
-            f"<b>📊 System Metrics</b>\n\n"
-            f"<blockquote>👥 <b>Active Users:</b> <code>{total_users}</code>\n"
-            "⚡ <b>Uptime:</b> <code>100%</code></blockquote>"
-        )
+        stats_text = await get_stats_text()
 
         buttons = InlineKeyboardMarkup(
             [[InlineKeyboardButton("🔙 Back", callback_data="cb_start")]]
@@ -0,0 +1,106 @@
+import pytest
+
+from bot.func.ffmpeg_utils import watermark_parts
+from bot.func.filter_graph import VideoGraph, WatermarkParts, compile_video_graph
+
+DRAWTEXT = "drawtext=text='hi':x=w-tw-10:y=10"
+MOVIE = "movie='wm.png',scale=iw*0.1:-1,format=rgba,colorchannelmixer=aa=0.5"
+OVERLAY = "overlay=x=W-w-10:y=10"
+
+TEXT = WatermarkParts(filters=(DRAWTEXT,))
+IMAGE = WatermarkParts(source=tuple(MOVIE.split(",")), overlay=OVERLAY)
+
+
+def test_nothing_to_filter():
+    assert compile_video_graph(None, ("",)) is None
+
+
+@pytest.mark.parametrize(
+    "scales, expected",
+    [
+        (("",), VideoGraph(DRAWTEXT, False, (None,))),
+        (("scale=-2:720",), VideoGraph(f"scale=-2:720,{DRAWTEXT}", False, (None,))),
+        (
+            ("", "scale=-2:720"),
+            VideoGraph(
+                f"[0:v]split=2[d0][d1];"
+                f"[d0]{DRAWTEXT}[v0];"
+                f"[d1]scale=-2:720,{DRAWTEXT}[v1]",
+                True,
+                ("v0", "v1"),
+            ),
+        ),
+    ],
+    ids=["plain", "scaled", "two renditions"],
+)
+def test_text_watermark(scales, expected):
+    assert compile_video_graph(TEXT, scales) == expected
+
+
+@pytest.mark.parametrize(
+    "scales, expected",
+    [
+        (("",), VideoGraph(f"{MOVIE}[wm0];[0:v][wm0]{OVERLAY}", True, (None,))),
+        (
+            ("scale=-2:720",),
+            VideoGraph(
+                f"{MOVIE}[wm0];[0:v]scale=-2:720[s0];[s0][wm0]{OVERLAY}", True, (None,)
+            ),
+        ),
+    ],
+    ids=["plain", "scaled"],
+)
+def test_image_watermark(scales, expected):
+    assert compile_video_graph(IMAGE, scales) == expected
+
+
+def test_image_watermark_is_prepared_once_and_split_to_every_scale():
+    graph = compile_video_graph(IMAGE, ("scale=-2:1080", "scale=-2:720", "scale=-2:480"))
+
+    assert graph == VideoGraph(
+        "[0:v]split=3[d0][d1][d2];"
+        f"{MOVIE},split=3[wm0][wm1][wm2];"
+        f"[d0]scale=-2:1080[s0];[s0][wm0]{OVERLAY}[v0];"
+        f"[d1]scale=-2:720[s1];[s1][wm1]{OVERLAY}[v1];"
+        f"[d2]scale=-2:480[s2];[s2][wm2]{OVERLAY}[v2]",
+        True,
+        ("v0", "v1", "v2"),
+    )
+    assert graph.filter.count("movie=") == 1
+
+
+def test_unscaled_rendition_next_to_scaled_one():
+    graph = compile_video_graph(IMAGE, ("", "scale=-2:720"))
+
+    assert graph.filter == (
+        "[0:v]split=2[d0][d1];"
+        f"{MOVIE},split=2[wm0][wm1];"
+        f"[d0][wm0]{OVERLAY}[v0];"
+        f"[d1]scale=-2:720[s0];[s0][wm1]{OVERLAY}[v1]"
+    )
+
+
+def test_scales_without_watermark():
+    graph = compile_video_graph(None, ("scale=-2:1080", "scale=-2:720"))
+
+    assert graph == VideoGraph(
+        "[0:v]split=2[d0][d1];[d0]scale=-2:1080[v0];[d1]scale=-2:720[v1]",
+        True,
+        ("v0", "v1"),
+    )
+
+
+@pytest.mark.parametrize(
+    "position, x, y",
+    [
+        ("top-left", "10", "10"),
+        ("top-right", "W-w-10", "10"),
+        ("bottom-left", "10", "H-h-10"),
+        ("bottom-right", "W-w-10", "H-h-10"),
+    ],
+)
+def test_image_overlay_positions_use_the_main_video_size(position, x, y):
+    parts = watermark_parts(
+        {"watermark": {"type": "image", "image_path": "wm.png", "position": position}}
+    )
+    assert parts.overlay == f"overlay=x={x}:y={y}"
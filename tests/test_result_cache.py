@@ -0,0 +1,75 @@
+import copy
+
+import pytest
+
+from bot.func.result_cache import settings_hash
+
+BASE = {
+    "video": {"codec": "libx264", "crf": "23", "preset": "medium", "resolution": ["1080p", "720p"]},
+    "audio": {"bitrate": "128k"},
+    "watermark": {"type": "text", "text": "hello"},
+}
+
+
+def with_changes(**sections):
+    settings = copy.deepcopy(BASE)
+    for section, values in sections.items():
+        if isinstance(values, dict):
+            settings.setdefault(section, {}).update(values)
+        else:
+            settings[section] = values
+    return settings
+
+
+@pytest.mark.parametrize(
+    "other",
+    [
+        with_changes(custom_ffmpeg="-c:v libx265"),
+        with_changes(user_id=42),
+        with_changes(video={"resolution": ["720p", "1080p"]}),
+    ],
+    ids=["custom_ffmpeg", "user_id", "resolution order"],
+)
+def test_ignored_differences_keep_the_key(other):
+    assert settings_hash(other) == settings_hash(BASE)
+
+
+def test_single_resolution_string_matches_list():
+    assert settings_hash(with_changes(video={"resolution": "720p"})) == settings_hash(
+        with_changes(video={"resolution": ["720p"]})
+    )
+
+
+def test_key_order_does_not_matter():
+    reordered = {key: BASE[key] for key in reversed(list(BASE))}
+    assert settings_hash(reordered) == settings_hash(BASE)
+
+
+@pytest.mark.parametrize(
+    "other",
+    [
+        with_changes(video={"crf": "28"}),
+        with_changes(video={"resolution": ["1080p"]}),
+        with_changes(audio={"bitrate": "64k"}),
+        with_changes(watermark={"text": "other"}),
+    ],
+    ids=["crf", "resolutions", "audio", "watermark"],
+)
+def test_output_settings_change_the_key(other):
+    assert settings_hash(other) != settings_hash(BASE)
+
+
+def test_binary_assets_are_hashed_by_content():
+    first = with_changes(watermark={"image_data": b"png-1"})
+    same = with_changes(watermark={"image_data": b"png-1"})
+    other = with_changes(watermark={"image_data": b"png-2"})
+
+    assert settings_hash(first) == settings_hash(same)
+    assert settings_hash(first) != settings_hash(other)
+
+
+def test_does_not_modify_settings():
+    settings = with_changes(video={"resolution": ["720p", "1080p"]}, user_id=42)
+    before = copy.deepcopy(settings)
+    settings_hash(settings)
+    assert settings == before
@@ -0,0 +1,141 @@
+from types import SimpleNamespace
+
+import pytest
+
+from bot.func import scheduler
+from bot.func.scheduler import QUANTUM_BYTES, FairQueue
+
+OWNER = 1
+PREMIUM = 2
+ALICE = 10
+BOB = 11
+
+
+@pytest.fixture(autouse=True)
+def weights(monkeypatch):
+    monkeypatch.setattr(scheduler, "OWNER_ID", OWNER)
+    monkeypatch.setattr(scheduler, "OWNER_WEIGHT", 4.0)
+    monkeypatch.setattr(scheduler, "PREMIUM_USERS", [PREMIUM])
+    monkeypatch.setattr(scheduler, "PREMIUM_WEIGHT", 2.0)
+
+
+def make_job(user_id, name, quanta=1.0, priority=0):
+    return SimpleNamespace(
+        user_id=user_id, name=name, size_bytes=int(quanta * QUANTUM_BYTES), priority=priority
+    )
+
+
+def drain(queue):
+    return [queue.get_nowait().name for _ in range(queue.qsize())]
+
+
+def test_user_weight():
+    assert scheduler.user_weight(OWNER) == 4.0
+    assert scheduler.user_weight(PREMIUM) == 2.0
+    assert scheduler.user_weight(ALICE) == 1.0
+
+
+def test_job_cost_counts_unknown_size_as_one_quantum():
+    assert scheduler.job_cost(make_job(ALICE, "a", quanta=2)) == 2.0
+    assert scheduler.job_cost(SimpleNamespace(user_id=ALICE, size_bytes=0)) == 1.0
+
+
+def test_users_alternate_regardless_of_submission_order():
+    queue = FairQueue()
+    for i in range(4):
+        queue.put_nowait(make_job(ALICE, f"a{i}"))
+    for i in range(2):
+        queue.put_nowait(make_job(BOB, f"b{i}"))
+
+    assert drain(queue) == ["a0", "b0", "a1", "b1", "a2", "a3"]
+    assert queue.empty()
+
+
+def test_large_jobs_wait_for_enough_credit():
+    queue = FairQueue()
+    queue.put_nowait(make_job(ALICE, "big", quanta=2))
+    for i in range(3):
+        queue.put_nowait(make_job(BOB, f"b{i}"))
+
+    # Alice needs two rounds of credit for a two-quanta job
+    assert drain(queue) == ["b0", "big", "b1", "b2"]
+
+
+@pytest.mark.parametrize("user_id, per_round", [(OWNER, 4), (PREMIUM, 2)])
+def test_weights_set_the_share_per_round(user_id, per_round):
+    queue = FairQueue()
+    for i in range(2 * per_round):
+        queue.put_nowait(make_job(user_id, f"w{i}"))
+    for i in range(2):
+        queue.put_nowait(make_job(ALICE, f"a{i}"))
+
+    expected = (
+        [f"w{i}" for i in range(per_round)]
+        + ["a0"]
+        + [f"w{i}" for i in range(per_round, 2 * per_round)]
+        + ["a1"]
+    )
+    assert drain(queue) == expected
+
+
+def test_idle_users_do_not_bank_credit():
+    queue = FairQueue()
+    queue.put_nowait(make_job(ALICE, "a0"))
+    assert queue.get_nowait().name == "a0"
+
+    queue.put_nowait(make_job(BOB, "b0"))
+    queue.put_nowait(make_job(ALICE, "a1"))
+    queue.put_nowait(make_job(ALICE, "a2"))
+    assert drain(queue) == ["b0", "a1", "a2"]
+
+
+def test_priority_orders_a_users_jobs():
+    queue = FairQueue()
+    queue.put_nowait(make_job(ALICE, "a0"))
+    queue.put_nowait(make_job(ALICE, "urgent", priority=5))
+    queue.put_nowait(make_job(ALICE, "a1"))
+
+    assert drain(queue) == ["urgent", "a0", "a1"]
+
+
+def test_reprioritize_moves_a_queued_job_up():
+    queue = FairQueue()
+    jobs = [make_job(ALICE, f"a{i}") for i in range(3)]
+    for job in jobs:
+        queue.put_nowait(job)
+
+    jobs[2].priority = 5
+    assert queue.reprioritize(jobs[2])
+    assert [job.name for job in queue.scheduled()] == ["a2", "a0", "a1"]
+
+
+def test_reprioritize_unknown_job():
+    queue = FairQueue()
+    queue.put_nowait(make_job(ALICE, "a0"))
+
+    assert not queue.reprioritize(make_job(ALICE, "gone"))
+    assert not queue.reprioritize(make_job(BOB, "gone"))
+
+
+def test_scheduled_predicts_without_consuming():
+    queue = FairQueue()
+    for i in range(3):
+        queue.put_nowait(make_job(ALICE, f"a{i}", quanta=1.5))
+    queue.put_nowait(make_job(OWNER, "o0", quanta=3))
+    queue.put_nowait(make_job(BOB, "b0"))
+    # A partly spent round, so the copied deficits matter
+    queue.get_nowait()
+
+    predicted = [job.name for job in queue.scheduled()]
+    assert queue.qsize() == 4
+    assert predicted == drain(queue)
+
+
+def test_task_done_balances_puts():
+    queue = FairQueue()
+    queue.put_nowait(make_job(ALICE, "a0"))
+    queue.get_nowait()
+    queue.task_done()
+
+    with pytest.raises(ValueError):
+        queue.task_done()
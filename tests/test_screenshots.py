@@ -0,0 +1,85 @@
+import pytest
+
+from bot.func import screenshots
+from bot.func.screenshots import (
+    ScreenshotRequest,
+    format_timestamp,
+    parse_request,
+    parse_timestamp,
+)
+
+
+@pytest.fixture(autouse=True)
+def max_count(monkeypatch):
+    monkeypatch.setattr(screenshots, "SS_MAX_COUNT", 20)
+
+
+@pytest.mark.parametrize(
+    "text, seconds",
+    [
+        ("90", 90.0),
+        ("90s", 90.0),
+        ("1.5", 1.5),
+        ("2.5s", 2.5),
+        ("1:30", 90.0),
+        ("01:30", 90.0),
+        ("1:02:30", 3750.0),
+        ("1:02:30s", 3750.0),
+        (" 45 ", 45.0),
+        ("0", 0.0),
+    ],
+)
+def test_parse_timestamp(text, seconds):
+    assert parse_timestamp(text) == seconds
+
+
+@pytest.mark.parametrize("text", ["", "abc", "1:", ":30", "1:2:3:4", "-5", "90m", "1.2.3"])
+def test_parse_timestamp_rejects(text):
+    assert parse_timestamp(text) is None
+
+
+@pytest.mark.parametrize(
+    "args, count, timestamps, sheet",
+    [
+        ([], screenshots.SS_DEFAULT_COUNT, [], False),
+        # A bare number is a count, with a trailing s it is a time
+        (["90"], 20, [], False),
+        (["90s"], screenshots.SS_DEFAULT_COUNT, [90.0], False),
+        (["8"], 8, [], False),
+        (["0"], 1, [], False),
+        (["1:02:30"], screenshots.SS_DEFAULT_COUNT, [3750.0], False),
+        (["10s", "1:30", "sheet"], screenshots.SS_DEFAULT_COUNT, [10.0, 90.0], True),
+        (["6", "GRID"], 6, [], True),
+        (["tile"], screenshots.SS_DEFAULT_COUNT, [], True),
+    ],
+)
+def test_parse_request(args, count, timestamps, sheet):
+    request = parse_request(args)
+    assert (request.count, request.timestamps, request.sheet) == (count, timestamps, sheet)
+
+
+@pytest.mark.parametrize("args", [["abc"], ["5", "later"], ["1.5"], ["1:xx"], ["-3"]])
+def test_parse_request_rejects_unknown_arguments(args):
+    with pytest.raises(ValueError):
+        parse_request(args)
+
+
+def test_resolve_spreads_frames_evenly():
+    assert ScreenshotRequest(count=3).resolve(100.0) == [25.0, 50.0, 75.0]
+
+
+def test_resolve_keeps_timestamps_inside_the_video():
+    request = ScreenshotRequest(timestamps=[-1.0, 30.0, 500.0])
+    assert request.resolve(100.0) == [0.0, 30.0, 99.5]
+
+
+def test_resolve_caps_the_count():
+    request = ScreenshotRequest(timestamps=[float(i) for i in range(30)])
+    assert len(request.resolve(100.0)) == 20
+
+
+@pytest.mark.parametrize(
+    "seconds, text", [(0, "0:00"), (59.9, "0:59"), (90, "1:30"), (3750, "1:02:30")]
+)
+def test_format_timestamp(seconds, text):
+    assert format_timestamp(seconds) == text